@@ -0,0 +1,266 @@
+"""Benchmark docket parsing stage by stage.
+
+Times each stage of `docket.parse_pdf` separately over the fixture dockets in
+`tests/data` (or any pdfs given on the command line):
+
+* `pdfplumber.open`: opening the pdf and loading its page tree
+* `extract_page`: extracting the words of every page
+* `_get_headings` and `_split_pages`
+* each section parser (`_parse_case_info`, `_parse_bail`, ...)
+
+`--scale N` adds a synthetic docket per pdf that is N times longer: its pages
+are repeated N times and each of its sections is tiled N times, so stages that
+scale badly with docket length stand out.
+
+Each stage reports the median wall time of `--repeat` runs, its throughput in
+words per second and the peak memory it allocated (measured in a separate run
+under `tracemalloc`, which would otherwise slow the timings down).
+
+Results can be saved with `--save` and later runs checked against them with
+`--compare`; the exit status is 1 if any stage got slower than `--threshold`
+times its saved time.
+
+Usage:
+    python benchmarks/bench_docket.py [--repeat 5] [--scale 10] [pdfs ...]
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, DefaultDict, Dict, List, Optional, Tuple
+
+import pdfplumber
+
+from pollydocket import docket, words
+
+DATA_PATH = Path(__file__).resolve().parent.parent / "tests" / "data"
+
+# A stage is a name, the number of words it processes, a setup function and the
+# function being measured, which is called with the result of setup
+Stage = Tuple[str, int, Callable[[], Any], Callable[[Any], object]]
+
+
+def tile(crop: words.Crop, times: int) -> words.Crop:
+    """Stack copies of a crop's words on top of each other.
+
+    Args:
+        crop: Crop to tile
+        times: Number of copies
+
+    Returns:
+        words.Crop: Crop `times` as tall holding every copy
+    """
+    x0, top, x1, bottom = crop.bbox
+    height = bottom - top
+    tiled = []
+    for n in range(times):
+        for w in crop.words:  # New dicts every time
+            for key in ("top", "bottom", "doctop"):
+                w[key] += n * height
+            tiled.append(w)
+
+    return words.Crop.from_words((x0, top, x1, top + height * times), tiled)
+
+
+def stages(path: Path, scale: int = 1) -> List[Stage]:
+    """Stages of parsing a pdf.
+
+    Args:
+        path: Path of the pdf
+        scale: Size of the synthetic docket relative to the pdf. 1 benchmarks
+            the pdf itself.
+
+    Returns:
+        List[Stage]: Stages in the order `parse_pdf` runs them
+    """
+    with pdfplumber.open(path) as pdf:
+        pages = [words.extract_page(p) for p in pdf.pages] * scale
+    headings = docket._get_headings(pages)
+    sections = docket._split_pages(pages, headings)
+    num_words = sum(len(p.rows) for p in pages)
+
+    ret: List[Stage] = []
+    if scale == 1:
+        ret += [
+            ("pdfplumber.open", num_words, lambda: path, _open),
+            ("extract_page", num_words, lambda: _opened(path), _extract),
+        ]
+    ret += [
+        ("_get_headings", num_words, lambda: pages, docket._get_headings),
+        (
+            "_split_pages",
+            num_words,
+            lambda: headings,
+            lambda h: docket._split_pages(pages, h),
+        ),
+    ]
+    for sect, crop in sections.items():
+        parser = docket.PARSERS.get(sect)
+        if parser is None:
+            continue
+        if scale > 1:
+            crop = tile(crop, scale)
+        ret.append((parser.__name__, len(crop.rows), _fresh(crop), parser))
+
+    return ret
+
+
+def _open(path: Path) -> object:
+    with pdfplumber.open(path) as pdf:
+        return pdf.pages
+
+
+def _opened(path: Path) -> pdfplumber.PDF:
+    pdf = pdfplumber.open(path)
+    pdf.pages  # Loaded here so only extraction is measured
+    return pdf
+
+
+def _extract(pdf: pdfplumber.PDF) -> object:
+    return [words.extract_page(p) for p in pdf.pages]
+
+
+def _fresh(crop: words.Crop) -> Callable[[], words.Crop]:
+    def setup() -> words.Crop:
+        crop._index = None  # Building the index is part of parsing
+        return crop
+
+    return setup
+
+
+def _run(setup: Callable[[], Any], run: Callable[[Any], object]) -> float:
+    arg = setup()
+    try:
+        start = time.perf_counter()
+        run(arg)
+        return time.perf_counter() - start
+    finally:
+        if hasattr(arg, "close"):
+            arg.close()
+
+
+def _peak_memory(setup: Callable[[], Any], run: Callable[[Any], object]) -> int:
+    arg = setup()
+    tracemalloc.start()
+    try:
+        run(arg)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        if hasattr(arg, "close"):
+            arg.close()
+
+
+def benchmark(paths: List[Path], repeat: int = 5, scale: int = 1) -> Dict[str, Dict]:
+    """Benchmark every stage over `paths`.
+
+    Args:
+        paths: pdfs to benchmark
+        repeat: Number of timed runs of each stage
+        scale: Also benchmark synthetic dockets this many times longer. 1 skips
+            them.
+
+    Returns:
+        Dict[str, Dict]: Results by stage: total median `seconds`, `words`,
+            `words_per_second` and largest `peak_bytes`
+    """
+    seconds: DefaultDict[str, float] = defaultdict(float)
+    num_words: DefaultDict[str, int] = defaultdict(int)
+    peak: DefaultDict[str, int] = defaultdict(int)
+    for n in sorted({1, scale}):
+        suffix = "" if n == 1 else f" (x{n})"
+        for path in paths:
+            for name, count, setup, run in stages(path, n):
+                name += suffix
+                seconds[name] += statistics.median(
+                    _run(setup, run) for _ in range(repeat)
+                )
+                num_words[name] += count
+                peak[name] = max(peak[name], _peak_memory(setup, run))
+
+    return {
+        name: {
+            "seconds": seconds[name],
+            "words": num_words[name],
+            "words_per_second": num_words[name] / seconds[name],
+            "peak_bytes": peak[name],
+        }
+        for name in seconds
+    }
+
+
+def compare(
+    results: Dict, baseline: Dict, threshold: float, min_seconds: float = 1e-4
+) -> List[str]:
+    """Find stages that got slower.
+
+    Args:
+        results: Results of `benchmark`
+        baseline: Earlier results of `benchmark`
+        threshold: Largest ratio of new to old time that isn't a regression
+        min_seconds: Stages faster than this in both are too quick to compare
+
+    Returns:
+        List[str]: Description of each regression
+    """
+    regressions = []
+    for name, res in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]["seconds"]
+        if max(old, res["seconds"]) < min_seconds:
+            continue
+        ratio = res["seconds"] / old
+        if ratio > threshold:
+            regressions.append(f"{name}: {ratio:.2f}x slower")
+
+    return regressions
+
+
+def _report(results: Dict) -> str:
+    lines = [f"{'stage':<34}{'ms':>10}{'words/s':>14}{'peak KiB':>12}"]
+    for name, res in results.items():
+        lines.append(
+            f"{name:<34}{res['seconds'] * 1000:>10.2f}"
+            f"{res['words_per_second']:>14,.0f}{res['peak_bytes'] / 1024:>12,.0f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdfs", nargs="*", type=Path, help="defaults to tests/data")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per stage")
+    parser.add_argument("--scale", type=int, default=1, help="synthetic docket size")
+    parser.add_argument("--save", type=Path, help="write results to this json file")
+    parser.add_argument("--compare", type=Path, help="json file of earlier results")
+    parser.add_argument(
+        "--threshold", type=float, default=1.2, help="slowdown that fails --compare"
+    )
+    args = parser.parse_args(argv)
+
+    paths = args.pdfs or sorted(DATA_PATH.glob("*.pdf"))
+    results = benchmark(paths, repeat=args.repeat, scale=args.scale)
+    print(_report(results))
+
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2))
+
+    if args.compare:
+        regressions = compare(
+            results, json.loads(args.compare.read_text()), args.threshold
+        )
+        for regression in regressions:
+            print(regression, file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,7 @@
 """Top-level package for PollyDocket."""
+from .batch import aparse, iparse_many, parse_many
+from .cache import ResultCache
+from .instrument import Aggregator, Event, observe
 
 __author__ = """Bailey Campbell"""
 __email__ = 'baileycampbell1990@gmail.com'
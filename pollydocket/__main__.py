@@ -0,0 +1,6 @@
+"""Run the command line interface with `python -m pollydocket`."""
+import sys
+
+from .cli import main
+
+sys.exit(main())
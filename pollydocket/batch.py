@@ -0,0 +1,330 @@
+"""Batch docket parsing.
+
+Parsing is CPU bound (nearly all of it is pdfminer), so batches are spread
+across a pool of worker processes. Results are yielded as each document
+finishes, paired with the input they came from. A document that fails to
+parse yields its exception instead of a result so the rest of the batch
+carries on.
+
+`aparse` is the asyncio flavour, for parsing alongside other work (e.g.
+downloading more dockets) without blocking the event loop.
+
+Inputs can be anything `docket.parse_pdf` accepts. Paths and `bytes` are sent
+to worker processes as they are; other buffers and file objects can't be, so
+their contents are copied into `bytes` first.
+"""
+import asyncio
+import os
+import pickle
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from . import docket
+from .cache import ResultCache
+from .docket import PDFSource
+
+Result = Tuple[PDFSource, Union[Dict, Exception]]
+Parser = Callable[[PDFSource, Optional[ResultCache]], Any]
+
+
+def parse_many(
+    pdfs: Iterable[PDFSource],
+    workers: Optional[int] = None,
+    chunksize: int = 1,
+    cache: Optional[ResultCache] = None,
+    parser: Optional[Parser] = None,
+) -> List[Result]:
+    """Parse many pdfs in parallel.
+
+    Args:
+        pdfs: pdfs to parse (paths, buffers or binary file objects)
+        workers: Number of worker processes. Defaults to the number of CPUs.
+        chunksize: Number of pdfs sent to a worker at a time
+        cache: Cache of parsed dockets shared by the workers
+        parser: Function run in the workers instead of parsing (see
+            `iparse_many`)
+
+    Returns:
+        List[Result]: `(pdf, result_or_error)` in the order they finished
+    """
+    return list(
+        iparse_many(
+            pdfs, workers=workers, chunksize=chunksize, cache=cache, parser=parser
+        )
+    )
+
+
+def iparse_many(
+    pdfs: Iterable[PDFSource],
+    workers: Optional[int] = None,
+    chunksize: int = 1,
+    cache: Optional[ResultCache] = None,
+    parser: Optional[Parser] = None,
+) -> Iterator[Result]:
+    """Parse many pdfs in parallel, yielding each as it finishes.
+
+    `pdfs` is consumed lazily; only a couple of chunks per worker are in
+    flight at once, so arbitrarily long iterables can be used. If a worker
+    process dies outright (e.g. it is killed for using too much memory), the
+    documents it had in flight yield a `BrokenProcessPool` error and the pool
+    is restarted for the remaining documents.
+
+    Args:
+        pdfs: pdfs to parse (paths, buffers or binary file objects)
+        workers: Number of worker processes. Defaults to the number of CPUs.
+        chunksize: Number of pdfs sent to a worker at a time. Larger chunks
+            lower the IPC overhead per document at the cost of coarser
+            load balancing.
+        cache: Cache of parsed dockets shared by the workers
+        parser: Function run in the workers with each pdf and `cache`, whose
+            return value is the result (e.g. to return more than the parsed
+            docket). Must be picklable, i.e. defined at the top level of a
+            module. Defaults to parsing the pdf and returning it as a dict.
+
+    Yields:
+        Result: `(pdf, result_or_error)` in the order they finished
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize must be >= 1")
+
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunked(iter(pdfs), chunksize)
+    max_in_flight = 2 * workers
+    pending: Dict[Future, List[PDFSource]] = {}
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            for chunk in islice(chunks, max_in_flight - len(pending)):
+                sendable = [to_sendable(pdf) for pdf in chunk]
+                pending[executor.submit(_parse_chunk, sendable, cache, parser)] = chunk
+
+            if not pending:
+                return
+
+            done: Set[Future]
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from _chunk_results(future, pending.pop(future))
+
+            if any(isinstance(f.exception(), BrokenProcessPool) for f in done):
+                # Everything still in flight died with the pool
+                for future, chunk in pending.items():
+                    yield from _chunk_results(future, chunk)
+                pending.clear()
+                executor.shutdown(wait=True)
+                executor = ProcessPoolExecutor(max_workers=workers)
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+async def aparse(
+    pdfs: Union[Iterable[PDFSource], AsyncIterable[PDFSource]],
+    executor: Optional[Executor] = None,
+    limit: Optional[int] = None,
+    cache: Optional[ResultCache] = None,
+) -> AsyncIterator[Result]:
+    """Parse pdfs in an executor, yielding each as it finishes.
+
+    `pdfs` may be an async iterable, in which case parsing starts while it is
+    still producing pdfs. At most `limit` pdfs are parsing (or queued in the
+    executor) at once; no more pdfs are pulled until one finishes. Cancelling
+    the task iterating the generator, or closing it, cancels the parses that
+    haven't started.
+
+    Args:
+        pdfs: pdfs to parse (paths, buffers or binary file objects)
+        executor: Executor to parse in. Defaults to a `ProcessPoolExecutor`
+            that is shut down when iteration ends.
+        limit: Maximum number of pdfs in flight. Defaults to the number of
+            CPUs.
+        cache: Cache of parsed dockets
+
+    Yields:
+        Result: `(pdf, result_or_error)` in the order they finished
+    """
+    loop = asyncio.get_event_loop()
+    own_executor = executor is None
+    if executor is None:
+        executor = ProcessPoolExecutor()
+    limit = limit or os.cpu_count() or 1
+    to_processes = isinstance(executor, ProcessPoolExecutor)
+
+    source = iterate_async(pdfs)
+    next_pdf: Optional[asyncio.Future] = None
+    exhausted = False
+    pending: Dict[asyncio.Future, PDFSource] = {}
+    try:
+        while True:
+            if not exhausted and next_pdf is None and len(pending) < limit:
+                next_pdf = asyncio.ensure_future(source.__anext__())
+
+            waiting = set(pending)
+            if next_pdf is not None:
+                waiting.add(next_pdf)
+            if not waiting:
+                return
+
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            if next_pdf in done:
+                try:
+                    pdf = next_pdf.result()
+                    job = to_sendable(pdf) if to_processes else pdf
+                    pending[loop.run_in_executor(executor, parse_one, job, cache)] = pdf
+                except StopAsyncIteration:
+                    exhausted = True
+                next_pdf = None
+
+            for future in done:
+                if future in pending:
+                    pdf = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # Only the executor failing (e.g. a broken pool) gets
+                        # here; parse errors are already in the result
+                        result = e
+                    yield pdf, result
+    finally:
+        for future in pending:
+            future.cancel()
+        if next_pdf is not None:
+            next_pdf.cancel()
+        if own_executor:
+            executor.shutdown(wait=False)
+
+
+async def iterate_async(items: Union[Iterable, AsyncIterable]) -> AsyncIterator:
+    """Iterate asynchronously, whether or not `items` is an async iterable.
+
+    Args:
+        items: Iterable or async iterable
+
+    Yields:
+        Any: Each item
+    """
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+def to_sendable(pdf: PDFSource) -> PDFSource:
+    """Get a pdf into a form that can be sent to a worker process.
+
+    Args:
+        pdf: Anything `docket.parse_pdf` accepts
+
+    Returns:
+        PDFSource: Paths and `bytes` as they are, anything else as `bytes`
+    """
+    if isinstance(pdf, (str, os.PathLike, bytes)):
+        return pdf
+
+    data = docket.read_pdf(pdf)
+    return data if isinstance(data, bytes) else bytes(data)
+
+
+def parse_one(
+    pdf: PDFSource, cache: Optional[ResultCache] = None
+) -> Union[Dict, Exception]:
+    """Parse a pdf into a dict in a worker, returning rather than raising errors.
+
+    Args:
+        pdf: Path or contents of the pdf (see `to_sendable`)
+        cache: Cache of parsed dockets
+
+    Returns:
+        Union[Dict, Exception]: Parsed docket, or the error parsing it
+    """
+    return _parse_chunk([pdf], cache)[0]
+
+
+def picklable(e: Exception) -> Exception:
+    """Make sure an exception can be sent back from a worker process.
+
+    Args:
+        e: Exception
+
+    Returns:
+        Exception: `e`, or a `RuntimeError` with its message if it can't be
+            pickled
+    """
+    try:
+        pickle.loads(pickle.dumps(e))
+    except Exception:
+        return RuntimeError(f"{type(e).__name__}: {e}")
+
+    return e
+
+
+def _chunk_results(future: Future, chunk: List[PDFSource]) -> List[Result]:
+    """Pair the results of a chunk with its pdfs.
+
+    If the chunk itself failed, its error is the result of every pdf in it.
+    """
+    try:
+        return list(zip(chunk, future.result()))
+    except Exception as e:
+        return [(pdf, e) for pdf in chunk]
+
+
+def _chunked(it: Iterator, size: int) -> Iterator[List]:
+    """Split an iterator into lists of `size` (the last may be shorter)."""
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _parse_chunk(
+    pdfs: List[PDFSource],
+    cache: Optional[ResultCache] = None,
+    parser: Optional[Parser] = None,
+) -> List[Any]:
+    """Parse a chunk of pdfs in a worker process.
+
+    Exceptions are returned rather than raised so one bad pdf doesn't lose the
+    results of the rest of the chunk. Only results are returned; the caller
+    still has the pdfs, so they aren't sent back.
+    """
+    parse = parser or _parse_dict
+    results: List[Any] = []
+    for pdf in pdfs:
+        try:
+            results.append(parse(pdf, cache))
+        except Exception as e:
+            results.append(picklable(e))
+
+    return results
+
+
+def _parse_dict(pdf: PDFSource, cache: Optional[ResultCache] = None) -> Dict:
+    """Parse a pdf into a dict."""
+    # Parse every section here so errors are caught per pdf
+    return docket.parse_pdf(pdf, cache=cache).to_dict()
@@ -0,0 +1,198 @@
+"""Parsed docket cache.
+
+Dockets are often downloaded again without having changed, so parse results
+can be cached on disk. Entries are keyed by the SHA-256 of the pdf's bytes
+together with a fingerprint of the parser's source code and the pdf libraries'
+versions: editing the parser or upgrading pdfplumber changes the fingerprint,
+so results from an older parser are never returned.
+
+The cache is a single SQLite file. When it grows past its size limit, the
+least recently used entries are evicted.
+"""
+import hashlib
+import json
+import mmap
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import pdfminer
+import pdfplumber
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+"""
+
+# Modules whose source determines parse results
+_PARSER_MODULES = ("docket.py", "templates.py", "utils.py", "words.py")
+
+# Logical clock for LRU order; the index makes MAX cheap
+_NEXT_ACCESS = "SELECT COALESCE(MAX(accessed), 0) + 1 FROM results"
+
+
+def parser_fingerprint() -> str:
+    """Fingerprint of the installed parser.
+
+    Hashes the source of the modules that turn a pdf into a result, and the
+    versions of pdfplumber and pdfminer.six they extract words with, so a
+    change to either gives a new fingerprint. Changes to the rest of the
+    package (e.g. the portal client) don't invalidate cached results.
+
+    Returns:
+        str: Hex digest
+    """
+    h = hashlib.sha256()
+    for name in _PARSER_MODULES:
+        h.update(name.encode())
+        h.update((Path(__file__).parent / name).read_bytes())
+    for version in (pdfplumber.__version__, pdfminer.__version__):
+        h.update(version.encode())
+
+    return h.hexdigest()
+
+
+class ResultCache:
+    """Cache of `parse_pdf` results in an SQLite file.
+
+    Instances can be pickled (e.g. passed to worker processes); each process
+    opens its own connection to the file.
+
+    Args:
+        path: Path of the SQLite file. Created if it doesn't exist.
+        max_size: Size in bytes of stored results to keep. Least recently used
+            results are evicted beyond this.
+    """
+
+    def __init__(self, path: str, max_size: int = 1 << 30):
+        self.path = str(path)
+        self.max_size = max_size
+        self.fingerprint = parser_fingerprint()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict:  # noqa: D105
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict) -> None:  # noqa: D105
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:  # noqa: D105
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    @property
+    def size(self) -> int:
+        """Total size in bytes of the stored results."""
+        with self._lock:
+            return self._total_size(self._connect())
+
+    def key(self, data: Union[bytes, bytearray, memoryview, mmap.mmap]) -> str:
+        """Cache key of a pdf.
+
+        Args:
+            data: Contents of the pdf
+
+        Returns:
+            str: Key combining the pdf's hash and the parser fingerprint
+        """
+        return f"{hashlib.sha256(data).hexdigest()}-{self.fingerprint}"
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Look up a result.
+
+        Args:
+            key: Cache key (from `key`)
+
+        Returns:
+            Optional[Dict]: Cached result, or `None` if there isn't one
+        """
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            with conn:
+                conn.execute(
+                    f"UPDATE results SET accessed = ({_NEXT_ACCESS}) WHERE key = ?",
+                    (key,),
+                )
+
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key: str, result: Dict) -> None:
+        """Store a result, evicting old results if the cache is full.
+
+        Args:
+            key: Cache key (from `key`)
+            result: Parsed docket
+        """
+        value = zlib.compress(json.dumps(result).encode())
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (key, value, size, accessed) "
+                    f"VALUES (?, ?, ?, ({_NEXT_ACCESS}))",
+                    (key, value, len(value)),
+                )
+                self._evict(conn)
+
+    def clear(self) -> None:
+        """Remove every result."""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM results")
+
+    def close(self) -> None:
+        """Close this process's connection to the cache file."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+
+        return self._conn
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Delete least recently used results until under `max_size`."""
+        excess = self._total_size(conn) - self.max_size
+        if excess <= 0:
+            return
+
+        doomed = []
+        for key, size in conn.execute(
+            "SELECT key, size FROM results ORDER BY accessed"
+        ):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+
+        conn.executemany("DELETE FROM results WHERE key = ?", doomed)
+
+    @staticmethod
+    def _total_size(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
@@ -0,0 +1,224 @@
+"""Checkpoints of batch runs, so an interrupted run can be resumed.
+
+A `Checkpoint` is an append-only manifest of the inputs a run has finished,
+one JSON line per input with its SHA-256, whether it parsed, and how far
+the output had been written once it was. Rerunning with the same checkpoint
+skips inputs that are already done and haven't changed since, and output
+written after the last entry can be dropped (see `writers.Writer.truncate`).
+
+Each entry is a single `write` to a file opened for appending, so it reaches
+the operating system as soon as it is recorded and is never interleaved with
+another; a run that is killed loses nothing it recorded. A crash part way
+through a write (e.g. a power cut) can only leave a torn last line, which is
+dropped when the checkpoint is next opened. Pass `fsync=True` to survive
+power cuts too, at the cost of a disk flush per entry.
+
+Example:
+    >>> with Checkpoint("run.checkpoint") as checkpoint:
+    ...     for path in checkpoint.todo(paths):
+    ...         result = parse_pdf(path).to_dict()
+    ...         checkpoint.record(path, content_hash(path), "parsed")
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, TypeVar, Union
+
+from .docket import PDFSource, read_pdf
+
+Source = TypeVar("Source", str, os.PathLike)
+
+PARSED = "parsed"
+FAILED = "failed"
+
+
+class Entry(NamedTuple):
+    """A finished input.
+
+    Attributes:
+        source: Path of the input
+        content_hash: SHA-256 of its contents
+        status: `PARSED`, or `FAILED` if it couldn't be parsed
+        offset: Size of the output once it was written, if the output has
+            one (e.g. a JSON lines file)
+    """
+
+    source: str
+    content_hash: str
+    status: str
+    offset: Optional[int] = None
+
+
+class Checkpoint:
+    """Append-only manifest of finished inputs.
+
+    Args:
+        path: Path of the manifest. Created if it doesn't exist.
+        fsync: Flush each entry to disk before `record` returns
+    """
+
+    def __init__(self, path: Union[str, Path], fsync: bool = False) -> None:
+        self.path = str(path)
+        self.fsync = fsync
+        self._entries: Dict[str, Entry] = {}
+        self._offset: Optional[int] = None
+        self._load()
+        self._fd: Optional[int] = os.open(
+            self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+        )
+
+    def __enter__(self) -> "Checkpoint":  # noqa: D105
+        return self
+
+    def __exit__(self, *exc_info) -> None:  # noqa: D105
+        self.close()
+
+    def __contains__(self, source: object) -> bool:  # noqa: D105
+        return str(source) in self._entries
+
+    def __len__(self) -> int:  # noqa: D105
+        return len(self._entries)
+
+    @property
+    def offset(self) -> Optional[int]:
+        """Output offset of the last entry that had one."""
+        return self._offset
+
+    def get(self, source: Union[str, os.PathLike]) -> Optional[Entry]:
+        """Look up an input.
+
+        Args:
+            source: Path of the input
+
+        Returns:
+            Optional[Entry]: Its latest entry, or `None` if it isn't done
+        """
+        return self._entries.get(os.fspath(source))
+
+    def done(self, source: Union[str, os.PathLike]) -> bool:
+        """Whether an input is done and hasn't changed since.
+
+        Hashes the input if it has an entry, so only inputs that were done
+        before are read.
+
+        Args:
+            source: Path of the input
+
+        Returns:
+            bool: `True` if it can be skipped
+        """
+        entry = self.get(source)
+        if entry is None:
+            return False
+        try:
+            return content_hash(source) == entry.content_hash
+        except OSError:
+            return False
+
+    def todo(self, sources: Iterable[Source]) -> Iterator[Source]:
+        """Skip the inputs that are done, lazily.
+
+        Args:
+            sources: Paths of inputs
+
+        Yields:
+            Source: Inputs that aren't done, or have changed since
+        """
+        for source in sources:
+            if not self.done(source):
+                yield source
+
+    def start(self, offset: int) -> None:
+        """Record how far the output had been written before the first input.
+
+        So that output written by a run that dies before recording any input
+        can be dropped too. Does nothing if an offset is already recorded.
+
+        Args:
+            offset: Offset of the output (see `writers.Writer.offset`)
+        """
+        if self._offset is None:
+            self._write({"offset": offset})
+            self._offset = offset
+
+    def record(
+        self,
+        source: Union[str, os.PathLike],
+        content_hash: str,
+        status: str,
+        offset: Optional[int] = None,
+    ) -> Entry:
+        """Record an input as done.
+
+        Args:
+            source: Path of the input
+            content_hash: SHA-256 of its contents
+            status: `PARSED` or `FAILED`
+            offset: Size of the output once the input's result was written
+
+        Returns:
+            Entry: The entry recorded
+        """
+        entry = Entry(os.fspath(source), content_hash, status, offset)
+        self._write(entry._asdict())
+        self._add(entry)
+        return entry
+
+    def _write(self, fields: Dict) -> None:
+        if self._fd is None:
+            raise ValueError("Checkpoint is closed")
+
+        line = json.dumps(fields, separators=(",", ":")) + "\n"
+        os.write(self._fd, line.encode())
+        if self.fsync:
+            os.fsync(self._fd)
+
+    def close(self) -> None:
+        """Close the manifest."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _load(self) -> None:
+        """Read the manifest, dropping a torn last line."""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+
+        good = 0
+        for line in data.splitlines(keepends=True):
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("Torn line")
+                fields = json.loads(line)
+                if "source" in fields:
+                    self._add(Entry(**fields))
+                else:  # Where the output stood at the start (see `start`)
+                    self._offset = int(fields["offset"])
+            except (ValueError, TypeError, KeyError):
+                break
+            good += len(line)
+
+        if good < len(data):
+            with open(self.path, "r+b") as f:
+                f.truncate(good)
+
+    def _add(self, entry: Entry) -> None:
+        self._entries[entry.source] = entry
+        if entry.offset is not None:
+            self._offset = entry.offset
+
+
+def content_hash(pdf: PDFSource) -> str:
+    """SHA-256 of a pdf's contents.
+
+    Args:
+        pdf: Path, buffer or binary file object of the pdf
+
+    Returns:
+        str: Hex digest
+    """
+    return hashlib.sha256(read_pdf(pdf)).hexdigest()
@@ -0,0 +1,444 @@
+"""Command line interface.
+
+Usage:
+    pollydocket parse dockets/ 'more/*.pdf' [--manifest paths.txt] [-j 8]
+        [--output dockets.jsonl] [--format jsonl] [--cache cache.sqlite]
+        [--checkpoint run.checkpoint]
+    pollydocket watch --state crawl.sqlite --county Centre [--days 30]
+        [--interval 3600] [--once] [--output dockets.jsonl] [--format jsonl]
+"""
+import argparse
+import asyncio
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import (
+    IO,
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
+
+from . import batch, checkpoint, docket, instrument, utils, watch, words, writers
+from .cache import ResultCache
+from .search import PORTAL_URL, Portal, SearchResult
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the command line interface.
+
+    Args:
+        argv: Arguments. Defaults to `sys.argv`.
+
+    Returns:
+        int: Exit status
+    """
+    parser = argparse.ArgumentParser(
+        prog="pollydocket", description="Pennsylvania court dockets."
+    )
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    parse_parser = commands.add_parser(
+        "parse",
+        help="parse pdfs in parallel",
+        description="Parse docket pdfs in worker processes, writing each as it "
+        "finishes and reporting throughput on stderr.",
+    )
+    parse_parser.add_argument(
+        "inputs", nargs="*", help="pdfs, directories (searched recursively) or globs"
+    )
+    parse_parser.add_argument(
+        "--manifest",
+        action="append",
+        help="file listing a pdf per line, or - for stdin (repeatable)",
+    )
+    _add_output_arguments(parse_parser)
+    parse_parser.add_argument(
+        "-j", "--jobs", type=int, help="worker processes (default: CPUs)"
+    )
+    parse_parser.add_argument(
+        "--chunksize", type=int, default=1, help="pdfs sent to a worker at a time"
+    )
+    parse_parser.add_argument(
+        "--backend",
+        choices=docket.BACKENDS,
+        default="pdfplumber",
+        help="how to extract words from pdfs (pdfminer is faster)",
+    )
+    parse_parser.add_argument("--cache", help="SQLite file to cache parsed dockets in")
+    parse_parser.add_argument(
+        "--checkpoint",
+        help="file recording the pdfs done so far; rerunning with it resumes the "
+        "run, skipping them",
+    )
+    parse_parser.add_argument(
+        "-q", "--quiet", action="store_true", help="don't report throughput"
+    )
+
+    watch_parser = commands.add_parser(
+        "watch",
+        help="poll the portal for new and changed dockets",
+        description="Poll the UJS portal for dockets filed recently, and "
+        "download and parse those that are new or have changed since the "
+        "last poll.",
+    )
+    watch_parser.add_argument(
+        "--state", required=True, help="SQLite file of dockets seen so far"
+    )
+    watch_parser.add_argument(
+        "--county", action="append", help="county to search (repeatable)"
+    )
+    watch_parser.add_argument("--docket-type", help="e.g. Criminal")
+    watch_parser.add_argument(
+        "--days", type=int, default=30, help="days of filings to search"
+    )
+    watch_parser.add_argument(
+        "--interval", type=float, default=3600.0, help="seconds between polls"
+    )
+    watch_parser.add_argument("--once", action="store_true", help="poll only once")
+    _add_output_arguments(watch_parser)
+    watch_parser.add_argument(
+        "-j", "--jobs", type=int, help="parsing processes (default: CPUs)"
+    )
+    watch_parser.add_argument(
+        "--concurrency", type=int, default=8, help="requests in flight at once"
+    )
+    watch_parser.add_argument("--portal", default=PORTAL_URL, help=argparse.SUPPRESS)
+
+    args = parser.parse_args(argv)
+    if args.command == "parse":
+        if not args.inputs and not args.manifest:
+            parse_parser.error("no pdfs given")
+        return _parse(args)
+    if args.command == "watch":
+        return _watch(args)
+
+    parser.print_help()
+    return 2
+
+
+def _add_output_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="-",
+        help="file (jsonl) or directory (csv, parquet) to write dockets to",
+    )
+    parser.add_argument("--format", choices=sorted(writers.FORMATS), default="jsonl")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="dockets per csv/parquet part",
+    )
+
+
+class _Parsed(NamedTuple):
+    """A pdf parsed by a `pollydocket parse` worker.
+
+    Attributes:
+        docket_number: Docket number, if it could be found
+        content_hash: SHA-256 of the pdf, if it could be read
+        pages: Number of pages
+        result: Parsed docket, as a dict, or the error parsing it
+        cached: Whether the result came from the cache
+    """
+
+    docket_number: Optional[str]
+    content_hash: Optional[str]
+    pages: int
+    result: Union[Dict, Exception]
+    cached: bool = False
+
+
+def _parse_file(
+    pdf: docket.PDFSource,
+    cache: Optional[ResultCache] = None,
+    backend: str = "pdfplumber",
+) -> _Parsed:
+    """Parse a pdf, noting its docket number, hash and number of pages.
+
+    Run in worker processes by `pollydocket parse` (see `batch.iparse_many`).
+    The pdf is read into memory once, then hashed for the checkpoint, and its
+    first page is read again by `docket.peek` for the docket number, which the
+    parsed sections don't include. Results from the cache have their pages
+    counted from the pdf's page tree.
+
+    Args:
+        pdf: Path, buffer or binary file object of the pdf
+        cache: Cache of parsed dockets
+        backend: How to extract words (see `docket.parse_pdf`)
+
+    Returns:
+        _Parsed: The docket number, hash, pages and result
+    """
+    try:
+        data = docket.read_pdf(pdf)
+    except Exception as e:
+        return _Parsed(None, None, 0, batch.picklable(e))
+
+    pages = []
+    hits = []
+
+    def observe(event: instrument.Event) -> None:
+        if event.phase != "end":
+            return
+        if event.stage == "open":
+            pages.append(event.counts.get("pages", 0))
+        elif event.stage == "cache":
+            hits.append(event.counts.get("hits", 0))
+
+    result: Union[Dict, Exception]
+    try:
+        with instrument.observe(observe):
+            result = docket.parse_pdf(data, cache=cache, backend=backend).to_dict()
+    except Exception as e:
+        result = batch.picklable(e)
+
+    cached = any(hits)
+    if cached:
+        try:
+            with utils.BufferReader(data) as stream:
+                pages.append(words.count_pages(cast(BinaryIO, stream)))
+        except Exception:
+            pass
+
+    try:
+        docket_number = docket.peek(data)["Docket Number"]
+    except Exception:
+        docket_number = None
+
+    return _Parsed(
+        docket_number, checkpoint.content_hash(data), sum(pages), result, cached
+    )
+
+
+def _find_pdfs(
+    inputs: List[str], manifests: Optional[List[str]] = None
+) -> Iterator[str]:
+    """Find the pdfs named on the command line, lazily.
+
+    Args:
+        inputs: Paths of pdfs, directories to search recursively for pdfs, or
+            glob patterns (`**` matches any number of directories)
+        manifests: Paths of files listing a pdf per line ("-" for stdin).
+            Blank lines and lines starting with "#" are skipped.
+
+    Yields:
+        str: Path of each pdf, in the order given
+    """
+    for name in inputs:
+        if os.path.isdir(name):
+            yield from (str(p) for p in sorted(Path(name).rglob("*.pdf")))
+        elif any(c in name for c in "*?["):
+            yield from sorted(glob.iglob(name, recursive=True))
+        else:
+            yield name
+
+    for manifest in manifests or []:
+        if manifest == "-":
+            yield from _manifest_lines(sys.stdin)
+        else:
+            with open(manifest) as f:
+                yield from _manifest_lines(f)
+
+
+def _manifest_lines(f: IO[str]) -> Iterator[str]:
+    for line in f:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+class _Throughput:
+    """Live count of documents and pages parsed, and their rates.
+
+    Documents whose result came from the cache count towards the rates like
+    any other, and the report says how many there were, since they make the
+    rates higher than parsing alone would.
+
+    Args:
+        output: Where to report. Defaults to stderr. Reports overwrite each
+            other (with a carriage return) on a terminal, and are written a
+            line at a time otherwise.
+        interval: Least seconds between reports
+    """
+
+    def __init__(self, output: Optional[IO[str]] = None, interval: float = 1.0) -> None:
+        self.output = output or sys.stderr
+        self.interval = interval
+        self.docs = self.pages = self.failed = self.cached = 0
+        self._start = self._reported = time.monotonic()
+        self._tty = self.output.isatty()
+
+    def add(self, pages: int, failed: bool = False, cached: bool = False) -> None:
+        """Count a parsed document, reporting if it's been long enough.
+
+        Args:
+            pages: Its number of pages
+            failed: Whether it failed to parse
+            cached: Whether its result came from the cache
+        """
+        self.docs += 1
+        self.pages += pages
+        self.failed += failed
+        self.cached += cached
+        now = time.monotonic()
+        if now - self._reported >= self.interval:
+            self._reported = now
+            self._report(now, end="\r" if self._tty else "\n")
+
+    def finish(self) -> None:
+        """Report the final counts."""
+        self._report(time.monotonic(), end="\n")
+
+    def _report(self, now: float, end: str) -> None:
+        elapsed = max(now - self._start, 1e-9)
+        cached = f", {self.cached} cached" if self.cached else ""
+        self.output.write(
+            f"{self.docs} docs ({self.failed} failed{cached}), {self.pages} pages in "
+            f"{elapsed:.1f}s: {self.docs / elapsed:.1f} docs/s, "
+            f"{self.pages / elapsed:.1f} pages/s{end}"
+        )
+        self.output.flush()
+
+
+def _parse(args: argparse.Namespace) -> int:
+    resume = checkpoint.Checkpoint(args.checkpoint) if args.checkpoint else None
+    writer = _open_writer(args)
+    if resume is not None:
+        offset = writer.offset()
+        if resume.offset is not None:
+            # Drop whatever was written after the last checkpointed docket
+            try:
+                writer.truncate(resume.offset)
+            except ValueError as e:
+                writer.close()
+                resume.close()
+                raise SystemExit(
+                    f"Can't resume from {args.checkpoint}: {e}. Remove the "
+                    "checkpoint to start over."
+                )
+        elif offset is not None:
+            resume.start(offset)
+    cache = ResultCache(args.cache) if args.cache else None
+    progress = _Throughput() if not args.quiet else None
+    pdfs = _find_pdfs(args.inputs, args.manifest)
+    results = batch.iparse_many(
+        resume.todo(pdfs) if resume is not None else pdfs,
+        workers=args.jobs,
+        chunksize=args.chunksize,
+        cache=cache,
+        parser=partial(_parse_file, backend=args.backend),
+    )
+    done: List[Tuple[str, str, str]] = []
+    written = writer.offset()
+    try:
+        for path, ret in results:
+            # Anything else is the worker itself failing (e.g. it was killed)
+            parsed = ret if isinstance(ret, _Parsed) else _Parsed(None, None, 0, ret)
+            failed = isinstance(parsed.result, Exception)
+            writer.write(
+                parsed.docket_number or "",
+                parsed.result,
+                extra={"Source": str(path), "Pages": parsed.pages},
+            )
+            if progress is not None:
+                progress.add(parsed.pages, failed, parsed.cached)
+            # pdfs that couldn't be read are tried again next run
+            if resume is not None and parsed.content_hash is not None:
+                status = checkpoint.FAILED if failed else checkpoint.PARSED
+                done.append((str(path), parsed.content_hash, status))
+            # Dockets are only checkpointed once the writer has written them
+            if resume is not None and (written is None or writer.offset() != written):
+                written = writer.offset()
+                _record(resume, done, written)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if resume is not None:
+            writer.flush()
+            _record(resume, done, writer.offset())
+            resume.close()
+        writer.close()
+        if progress is not None:
+            progress.finish()
+
+    return 0
+
+
+def _record(
+    resume: checkpoint.Checkpoint,
+    done: List[Tuple[str, str, str]],
+    offset: Optional[int],
+) -> None:
+    for source, content_hash, status in done:
+        resume.record(source, content_hash, status, offset)
+    done.clear()
+
+
+def _watch(args: argparse.Namespace) -> int:
+    state = watch.CrawlState(args.state)
+    writer = _open_writer(args)
+    loop = asyncio.new_event_loop()
+    try:
+        with ProcessPoolExecutor(args.jobs) as executor:
+            loop.run_until_complete(_watch_counties(args, state, writer, executor))
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        loop.close()
+        state.close()
+        writer.close()
+
+    return 0
+
+
+def _open_writer(args: argparse.Namespace) -> writers.Writer:
+    if args.format == "jsonl":
+        output = sys.stdout if args.output == "-" else args.output
+        return writers.JSONLinesWriter(output)
+    if args.output == "-":
+        raise SystemExit(f"--output must be a directory for {args.format}")
+    return writers.open_writer(args.output, args.format, batch_size=args.batch_size)
+
+
+async def _watch_counties(
+    args: argparse.Namespace,
+    state: watch.CrawlState,
+    writer: writers.Writer,
+    executor: ProcessPoolExecutor,
+) -> None:
+    def sink(result: SearchResult, parsed: Union[Dict, Exception]) -> None:
+        writer.write(result.docket_number, parsed, extra=result.fields)
+
+    async def watch_county(portal: Portal, county: Optional[str]) -> None:
+        async for stats in watch.watch(
+            portal,
+            state,
+            args.days,
+            sink,
+            interval=args.interval,
+            polls=1 if args.once else None,
+            executor=executor,
+            writer=writer,
+            county=county,
+            docket_type=args.docket_type,
+        ):
+            counts = ", ".join(f"{k} {v}" for k, v in stats._asdict().items())
+            print(f"{county or 'All counties'}: {counts}", file=sys.stderr)
+
+    async with Portal(args.portal, concurrency=args.concurrency) as portal:
+        await asyncio.gather(
+            *(watch_county(portal, county) for county in args.county or [None])
+        )
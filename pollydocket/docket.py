@@ -4,59 +4,444 @@ Provides functions to parse dockets. Parsed dockets are `dicts` containing the
 data in the sections of the pdf (e.g. Status Information, Case Information,
 etc.)
 """
+import io
+import mmap
+import os
 import re
+from functools import partial
 from itertools import chain
-from typing import Callable, Dict, List, Tuple, Union
+from typing import (
+    IO,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+    cast,
+)
 
 import pdfplumber
-from pdfplumber.page import CroppedPage, Page
-
-from . import utils
-
-Page = Union[Page, CroppedPage]
+from pdfplumber.page import Page
+
+from . import instrument, utils
+from .cache import ResultCache
+from .templates import TEMPLATES, ColumnTemplate
+from .words import (
+    Y_TOLERANCE,
+    Crop,
+    WordIndex,
+    WordTable,
+    cluster_rows,
+    extract_page,
+    extract_pages,
+    extract_top_band,
+    stack,
+)
 
 # Constant height of bottom material not needed for parsing
 BOTTOM_HEIGHT: float = 128.0
 
+# Height of the top of the first page read by `peek`: the header and the case
+# information section
+PEEK_HEIGHT: float = 320.0
+
+# Ways of extracting words from a pdf: opening it with pdfplumber, or driving
+# pdfminer's interpreter directly (see `words.extract_pages`)
+BACKENDS = ("pdfplumber", "pdfminer")
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+PDFSource = Union[str, os.PathLike, Buffer, IO[bytes], io.RawIOBase]
+
 
-def parse_pdf(path: str) -> Dict:
+def parse_pdf(
+    pdf: PDFSource,
+    cache: Optional[ResultCache] = None,
+    sections: Optional[Iterable[str]] = None,
+    backend: str = "pdfplumber",
+) -> "ParsedDocket":
     """Parse the pdf to a dict.
 
     Splits the pdf into sections deliniated by section headers. These sections
-    are then passed to their corresponding parsers.
+    are then passed to their corresponding parsers when they are first
+    accessed.
 
     Args:
-        path: path to pdf to parse
+        pdf: pdf to parse. Either a path, the pdf's contents in a buffer (e.g.
+            `bytes`, `memoryview` or `mmap`) or a seekable binary file object.
+            Buffers are parsed in place without being copied.
+        cache: Cache to look up the result in first (and store it in after
+            parsing). Only complete results are cached, so nothing is stored
+            when `sections` is given.
+        sections: Sections to parse (e.g. `["Case Information"]`). Other
+            sections are left out of the result. Defaults to all sections.
+        backend: How to extract words, one of `BACKENDS`. "pdfminer" skips
+            building pdfplumber's layout objects and is faster; both give the
+            same result.
 
     Returns:
-        Dict: Dict of parsed pdf with sections as top-level keys
+        ParsedDocket: Mapping of parsed pdf with sections as top-level keys
     """
-    parsers: Dict[str, Callable] = {
-        "Case Information": _parse_case_info,
-        "Status Information": _parse_status_info,
-        "Calendar Events": _parse_cal_events,
-        "Defendant Information": _parse_defendant_info,
-        "Case Participants": _parse_case_participants,
-        "Bail": _parse_bail,
-        "Charges": _parse_charges,
-        "Docket Entry Information": _parse_docket_entry_info,
-    }
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}")
+
+    wanted = None if sections is None else set(sections)
+    if cache is None:
+        return _parse(pdf, wanted, backend)
+
+    data = read_pdf(pdf)
+    with instrument.stage("cache") as st:
+        key = cache.key(data)
+        cached = cache.get(key)
+        st.count(hits=int(cached is not None))
+    if cached is not None:
+        return ParsedDocket(
+            parsed={k: v for k, v in cached.items() if wanted is None or k in wanted}
+        )
+
+    ret = _parse(data, wanted, backend)
+    if wanted is None:
+        cache.put(key, ret.to_dict())
+
+    return ret
+
+
+def read_pdf(pdf: PDFSource) -> Buffer:
+    """Get the contents of a pdf.
+
+    Buffers are returned as they are; paths and file objects are read.
+
+    Args:
+        pdf: Path, buffer or binary file object of a pdf
+
+    Returns:
+        Buffer: Contents of the pdf
+    """
+    if isinstance(pdf, (bytes, bytearray, memoryview, mmap.mmap)):
+        return pdf
+
+    if isinstance(pdf, (str, os.PathLike)):
+        with open(pdf, "rb") as f:
+            return f.read()
+
+    return pdf.read()
+
+
+def peek(pdf: PDFSource, max_top: float = PEEK_HEIGHT) -> Dict[str, Optional[str]]:
+    """Identify a docket from the top of its first page.
+
+    Much faster than `parse_pdf` since only the header at the top of the first
+    page (and the case information under it) is read; the rest of the pdf is
+    never processed.
+
+    Args:
+        pdf: Path, buffer or binary file object of the pdf
+        max_top: How far down the first page to read, in points
+
+    Returns:
+        Dict[str, Optional[str]]: "Docket Number" (e.g.
+            "MJ-49302-CV-0000005-2022"), "Docket Type" (e.g. "Civil"),
+            "Court" (e.g. "Court of Common Pleas") and "County" (e.g.
+            "Centre"). Anything that couldn't be found is `None`.
+    """
+    if isinstance(pdf, (bytes, bytearray, memoryview, mmap.mmap)):
+        with utils.BufferReader(pdf) as stream:
+            return peek(stream, max_top)
+
+    if isinstance(pdf, (str, os.PathLike)):
+        with open(pdf, "rb") as f:
+            return peek(f, max_top)
+
+    page = extract_top_band(cast(BinaryIO, pdf), max_top)
+    headings = _get_headings([page])[0]
+    header = page
+    if len(headings) > 1:
+        header = page.within_bbox((0, 0, page.width, headings[1]["top"]))
+
+    ret: Dict[str, Optional[str]] = dict.fromkeys(
+        ["Docket Number", "Docket Type", "Court", "County"]
+    )
+    lines = [line.strip() for line in header.extract_text().splitlines()]
+    for line, next_line in zip(lines, lines[1:] + [""]):
+        match = re.match(r"Docket Number:\s*(\S+)", line)
+        if match is not None:
+            ret["Docket Number"] = match.group(1)
+            docket_type = re.sub(r"\s*docket$", "", next_line, flags=re.IGNORECASE)
+            ret["Docket Type"] = (
+                docket_type.title() if docket_type.isupper() else docket_type
+            ) or None
+            break
+
+    if lines and lines[0] != "DOCKET":
+        match = re.match(r"(.+) of (.+) county$", lines[0], flags=re.IGNORECASE)
+        if match is not None:
+            ret["Court"] = match.group(1).title().replace(" Of ", " of ")
+            ret["County"] = match.group(2).title()
+        else:
+            ret["Court"] = lines[0]
+
+    if ret["County"] is None:
+        ret["County"] = _word_after(page, "County:")
+
+    return ret
+
 
-    with pdfplumber.open(path) as pdf:
-        pages = pdf.pages
+def _word_after(page: Crop, text: str) -> Optional[str]:
+    """Text of the word just right of the word `text` on the same line."""
+    t = page.table
+    key = page.index.find(text)
+    if key is None:
+        return None
+
+    after = [
+        i
+        for i in page.rows
+        if abs(t.bottom[i] - t.bottom[key]) < 1 and t.x0[i] > t.x1[key]
+    ]
+    if not after:
+        return None
+
+    return t.text[min(after, key=t.x0.__getitem__)].strip()
+
+
+def _parse(
+    pdf_file: PDFSource,
+    wanted: Optional[Set[str]] = None,
+    backend: str = "pdfplumber",
+) -> "ParsedDocket":
+    """Parse a pdf without caching.
+
+    Args:
+        pdf_file: Path, buffer or binary file object of the pdf
+        wanted: Sections to include. Defaults to all sections.
+        backend: How to extract words (see `BACKENDS`)
+
+    Returns:
+        ParsedDocket: Mapping of parsed pdf with sections as top-level keys
+    """
+    if isinstance(pdf_file, (bytes, bytearray, memoryview, mmap.mmap)):
+        with utils.BufferReader(pdf_file) as stream:
+            return _parse(stream, wanted, backend)
+
+    with instrument.stage("open") as st:
+        pages = list(_extract_pages(pdf_file, backend))
+        docket_type = _docket_type(pages)
+        if st:
+            st.docket_type = docket_type
+            st.count(pages=len(pages), words=sum(len(p.rows) for p in pages))
+
+    with instrument.stage("headings", docket_type) as st:
         headings = _get_headings(pages)
+        st.count(headings=sum(len(h) for h in headings))
 
-    sections = _split_pages(pages, headings)
+    with instrument.stage("split", docket_type) as st:
+        sections = _split_pages(pages, headings)
+        st.count(sections=len(sections))
 
-    ret = {}
+    pending = {}
     for sect, page in sections.items():
-        if sect != "Docket":  # Don't care about the "docket" section
-            ret[sect] = parsers[sect](page)
+        if sect == "Docket":  # Don't care about the "docket" section
+            continue
+        if wanted is None or sect in wanted:
+            pending[sect] = (_section_parser(sect, docket_type), page)
+
+    return ParsedDocket(pending=pending)
+
+
+def stream_pdf(
+    pdf: PDFSource,
+    sections: Optional[Iterable[str]] = None,
+    backend: str = "pdfplumber",
+) -> Iterator[Tuple[str, Dict]]:
+    """Parse a pdf one page at a time.
+
+    Each page's sections are parsed and yielded before the next page is read,
+    and pdfplumber's caches for the page are released as soon as its words are
+    extracted, so memory use doesn't grow with the length of the docket.
+
+    A section that spans pages is yielded once per page it is on, as separate
+    fragments.
 
+    Args:
+        pdf: Path, buffer or binary file object of the pdf to parse
+        sections: Sections to parse (e.g. `["Docket Entry Information"]`).
+            Defaults to all sections.
+        backend: How to extract words (see `parse_pdf`)
+
+    Yields:
+        Tuple[str, Dict]: Section heading and parsed section fragment
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}")
+
+    wanted = None if sections is None else set(sections)
+    if isinstance(pdf, (bytes, bytearray, memoryview, mmap.mmap)):
+        with utils.BufferReader(pdf) as stream:
+            yield from stream_pdf(stream, wanted, backend)
+        return
+
+    docket_type = None
+    for i, page in enumerate(_extract_pages(pdf, backend)):
+        if i == 0:
+            docket_type = _docket_type([page])
+
+        for sect, crop in _split_page(page, _get_headings([page])[0]):
+            if sect == "Docket":
+                continue
+            if wanted is None or sect in wanted:
+                yield sect, _section_parser(sect, docket_type)(crop)
+
+
+def _extract_pages(pdf: PDFSource, backend: str) -> Iterator[Crop]:
+    """Extract the words of each page of a path or binary file object.
+
+    The pdf is closed once every page has been extracted (or the iterator is
+    closed).
+    """
+    if isinstance(pdf, os.PathLike):
+        pdf = os.fspath(pdf)
+
+    if backend == "pdfminer":
+        if isinstance(pdf, str):
+            with open(pdf, "rb") as f:
+                yield from extract_pages(f)
+        else:
+            yield from extract_pages(cast(BinaryIO, pdf))
+        return
+
+    with pdfplumber.open(pdf) as doc:
+        for page in doc.pages:
+            yield _extract_and_flush(page)
+
+
+def _extract_and_flush(page: Page) -> Crop:
+    """Extract a page's words, then drop pdfplumber's caches for the page.
+
+    The words are all that's needed from a page, and the cached layout objects
+    are many times larger than them.
+    """
+    ret = extract_page(page)
+    page.flush_cache()
     return ret
 
 
-def _get_headings(pages: List[Page]) -> List[List[Dict]]:
+def _docket_type(pages: List[Crop]) -> Optional[str]:
+    """Court and case type of a docket (e.g. "MJ-CR"), from its docket number."""
+    if not pages:
+        return None
+
+    pat = re.compile(r"Docket Number:\s*(\w+)-\w+-(\w+)-")
+    for text in pages[0].table.text:
+        match = pat.match(text)
+        if match is not None:
+            return f"{match.group(1)}-{match.group(2)}"
+
+    return None
+
+
+def _section_parser(sect: str, docket_type: Optional[str]) -> Callable[[Crop], Dict]:
+    """Parser of a section of a docket of type `docket_type`."""
+    parser = partial(PARSERS[sect], docket_type=docket_type)
+    if instrument.observing():
+        return _instrumented(parser, sect, docket_type)
+
+    return parser
+
+
+def _instrumented(
+    parser: Callable[[Crop], Dict], sect: str, docket_type: Optional[str]
+) -> Callable[[Crop], Dict]:
+    """Wrap a section parser so it emits "parse" events."""
+
+    def parse(page: Crop) -> Dict:
+        with instrument.stage("parse", docket_type, sect) as st:
+            ret = parser(page)
+            st.count(words=len(page.rows), keys=len(ret))
+            if "Items" in ret:
+                st.count(rows=len(ret["Items"]))
+        return ret
+
+    return parse
+
+
+class ParsedDocket(Mapping[str, Dict]):
+    """Parsed docket.
+
+    Read-only mapping of section names to parsed sections. Each section is
+    kept as its `Crop` until it is first accessed, at which point it is parsed
+    and the result remembered. Sections that are never accessed are never
+    parsed.
+
+    Pickling (e.g. returning one from a worker process) parses every section
+    and keeps only the results.
+
+    Args:
+        pending: Parser and crop of each section, in document order
+        parsed: Already parsed sections
+    """
+
+    def __init__(
+        self,
+        pending: Optional[Dict[str, Tuple[Callable, Crop]]] = None,
+        parsed: Optional[Dict[str, Dict]] = None,
+    ):
+        self._pending = dict(pending or {})
+        self._parsed = dict(parsed or {})
+        self._keys = list(self._parsed) + list(self._pending)
+
+    def __getitem__(self, sect: str) -> Dict:  # noqa: D105
+        try:
+            return self._parsed[sect]
+        except KeyError:
+            pass
+
+        parser, page = self._pending[sect]
+        ret = self._parsed[sect] = parser(page)
+        # Only once it's parsed, so a section that fails stays pending
+        del self._pending[sect]
+        return ret
+
+    def __contains__(self, sect: object) -> bool:  # noqa: D105
+        return sect in self._parsed or sect in self._pending
+
+    def __iter__(self) -> Iterator[str]:  # noqa: D105
+        return iter(self._keys)
+
+    def __len__(self) -> int:  # noqa: D105
+        return len(self._keys)
+
+    def __repr__(self) -> str:  # noqa: D105
+        parsed = ", ".join(f"{k!r}: {v!r}" for k, v in self._parsed.items())
+        return f"<ParsedDocket {{{parsed}}} unparsed={list(self._pending)}>"
+
+    def __getstate__(self) -> Dict:  # noqa: D105
+        return {"parsed": self.to_dict()}
+
+    def __setstate__(self, state: Dict) -> None:  # noqa: D105
+        self._pending = {}
+        self._parsed = state["parsed"]
+        self._keys = list(self._parsed)
+
+    @property
+    def unparsed(self) -> List[str]:
+        """Sections that haven't been parsed yet."""
+        return list(self._pending)
+
+    def to_dict(self) -> Dict[str, Dict]:
+        """Parse every section.
+
+        Returns:
+            Dict: Dict of parsed pdf with sections as top-level keys
+        """
+        return {sect: self[sect] for sect in self._keys}
+
+
+def _get_headings(pages: List[Crop]) -> List[List[Dict]]:
     """Gets section headings.
 
     Gets section headings including their metadata (e.g. fontsize, bounding
@@ -64,19 +449,19 @@ def _get_headings(pages: List[Page]) -> List[List[Dict]]:
     page.
 
     Args:
-        pages: PDF pages
+        pages: Words of each PDF page (e.g. returned from `words.extract_page`)
 
     Returns:
         List[List[Dict]]: List of section headings per page
     """
     headings = []
     for page in pages:
-        words = page.extract_words(keep_blank_chars=True, extra_attrs=["size"])
+        t = page.table
         headings.append(
             [
-                w
-                for w in words
-                if (w["text"].isupper() and w["size"] > 8.5 and w["size"] < 12)
+                t.word(i)
+                for i in page.rows
+                if (t.text[i].isupper() and t.size[i] > 8.5 and t.size[i] < 12)
             ]
         )
 
@@ -84,38 +469,61 @@ def _get_headings(pages: List[Page]) -> List[List[Dict]]:
 
 
 def _split_pages(
-    pages: List[Page], headings_by_page: List[List[Dict]]
-) -> Dict[str, Page]:
+    pages: List[Crop], headings_by_page: List[List[Dict]]
+) -> Dict[str, Crop]:
     """Splits pages based on their section headings.
 
+    Sections that run over several pages are merged into a single `Crop`, so
+    each section is parsed once, from all of its words.
+
     Args:
-        pages: PDF pages
+        pages: Words of each PDF page
         headings_by_page: All headings in a pdf separated by page (e.g. returned
             from get_headings)
 
     Returns:
-        Dict: keys are section headings, values are `CroppedPage`
+        Dict: keys are section headings, values are `Crop`
     """
-    sects = {}
+    # A section continued on the next page is headed again there, so each
+    # section is a list of fragments in page order
+    fragments: Dict[str, List[Crop]] = {}
     for page, headings in zip(pages, headings_by_page):
-        pairs = list(utils.pairwise(headings))
+        for sect, crop in _split_page(page, headings):
+            fragments.setdefault(sect, []).append(crop)
 
-        for pair in pairs:
-            # Handles case where two headings are in a header bar
-            # (e.g. Commonwealth Information --- Attorney Information)
-            if pair[1]["bottom"] - pair[0]["bottom"] < 1:
-                continue
-            bbox = _calc_bbox(page, pair[0], pair[1])
-            sects[str.title(pair[0]["text"])] = page.within_bbox(bbox)
+    return {sect: stack(crops) for sect, crops in fragments.items()}
 
-        last = pairs[-1][1]
-        bbox = (0, last["bottom"], page.width, page.height - BOTTOM_HEIGHT)
-        sects[str.title(last["text"])] = page.within_bbox(bbox)
+
+def _split_page(page: Crop, headings: List[Dict]) -> List[Tuple[str, Crop]]:
+    """Splits a single page based on its section headings.
+
+    Args:
+        page: Words of the PDF page
+        headings: Headings on the page (e.g. from `_get_headings`)
+
+    Returns:
+        List[Tuple[str, Crop]]: Section heading and crop of each section, in
+            order down the page
+    """
+    sects = []
+    pairs = list(utils.pairwise(headings))
+
+    for pair in pairs:
+        # Handles case where two headings are in a header bar
+        # (e.g. Commonwealth Information --- Attorney Information)
+        if pair[1]["bottom"] - pair[0]["bottom"] < 1:
+            continue
+        bbox = _calc_bbox(page, pair[0], pair[1])
+        sects.append((str.title(pair[0]["text"]), page.within_bbox(bbox)))
+
+    last = pairs[-1][1]
+    bbox = (0, last["bottom"], page.width, page.height - BOTTOM_HEIGHT)
+    sects.append((str.title(last["text"]), page.within_bbox(bbox)))
 
     return sects
 
 
-def _calc_bbox(page: Page, h1: Dict, h2: Dict) -> Tuple:
+def _calc_bbox(page: Crop, h1: Dict, h2: Dict) -> Tuple:
     """Gets bounding box between two headings.
 
     Args:
@@ -129,81 +537,83 @@ def _calc_bbox(page: Page, h1: Dict, h2: Dict) -> Tuple:
     return (0, h1["bottom"], page.width, h2["top"])
 
 
-def _join_words(w1: Dict, w2: Dict) -> Dict:
-    """Join two word dicts.
+def _get_columns(index: WordIndex, headers: List[str]) -> List[List[int]]:
+    """Finds columns based on headers.
 
-    Join the text of two words and correct x dimensions
+    Finds column members by finding all words in `index` that are below `head`
+    and have (roughly) the same x0 value as `header[i]` for all headers in
+    `headers`. Columns are not padded; empty cells are found when the columns
+    are lined up by `_columns_to_items_list`.
 
     Args:
-        w1: Left word
-        w2: Right word
+        index: Index of the section's words
+        headers: List of column headers
 
     Returns:
-        Dict: Joined word
+        List[List[int]]: Rows of the words in each column, header first
     """
-    temp = w1
-    temp["text"] = w1["text"] + " " + w2["text"]
-    temp["x0"] = w1["x0"]
-    temp["x1"] = w2["x1"]
+    cols = []
+    for header in headers:
+        head = index.find(header)
+        if head is None:
+            raise ValueError(f"Column header {header!r} not found")
+        cols.append(index.column(head))
 
-    return temp
+    return cols
 
 
-def _get_columns(words: List, headers: List[str]) -> List:
-    """Finds columns based on headers.
+def _columns_to_items_list(
+    cols: List[List[int]], headers: List[str], table: WordTable
+) -> List[Dict]:
+    """Line columns up into rows.
 
-    Finds column members by finding all words in `words` that are below `head`
-    and have (roughly) the same x0 value as `header[i]` for all headers in
-    `headers`. Pads lists with "{"text": ""} which is the pdfplumber equivalent
-    of an empty string.
+    Column members are clustered into rows by their `bottom`, so a row with an
+    empty cell gets "" for that column rather than the next row's value.
+    Words of the same column in the same row are joined with a space. Rows
+    that repeat the headers are dropped.
 
     Args:
-        words: List of word objects
+        cols: Rows of the words in each column, header first
         headers: List of column headers
+        table: Table holding the words
 
     Returns:
-        List: Cells of the column
+        List[Dict]: Dict of header to cell text for each row below the headers
     """
-    cols = []
-    for header in headers:
-        head = next((w for w in words if w["text"] == header))
-        rows = []
-        for word in words:
-            left_aligned = abs(word["x0"] - head["x0"]) < 0.5
-            right_aligned = abs(word["x1"] - head["x1"]) < 0.5
-            below_header = word["bottom"] >= head["bottom"]
-
-            if (left_aligned or right_aligned) and below_header:
-                rows.append(word)
+    columns_of: Dict[int, List[int]] = {}
+    for c, col in enumerate(cols):
+        for i in col:
+            columns_of.setdefault(i, []).append(c)
+    heads = {col[0] for col in cols}
 
-        cols.append(rows)
-
-    num_rows = max(len(x) for x in cols)
-    for col in cols:
-        col += [{"text": ""}] * (num_rows - len(col))
-
-    return cols
+    ret = []
+    for line in cluster_rows(list(columns_of), table.bottom, Y_TOLERANCE):
+        if heads.intersection(line):
+            continue
 
+        cells: List[List[str]] = [[] for _ in headers]
+        for i in sorted(line, key=table.x0.__getitem__):
+            for c in columns_of[i]:
+                cells[c].append(table.text[i])
+        texts = [" ".join(v) for v in cells]
+        if texts == headers:
+            continue  # Headers repeated where a table continues on a new page
+        ret.append(dict(zip(headers, texts)))
 
-def _columns_to_items_list(cols: List, headers: List[str]) -> List[Dict]:
-    rows = [list(a) for a in zip(*cols)]
-    ret = []
-    for row in rows[1:]:  # First row is the headers
-        ret.append({k: v["text"] for k, v in zip(headers, row)})
     return ret
 
 
-def _split_page_by_x(page: Page, splits: Union[float, List[float]]) -> List:
+def _split_page_by_x(page: Crop, splits: Union[float, List[float]]) -> List:
     """Split page at `locs`.
 
     Splits a page at the x coordinates in `locs`
 
     Args:
-        page: PDF Page (or CroppedPage)
+        page: Words of a PDF page (or section)
         splits: List of x locations to split `page` at
 
     Returns:
-        List: List of CroppedPage
+        List: List of Crop
     """
     # Since we're bounding with pairs, the first pair has to contain the left
     # edge and the last pair has to contain the right edge
@@ -218,7 +628,9 @@ def _split_page_by_x(page: Page, splits: Union[float, List[float]]) -> List:
     return sects
 
 
-def _parse_col_with_headers_sect(page: Page, headers: List[str]) -> Dict:
+def _parse_col_with_headers_sect(
+    page: Crop, headers: List[str], template_key: Optional[Tuple[str, str]] = None
+) -> Dict:
     """Parse a section that is columnar with potential key-value pairs.
 
     Takes a section and list of headers, then searches for those headers in the
@@ -238,43 +650,64 @@ def _parse_col_with_headers_sect(page: Page, headers: List[str]) -> Dict:
     }
 
 
+    The columns are found using the template learned for `template_key` if
+    there is one and the section matches it (see `templates`). Otherwise the
+    headers are searched for, and a template is learned from where they are.
+
     Args:
-        page: PDF Page. Should be the cropped section of interest.
+        page: Words of the section of interest.
         headers: List of column headers. Everything else will be parsed as
             key-value pairs
+        template_key: Docket type and section, to look up and learn templates
+            by
 
     Returns:
         Dict: Parsed section with key-value pairs and a list of Dicts "items"
     """
-    words = page.extract_words(keep_blank_chars=True)
     ret: Dict = {}
 
-    cols = _get_columns(words, headers)
-    ret["Items"] = _columns_to_items_list(cols, headers)
+    t = page.table
+    template = None if template_key is None else TEMPLATES.get(template_key)
+    cols = None
+    if template is not None and template.headers == tuple(headers):
+        cols = template.columns(page)
+    learn = cols is None
+    if cols is None:
+        cols = _get_columns(page.index, headers)
+    ret["Items"] = _columns_to_items_list(cols, headers, t)
 
-    unused = [w for w in words if w not in chain(*cols)]
-    unused = list(sorted(unused, key=lambda w: (w["bottom"], w["x0"])))
+    used = set(chain(*cols))
+    unused = [i for i in page.rows if i not in used]
+    unused.sort(key=lambda i: (t.bottom[i], t.x0[i]))
 
     # Key-value pairs can potentially be separeted and not joined during
     # extract_words. It's easiest to attempt to join them then parse with regex.
+    # Joined pairs go after the words that weren't joined.
     sep = 20
-    pairs = utils.pairwise(unused.copy())
-    for w1, w2 in pairs:
-        if (w2['x0'] - w1['x1'] < sep) and (abs(w1["bottom"] - w2["bottom"]) < 0.5):
-            unused.remove(w1)
-            unused.remove(w2)
-            unused.append(_join_words(w1, w2))
-            try:
-                next(pairs)
-            except StopIteration:
-                pass
+    kept = []
+    joined = []
+    n = 0
+    while n < len(unused):
+        i1 = unused[n]
+        i2 = unused[n + 1] if n + 1 < len(unused) else None
+        if (
+            i2 is not None
+            and (t.x0[i2] - t.x1[i1] < sep)
+            and (abs(t.bottom[i1] - t.bottom[i2]) < 0.5)
+        ):
+            joined.append(t.text[i1] + " " + t.text[i2])
+            n += 2
+        else:
+            kept.append(t.text[i1])
+            n += 1
+    texts = kept + joined
 
     pat = re.compile(r"([\w\s]+):\s*(.*)?")
     still_unused = []
-    for w in unused:
-        match = pat.match(w['text'])
+    for text in texts:
+        match = pat.match(text)
         if match is None:
-            still_unused.append(w)
+            still_unused.append(text)
             continue
 
         if match.group(2):
@@ -283,21 +716,26 @@ def _parse_col_with_headers_sect(page: Page, headers: List[str]) -> Dict:
             ret[match.group(1)] = ""
 
     still_unused_iter = iter(still_unused)
-    for w in still_unused_iter:
-        ret[w["text"].replace(":", "")] = next(still_unused_iter)["text"]
+    for text in still_unused_iter:
+        ret[text.replace(":", "")] = next(still_unused_iter)
+
+    if learn and template_key is not None:
+        TEMPLATES.put(template_key, ColumnTemplate.learn(page, [c[0] for c in cols]))
 
     return ret
 
 
-def _parse_case_info(page: Page, pad: float = 10.0) -> Dict:
+def _parse_case_info(
+    page: Crop, pad: float = 10.0, docket_type: Optional[str] = None
+) -> Dict:
     # FIXME: Breaks if >2 things on one line (e.g. OTN/LOTN)
     # FIXME: Breaks if line wraps
     # FIXME: Breaks on CP Criminal Docket (Case Local info)
     texts = []
     pat = re.compile(r"([\s\S]+):\s?(.*)")
     splits = _split_page_by_x(page, page.width // 2 - pad)
-    texts += splits[0].extract_text(keep_blank_chars=True).splitlines()
-    texts += splits[1].extract_text(keep_blank_chars=True).splitlines()
+    texts += splits[0].extract_text().splitlines()
+    texts += splits[1].extract_text().splitlines()
 
     ret = {}
     for text in texts:
@@ -310,24 +748,25 @@ def _parse_case_info(page: Page, pad: float = 10.0) -> Dict:
     return ret
 
 
-def _parse_status_info(page: Page) -> Dict:
+def _parse_status_info(page: Crop, docket_type: Optional[str] = None) -> Dict:
     headers = ["Status Date", "Processing Status"]
-    return _parse_col_with_headers_sect(page, headers)
+    key = None if docket_type is None else (docket_type, "Status Information")
+    return _parse_col_with_headers_sect(page, headers, key)
 
 
-def _parse_cal_events(page: Page) -> Dict:
+def _parse_cal_events(page: Crop, docket_type: Optional[str] = None) -> Dict:
     return {}
 
 
-def _parse_defendant_info(page: Page) -> Dict:
+def _parse_defendant_info(page: Crop, docket_type: Optional[str] = None) -> Dict:
     return {}
 
 
-def _parse_case_participants(page: Page) -> Dict:
+def _parse_case_participants(page: Crop, docket_type: Optional[str] = None) -> Dict:
     return {}
 
 
-def _parse_bail(page: Page) -> Dict:
+def _parse_bail(page: Crop, docket_type: Optional[str] = None) -> Dict:
     headers = [
         "Bail Action Type",
         "Bail Action Date",
@@ -335,12 +774,27 @@ def _parse_bail(page: Page) -> Dict:
         "Percentage",
         "Amount",
     ]
-    return _parse_col_with_headers_sect(page, headers)
+    key = None if docket_type is None else (docket_type, "Bail")
+    return _parse_col_with_headers_sect(page, headers, key)
 
 
-def _parse_charges(page: Page) -> Dict:
+def _parse_charges(page: Crop, docket_type: Optional[str] = None) -> Dict:
     return {}
 
 
-def _parse_docket_entry_info(page: Page) -> Dict:
+def _parse_docket_entry_info(page: Crop, docket_type: Optional[str] = None) -> Dict:
     return {}
+
+
+# Parser of each section, by section heading. Parsers are passed the docket's
+# type (e.g. "MJ-CR") as `docket_type` when it is known.
+PARSERS: Dict[str, Callable[..., Dict]] = {
+    "Case Information": _parse_case_info,
+    "Status Information": _parse_status_info,
+    "Calendar Events": _parse_cal_events,
+    "Defendant Information": _parse_defendant_info,
+    "Case Participants": _parse_case_participants,
+    "Bail": _parse_bail,
+    "Charges": _parse_charges,
+    "Docket Entry Information": _parse_docket_entry_info,
+}
@@ -0,0 +1,435 @@
+"""Minimal asyncio HTTP/1.1 client.
+
+Just enough HTTP for talking to the UJS portal: requests are sent over a pool
+of keep-alive connections per host, so many concurrent searches and downloads
+share a handful of TCP (and TLS) connections instead of opening one each.
+Responses are read completely into memory, which suits html pages and docket
+pdfs, up to a size limit. Cookies are kept per host and only sent back to the
+host that set them.
+
+Only the standard library is used; there is no streaming, proxy or HTTP/2
+support.
+"""
+import asyncio
+import ssl
+from http.cookies import SimpleCookie
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import urlencode, urljoin, urlsplit
+
+Headers = List[Tuple[str, str]]
+
+# Statuses that are redirects, and whether the method becomes GET
+_REDIRECTS = {301: False, 302: True, 303: True, 307: False, 308: False}
+MAX_REDIRECTS = 5
+# Methods safe to send again if a connection fails under them (RFC 7231 4.2.2)
+_IDEMPOTENT = {"GET", "HEAD", "OPTIONS", "TRACE", "PUT", "DELETE"}
+MAX_RESPONSE_SIZE = 64 << 20
+
+
+class HTTPError(Exception):
+    """Error response from a server.
+
+    Args:
+        response: The response
+    """
+
+    def __init__(self, response: "Response") -> None:
+        super().__init__(f"{response.status} {response.reason} ({response.url})")
+        self.response = response
+
+
+class ResponseTooLarge(Exception):
+    """Response body larger than the client accepts.
+
+    Args:
+        limit: Largest body accepted, in bytes
+    """
+
+    def __init__(self, limit: int) -> None:
+        super().__init__(f"Response larger than {limit} bytes")
+        self.limit = limit
+
+
+class Response:
+    """A complete HTTP response.
+
+    Args:
+        url: URL that was requested
+        status: Status code
+        reason: Reason phrase
+        headers: Headers in the order they were received
+        body: Body, decoded from any chunked transfer encoding
+    """
+
+    def __init__(
+        self, url: str, status: int, reason: str, headers: Headers, body: bytes
+    ) -> None:
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def __repr__(self) -> str:  # noqa: D105
+        return f"<Response {self.status} {self.url}>"
+
+    def header(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        """Value of the first header called `name` (case-insensitive)."""
+        name = name.lower()
+        for k, v in self.headers:
+            if k.lower() == name:
+                return v
+        return default
+
+    def text(self, encoding: str = "utf-8") -> str:
+        """Body decoded as text."""
+        return self.body.decode(encoding, errors="replace")
+
+    def raise_for_status(self) -> None:
+        """Raise an `HTTPError` for 4xx and 5xx responses."""
+        if self.status >= 400:
+            raise HTTPError(self)
+
+
+class _Connection:
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.used = False
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class ConnectionPool:
+    """Keep-alive connections to a single host.
+
+    At most `max_connections` requests are in flight at once; more wait for a
+    connection to come free. Idle connections are reused, most recently used
+    first.
+
+    Args:
+        scheme: "http" or "https"
+        host: Host name
+        port: Port number
+        max_connections: Largest number of open connections
+        ssl_context: TLS settings for "https". Defaults to the system's.
+        max_response_size: Largest response body, in bytes. Larger ones raise
+            `ResponseTooLarge`.
+    """
+
+    def __init__(
+        self,
+        scheme: str,
+        host: str,
+        port: int,
+        max_connections: int = 8,
+        ssl_context: Optional[ssl.SSLContext] = None,
+        max_response_size: int = MAX_RESPONSE_SIZE,
+    ) -> None:
+        if scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported scheme {scheme!r}")
+
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.ssl = (
+            (ssl_context or ssl.create_default_context()) if scheme == "https" else None
+        )
+        self.max_response_size = max_response_size
+        self.connections_opened = 0
+        self._slots = asyncio.Semaphore(max_connections)
+        self._idle: List[_Connection] = []
+
+    async def request(
+        self, method: str, target: str, headers: Headers, body: bytes = b""
+    ) -> Tuple[int, str, Headers, bytes]:
+        """Send a request and read its response.
+
+        Idle connections the server has closed are skipped. A reused
+        connection that turns out to have been closed by the server anyway is
+        retried on a new connection, but only for idempotent methods (e.g.
+        GET): the server may have acted on a POST before closing.
+
+        Args:
+            method: Request method
+            target: Path and query of the request
+            headers: Request headers. Host, Content-Length and Connection are
+                added.
+            body: Request body
+
+        Returns:
+            Tuple[int, str, Headers, bytes]: Status, reason, headers and body
+        """
+        async with self._slots:
+            while True:
+                conn = await self._connect()
+                try:
+                    ret, keep_alive = await self._exchange(
+                        conn, method, target, headers, body
+                    )
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    conn.close()
+                    if conn.used and method in _IDEMPOTENT:
+                        continue  # Went stale while idle
+                    raise
+                except BaseException:
+                    conn.close()
+                    raise
+
+                if keep_alive:
+                    conn.used = True
+                    self._idle.append(conn)
+                else:
+                    conn.close()
+                return ret
+
+    def close(self) -> None:
+        """Close the idle connections."""
+        while self._idle:
+            self._idle.pop().close()
+
+    async def _connect(self) -> _Connection:
+        while self._idle:
+            conn = self._idle.pop()
+            if not conn.reader.at_eof():
+                return conn
+            conn.close()  # Closed by the server while idle
+
+        reader, writer = await asyncio.open_connection(
+            self.host, self.port, ssl=self.ssl
+        )
+        self.connections_opened += 1
+        return _Connection(reader, writer)
+
+    async def _exchange(
+        self, conn: _Connection, method: str, target: str, headers: Headers, body: bytes
+    ) -> Tuple[Tuple[int, str, Headers, bytes], bool]:
+        host = self.host
+        if self.port != (443 if self.scheme == "https" else 80):
+            host = f"{host}:{self.port}"
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {host}"]
+        lines += [f"{k}: {v}" for k, v in headers]
+        if body or method in ("POST", "PUT"):
+            lines.append(f"Content-Length: {len(body)}")
+        lines.append("Connection: keep-alive")
+        conn.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await conn.writer.drain()
+
+        status_line = await conn.reader.readuntil(b"\r\n")
+        if not status_line.strip():
+            raise ConnectionResetError("Connection closed without a response")
+        version, status, reason = (status_line.decode("latin-1").rstrip() + " ").split(
+            " ", 2
+        )
+        resp_headers = []
+        while True:
+            line = await conn.reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            resp_headers.append((name.strip(), value.strip()))
+
+        fields = {k.lower(): v for k, v in resp_headers}
+        keep_alive = version == "HTTP/1.1" and fields.get("connection") != "close"
+        code = int(status)
+        limit = self.max_response_size
+        if method == "HEAD" or code in (204, 304) or 100 <= code < 200:
+            resp_body = b""
+        elif fields.get("transfer-encoding", "").lower() == "chunked":
+            resp_body = await _read_chunked(conn.reader, limit)
+        elif "content-length" in fields:
+            length = int(fields["content-length"])
+            if length > limit:
+                raise ResponseTooLarge(limit)
+            resp_body = await conn.reader.readexactly(length)
+        else:
+            resp_body = await _read_to_eof(conn.reader, limit)
+            keep_alive = False
+
+        return (code, reason.strip(), resp_headers, resp_body), keep_alive
+
+
+async def _read_chunked(reader: asyncio.StreamReader, limit: int) -> bytes:
+    chunks = []
+    total = 0
+    while True:
+        size_line = await reader.readuntil(b"\r\n")
+        size = int(size_line.split(b";")[0], 16)
+        if size == 0:
+            break
+        total += size
+        if total > limit:
+            raise ResponseTooLarge(limit)
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+
+    # Skip trailers
+    while await reader.readuntil(b"\r\n") != b"\r\n":
+        pass
+
+    return b"".join(chunks)
+
+
+async def _read_to_eof(reader: asyncio.StreamReader, limit: int) -> bytes:
+    chunks: List[bytes] = []
+    total = 0
+    while True:
+        chunk = await reader.read(1 << 16)
+        if not chunk:
+            return b"".join(chunks)
+        total += len(chunk)
+        if total > limit:
+            raise ResponseTooLarge(limit)
+        chunks.append(chunk)
+
+
+class Client:
+    """HTTP client with pooled keep-alive connections and cookies.
+
+    Use as an async context manager, or call `close` when done.
+
+    Cookies are kept by host name and only sent to the host that set them
+    (their Domain and Path attributes are ignored), so following a redirect
+    to another host doesn't hand it the portal's session.
+
+    Args:
+        max_connections: Largest number of open connections per host
+        timeout: Seconds to wait for each request (including redirects)
+        headers: Headers sent with every request
+        ssl_context: TLS settings for https. Defaults to the system's.
+        max_response_size: Largest response body, in bytes. Larger ones raise
+            `ResponseTooLarge`.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 8,
+        timeout: Optional[float] = 60.0,
+        headers: Optional[Headers] = None,
+        ssl_context: Optional[ssl.SSLContext] = None,
+        max_response_size: int = MAX_RESPONSE_SIZE,
+    ) -> None:
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.headers = list(headers or [])
+        self.max_response_size = max_response_size
+        self.cookies: Dict[str, Dict[str, str]] = {}
+        self._ssl = ssl_context
+        self._pools: Dict[Tuple[str, str, int], ConnectionPool] = {}
+
+    async def __aenter__(self) -> "Client":  # noqa: D105
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:  # noqa: D105
+        self.close()
+
+    @property
+    def connections_opened(self) -> int:
+        """Number of connections opened so far."""
+        return sum(pool.connections_opened for pool in self._pools.values())
+
+    def close(self) -> None:
+        """Close every idle connection."""
+        for pool in self._pools.values():
+            pool.close()
+
+    async def get(self, url: str, **kwargs) -> Response:
+        """Send a GET request (see `request`)."""
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> Response:
+        """Send a POST request (see `request`)."""
+        return await self.request("POST", url, **kwargs)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        data: Optional[Union[Dict[str, str], bytes]] = None,
+        headers: Optional[Headers] = None,
+    ) -> Response:
+        """Send a request, following redirects.
+
+        Args:
+            method: Request method
+            url: Absolute URL
+            params: Query parameters added to `url`
+            data: Body. Dicts are sent form-encoded.
+            headers: Extra headers for this request
+
+        Returns:
+            Response: Final response, whatever its status
+        """
+        if params:
+            url += ("&" if "?" in url else "?") + urlencode(params)
+        body = b""
+        extra = list(headers or [])
+        if isinstance(data, dict):
+            body = urlencode(data).encode()
+            extra.append(("Content-Type", "application/x-www-form-urlencoded"))
+        elif data is not None:
+            body = data
+
+        coro = self._follow(method, url, body, extra)
+        if self.timeout is None:
+            return await coro
+        return await asyncio.wait_for(coro, self.timeout)
+
+    async def _follow(
+        self, method: str, url: str, body: bytes, headers: Headers
+    ) -> Response:
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await self._send(method, url, body, headers)
+            location = response.header("Location")
+            if response.status not in _REDIRECTS or location is None:
+                return response
+
+            url = urljoin(url, location)
+            if _REDIRECTS[response.status] and method != "HEAD":
+                method, body = "GET", b""
+                headers = [(k, v) for k, v in headers if k.lower() != "content-type"]
+
+        raise HTTPError(response)
+
+    async def _send(
+        self, method: str, url: str, body: bytes, headers: Headers
+    ) -> Response:
+        parts = urlsplit(url)
+        scheme = parts.scheme
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname or "", port)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = ConnectionPool(
+                scheme,
+                key[1],
+                port,
+                self.max_connections,
+                self._ssl,
+                self.max_response_size,
+            )
+
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        all_headers = self.headers + headers
+        cookies = self.cookies.get(key[1])
+        if cookies:
+            cookie = "; ".join(f"{k}={v}" for k, v in cookies.items())
+            all_headers.append(("Cookie", cookie))
+
+        status, reason, resp_headers, resp_body = await pool.request(
+            method, target, all_headers, body
+        )
+        for k, v in resp_headers:
+            if k.lower() == "set-cookie":
+                jar: SimpleCookie = SimpleCookie()
+                jar.load(v)
+                cookies = self.cookies.setdefault(key[1], {})
+                cookies.update((name, m.value) for name, m in jar.items())
+
+        return Response(url, status, reason, resp_headers, resp_body)
@@ -0,0 +1,294 @@
+"""Instrumentation of docket parsing.
+
+Observers are called with an `Event` at the start and end of each stage of
+`docket.parse_pdf`:
+
+* `"cache"`: looking the pdf up in a `ResultCache` (counts `hits`)
+* `"open"`: opening the pdf and extracting its words (counts `pages` and
+  `words`)
+* `"headings"`: finding section headings (counts `headings`)
+* `"split"`: splitting pages into sections (counts `sections`)
+* `"parse"`: parsing a single section, when it is first accessed (counts
+  `words`, `keys` and `rows`)
+
+Events after `"open"` carry the docket's type (e.g. `"MJ-CR"` for a
+magisterial district criminal docket) so stages can be compared across docket
+types.
+
+Observers are per process: parses in `batch` worker processes are only seen
+by observers registered in those processes. With no observers registered,
+stages aren't timed and no events are built.
+
+Example:
+    >>> metrics = Aggregator()
+    >>> with observe(metrics):
+    ...     docket = parse_pdf("docket.pdf")
+    >>> print(metrics.to_prometheus())
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+
+class Event(NamedTuple):
+    """Start or end of a parse stage.
+
+    Attributes:
+        stage: Name of the stage (e.g. `"open"`)
+        phase: `"start"` or `"end"`
+        section: Section being parsed, for `"parse"` stages
+        docket_type: Court and case type of the docket (e.g. `"CP-CR"`), once
+            known
+        duration: Seconds the stage took. `None` for `"start"` events.
+        counts: Sizes of what the stage worked on (e.g. `{"pages": 3}`). Empty
+            for `"start"` events.
+    """
+
+    stage: str
+    phase: str
+    section: Optional[str]
+    docket_type: Optional[str]
+    duration: Optional[float]
+    counts: Dict[str, int]
+
+
+Observer = Callable[[Event], None]
+
+_observers: Tuple[Observer, ...] = ()
+_lock = threading.Lock()
+
+
+def add_observer(observer: Observer) -> None:
+    """Call `observer` with every event from now on.
+
+    Args:
+        observer: Function to call with each `Event`
+    """
+    global _observers
+    with _lock:
+        _observers += (observer,)
+
+
+def remove_observer(observer: Observer) -> None:
+    """Stop calling `observer`.
+
+    Args:
+        observer: Observer previously added with `add_observer`
+    """
+    global _observers
+    with _lock:
+        observers = list(_observers)
+        observers.remove(observer)
+        _observers = tuple(observers)
+
+
+@contextmanager
+def observe(observer: Observer) -> Iterator[Observer]:
+    """Call `observer` with every event within a `with` block.
+
+    Args:
+        observer: Function to call with each `Event`
+
+    Yields:
+        Observer: `observer`
+    """
+    add_observer(observer)
+    try:
+        yield observer
+    finally:
+        remove_observer(observer)
+
+
+class Stage:
+    """A running stage, emitting its end event when the `with` block exits.
+
+    Counts and the docket type can be filled in as the stage learns them.
+    """
+
+    def __init__(
+        self, stage: str, section: Optional[str], docket_type: Optional[str]
+    ) -> None:
+        self.stage = stage
+        self.section = section
+        self.docket_type = docket_type
+        self.counts: Dict[str, int] = {}
+        self._start = 0.0
+
+    def __bool__(self) -> bool:  # noqa: D105
+        return True
+
+    def __enter__(self) -> "Stage":  # noqa: D105
+        self._emit("start", None, {})
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:  # noqa: D105
+        self._emit("end", time.perf_counter() - self._start, self.counts)
+
+    def count(self, **counts: int) -> None:
+        """Record sizes of what the stage worked on."""
+        self.counts.update(counts)
+
+    def _emit(self, phase: str, duration: Optional[float], counts: Dict) -> None:
+        event = Event(
+            self.stage, phase, self.section, self.docket_type, duration, counts
+        )
+        for observer in _observers:
+            observer(event)
+
+
+class _NullStage(Stage):
+    """Stage that does nothing, used when nobody is observing.
+
+    It is falsy so callers can skip computing counts.
+    """
+
+    def __init__(self) -> None:
+        super().__init__("", None, None)
+
+    def __bool__(self) -> bool:  # noqa: D105
+        return False
+
+    def __enter__(self) -> "Stage":  # noqa: D105
+        return self
+
+    def __exit__(self, *exc_info) -> None:  # noqa: D105
+        pass
+
+    def count(self, **counts: int) -> None:  # noqa: D102
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(
+    name: str, docket_type: Optional[str] = None, section: Optional[str] = None
+) -> Stage:
+    """Instrument a stage.
+
+    Use as `with stage("open") as st: ...`. `st` is falsy when there are no
+    observers.
+
+    Args:
+        name: Name of the stage
+        docket_type: Court and case type of the docket, if known
+        section: Section being parsed, for `"parse"` stages
+
+    Returns:
+        Stage: Context manager timing the stage
+    """
+    if not _observers:
+        return _NULL_STAGE
+
+    return Stage(name, section, docket_type)
+
+
+def observing() -> bool:
+    """Whether any observers are registered."""
+    return bool(_observers)
+
+
+class Aggregator:
+    """Observer totalling stage durations and counts.
+
+    Totals are kept per stage, section and docket type, and can be exported
+    in the Prometheus text format or as JSON lines. Safe to share between
+    threads.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._totals: Dict[Tuple, Dict] = {}
+
+    def __call__(self, event: Event) -> None:  # noqa: D102
+        if event.phase != "end":
+            return
+
+        key = (event.stage, event.section or "", event.docket_type or "")
+        with self._lock:
+            total = self._totals.get(key)
+            if total is None:
+                total = self._totals[key] = {
+                    "count": 0,
+                    "seconds": 0.0,
+                    "max_seconds": 0.0,
+                    "counts": {},
+                }
+            total["count"] += 1
+            total["seconds"] += event.duration
+            total["max_seconds"] = max(total["max_seconds"], event.duration)
+            for name, n in event.counts.items():
+                total["counts"][name] = total["counts"].get(name, 0) + n
+
+    def totals(self) -> List[Dict]:
+        """Totals of each stage, section and docket type.
+
+        Returns:
+            List[Dict]: One dict per combination with the `stage`, `section`
+                and `docket_type`, number of times it ran (`count`), total and
+                largest durations (`seconds`, `max_seconds`) and summed
+                `counts`
+        """
+        with self._lock:
+            return [
+                {
+                    "stage": stage,
+                    "section": section,
+                    "docket_type": docket_type,
+                    "count": total["count"],
+                    "seconds": total["seconds"],
+                    "max_seconds": total["max_seconds"],
+                    "counts": dict(total["counts"]),
+                }
+                for (stage, section, docket_type), total in sorted(self._totals.items())
+            ]
+
+    def to_json_lines(self) -> str:
+        """Totals as JSON lines, one per stage, section and docket type."""
+        return "".join(json.dumps(total) + "\n" for total in self.totals())
+
+    def to_prometheus(self, prefix: str = "pollydocket") -> str:
+        """Totals in the Prometheus text exposition format.
+
+        Args:
+            prefix: Prefix of the metric names
+
+        Returns:
+            str: `<prefix>_stage_seconds` summaries and
+                `<prefix>_stage_items_total` counters
+        """
+        seconds = f"{prefix}_stage_seconds"
+        items = f"{prefix}_stage_items_total"
+        lines = [
+            f"# HELP {seconds} Time spent in each docket parsing stage.",
+            f"# TYPE {seconds} summary",
+        ]
+        totals = self.totals()
+        for total in totals:
+            labels = _labels(total)
+            lines.append(f"{seconds}_count{{{labels}}} {total['count']}")
+            lines.append(f"{seconds}_sum{{{labels}}} {total['seconds']!r}")
+
+        lines += [
+            f"# HELP {items} Items processed by each docket parsing stage.",
+            f"# TYPE {items} counter",
+        ]
+        for total in totals:
+            labels = _labels(total)
+            for name, n in sorted(total["counts"].items()):
+                lines.append(f'{items}{{{labels},item="{name}"}} {n}')
+
+        return "\n".join(lines) + "\n"
+
+
+def _labels(total: Dict) -> str:
+    return ",".join(
+        f'{k}="{_escape(total[k])}"' for k in ("stage", "section", "docket_type")
+    )
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,259 @@
+"""Download, parse and store dockets concurrently.
+
+A `Pipeline` runs three stages connected by bounded queues:
+
+* fetch: `fetchers` coroutines download dockets (e.g. with `search.Portal`)
+* parse: `parsers` dockets are parsed at once in an executor (by default a
+  `ProcessPoolExecutor`, since parsing is CPU bound)
+* sink: a single coroutine hands each result to `sink` (e.g. a writer), in
+  the order they finish
+
+When the parsers fall behind, the queue in front of them fills up and the
+fetchers wait, so downloaded pdfs don't pile up in memory; when the fetchers
+fall behind, the parsers wait for work. `Pipeline.stats` reports how many
+items are in each stage and queue, so it's clear which stage is the
+bottleneck.
+
+Example:
+    >>> async with Portal() as portal:
+    ...     results = await portal.search_all(start, end, county="Centre")
+    ...     pipeline = Pipeline(lambda r: portal.fetch(r.docket_url), store)
+    ...     await pipeline.run(results)
+"""
+import asyncio
+import inspect
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import (
+    Any,
+    AsyncIterable,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    NamedTuple,
+    Optional,
+    Union,
+)
+
+from . import batch
+from .cache import ResultCache
+from .docket import PDFSource
+
+Fetch = Callable[[Any], Awaitable[Optional[PDFSource]]]
+Sink = Callable[[Any, Union[Dict, Exception]], Any]
+
+# Tells a stage's workers there is no more work
+_DONE = object()
+
+
+class PipelineStats(NamedTuple):
+    """Snapshot of a `Pipeline`.
+
+    Attributes:
+        fetching: Items being fetched
+        to_parse: Fetched items waiting to be parsed
+        parsing: Items being parsed
+        to_sink: Results waiting for the sink
+        max_to_parse: Most items that have waited to be parsed at once
+        max_to_sink: Most results that have waited for the sink at once
+        fetched: Items fetched
+        skipped: Items the fetch skipped
+        parsed: Items parsed
+        failed: Items whose fetch or parse failed
+        done: Results handed to the sink
+    """
+
+    fetching: int
+    to_parse: int
+    parsing: int
+    to_sink: int
+    max_to_parse: int
+    max_to_sink: int
+    fetched: int
+    skipped: int
+    parsed: int
+    failed: int
+    done: int
+
+
+class Pipeline:
+    """Fetch, parse and sink dockets concurrently.
+
+    Args:
+        fetch: Coroutine function getting an item's pdf (a path, buffer or
+            binary file object), or `None` to skip the item
+        sink: Function called with each item and its parsed docket (as a
+            dict), or the error fetching or parsing it. May be a coroutine
+            function. An exception raised by the sink stops the pipeline.
+        fetchers: Number of items fetched at once
+        parsers: Number of items parsed at once. Defaults to the number of
+            CPUs.
+        queue_size: Most items waiting between stages. Defaults to twice
+            `parsers`.
+        executor: Executor to parse in. Defaults to a `ProcessPoolExecutor`
+            with `parsers` workers for each `run`.
+        cache: Cache of parsed dockets
+    """
+
+    def __init__(
+        self,
+        fetch: Fetch,
+        sink: Sink,
+        fetchers: int = 4,
+        parsers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        executor: Optional[Executor] = None,
+        cache: Optional[ResultCache] = None,
+    ) -> None:
+        self.fetch = fetch
+        self.sink = sink
+        self.fetchers = fetchers
+        self.parsers = parsers or os.cpu_count() or 1
+        self.queue_size = queue_size or 2 * self.parsers
+        self.executor = executor
+        self.cache = cache
+        self._stopping = False
+        self._to_parse: Optional[asyncio.Queue] = None
+        self._to_sink: Optional[asyncio.Queue] = None
+        self._counts = dict.fromkeys(PipelineStats._fields, 0)
+
+    def stats(self) -> PipelineStats:
+        """Items in each stage and queue, and how many have been through."""
+        counts = dict(self._counts)
+        counts["to_parse"] = self._to_parse.qsize() if self._to_parse else 0
+        counts["to_sink"] = self._to_sink.qsize() if self._to_sink else 0
+        return PipelineStats(**counts)
+
+    def stop(self) -> None:
+        """Stop taking new items, letting those already taken finish.
+
+        `run` returns once the items already taken have been through the
+        sink.
+        """
+        self._stopping = True
+
+    async def run(self, items: Union[Iterable, AsyncIterable]) -> PipelineStats:
+        """Put items through the pipeline.
+
+        Items are taken as the fetchers are ready for them, so `items` may
+        be a lazy (or async) iterable. Cancelling `run` cancels the fetches
+        and parses under way.
+
+        Args:
+            items: Items to fetch, e.g. `search.SearchResult`s
+
+        Returns:
+            PipelineStats: Final stats
+        """
+        self._stopping = False
+        self._counts = dict.fromkeys(PipelineStats._fields, 0)
+        executor = self.executor or ProcessPoolExecutor(self.parsers)
+        to_fetch: asyncio.Queue = asyncio.Queue(self.fetchers)
+        self._to_parse = asyncio.Queue(self.queue_size)
+        self._to_sink = asyncio.Queue(self.queue_size)
+
+        async def parse_one(job: Any) -> None:
+            await self._parse_one(executor, job)
+
+        stages = [
+            self._feed(items, to_fetch),
+            self._stage(
+                self.fetchers, to_fetch, self._fetch_one, self._to_parse, self.parsers
+            ),
+            self._stage(self.parsers, self._to_parse, parse_one, self._to_sink, 1),
+            self._stage(1, self._to_sink, self._sink_one),
+        ]
+        tasks = [asyncio.ensure_future(stage) for stage in stages]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            if self.executor is None:
+                executor.shutdown(wait=False)
+
+        return self.stats()
+
+    async def _feed(
+        self, items: Union[Iterable, AsyncIterable], to_fetch: asyncio.Queue
+    ) -> None:
+        async for item in batch.iterate_async(items):
+            if self._stopping:
+                break
+            await to_fetch.put(item)
+
+        for _ in range(self.fetchers):
+            await to_fetch.put(_DONE)
+
+    async def _stage(
+        self,
+        workers: int,
+        queue: asyncio.Queue,
+        work: Callable[[Any], Awaitable[None]],
+        next_queue: Optional[asyncio.Queue] = None,
+        next_workers: int = 0,
+    ) -> None:
+        """Run a stage's workers, then tell the next stage's workers to stop."""
+
+        async def worker() -> None:
+            while True:
+                job = await queue.get()
+                if job is _DONE:
+                    return
+                await work(job)
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        for _ in range(next_workers):
+            assert next_queue is not None
+            await next_queue.put(_DONE)
+
+    async def _fetch_one(self, item: Any) -> None:
+        self._counts["fetching"] += 1
+        try:
+            pdf = await self.fetch(item)
+        except Exception as e:
+            self._counts["failed"] += 1
+            await self._put(self._to_sink, (item, e), "max_to_sink")
+            return
+        finally:
+            self._counts["fetching"] -= 1
+
+        if pdf is None:
+            self._counts["skipped"] += 1
+            return
+        self._counts["fetched"] += 1
+        await self._put(self._to_parse, (item, pdf), "max_to_parse")
+
+    async def _parse_one(self, executor: Executor, job: Any) -> None:
+        item, pdf = job
+        if isinstance(executor, ProcessPoolExecutor):
+            pdf = batch.to_sendable(pdf)
+        loop = asyncio.get_event_loop()
+        self._counts["parsing"] += 1
+        try:
+            result = await loop.run_in_executor(
+                executor, batch.parse_one, pdf, self.cache
+            )
+        except Exception as e:
+            result = e  # The executor failed (e.g. a broken pool)
+        finally:
+            self._counts["parsing"] -= 1
+
+        self._counts["parsed" if isinstance(result, dict) else "failed"] += 1
+        await self._put(self._to_sink, (item, result), "max_to_sink")
+
+    async def _sink_one(self, job: Any) -> None:
+        item, result = job
+        ret = self.sink(item, result)
+        if inspect.isawaitable(ret):
+            await ret
+        self._counts["done"] += 1
+
+    async def _put(self, queue: Optional[asyncio.Queue], job: Any, peak: str) -> None:
+        assert queue is not None
+        await queue.put(job)
+        self._counts[peak] = max(self._counts[peak], queue.qsize())
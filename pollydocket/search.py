@@ -0,0 +1,538 @@
+"""Docket searches on the UJS portal.
+
+`Portal` runs searches on the Unified Judicial System of Pennsylvania's web
+portal and downloads the docket sheets they find. Requests share a pool of
+keep-alive connections (see `http`), and at most `concurrency` are in flight
+at once, so many searches and downloads can be run simultaneously. The
+portal returns at most `MAX_RESULTS` dockets per search; `search_all` splits
+searches that hit the limit until it finds them all:
+
+    async with Portal(concurrency=8) as portal:
+        results = await portal.search_all(filed_start=date(2022, 1, 1),
+                                          filed_end=date(2022, 1, 31),
+                                          county="Centre")
+        async for result, parsed in portal.dockets(results):
+            ...
+
+Downloaded docket sheets are parsed straight from memory in an executor
+(see `pipeline.Pipeline`); they are never written to disk.
+"""
+import asyncio
+import datetime
+import warnings
+from concurrent.futures import Executor
+from email.utils import parsedate_to_datetime
+from html.parser import HTMLParser
+from typing import (
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+from urllib.parse import urljoin
+
+from .cache import ResultCache
+from .http import Client, Response
+from .pipeline import Pipeline
+from .throttle import THROTTLED, RateLimiter
+
+PORTAL_URL = "https://ujsportal.pacourts.us"
+SEARCH_PATH = "/CaseSearch"
+TOKEN_FIELD = "__RequestVerificationToken"
+RESULTS_TABLE = "caseSearchResultGrid"
+
+# The portal returns at most this many results per search
+MAX_RESULTS = 500
+
+
+# Counties of Pennsylvania, as the portal names them
+COUNTIES = (
+    "Adams",
+    "Allegheny",
+    "Armstrong",
+    "Beaver",
+    "Bedford",
+    "Berks",
+    "Blair",
+    "Bradford",
+    "Bucks",
+    "Butler",
+    "Cambria",
+    "Cameron",
+    "Carbon",
+    "Centre",
+    "Chester",
+    "Clarion",
+    "Clearfield",
+    "Clinton",
+    "Columbia",
+    "Crawford",
+    "Cumberland",
+    "Dauphin",
+    "Delaware",
+    "Elk",
+    "Erie",
+    "Fayette",
+    "Forest",
+    "Franklin",
+    "Fulton",
+    "Greene",
+    "Huntingdon",
+    "Indiana",
+    "Jefferson",
+    "Juniata",
+    "Lackawanna",
+    "Lancaster",
+    "Lawrence",
+    "Lebanon",
+    "Lehigh",
+    "Luzerne",
+    "Lycoming",
+    "McKean",
+    "Mercer",
+    "Mifflin",
+    "Monroe",
+    "Montgomery",
+    "Montour",
+    "Northampton",
+    "Northumberland",
+    "Perry",
+    "Philadelphia",
+    "Pike",
+    "Potter",
+    "Schuylkill",
+    "Snyder",
+    "Somerset",
+    "Sullivan",
+    "Susquehanna",
+    "Tioga",
+    "Union",
+    "Venango",
+    "Warren",
+    "Washington",
+    "Wayne",
+    "Westmoreland",
+    "Wyoming",
+    "York",
+)
+
+# Court types a search can be limited to: appellate courts, courts of common
+# pleas, magisterial district courts and Philadelphia Municipal Court
+COURT_TYPES = ("Appellate", "CP", "MDJ", "PAC")
+
+
+class TruncatedSearchWarning(UserWarning):
+    """A search hit the portal's result limit and couldn't be split."""
+
+
+class Query(NamedTuple):
+    """Criteria of a search (see `Portal.search`)."""
+
+    filed_start: datetime.date
+    filed_end: datetime.date
+    county: Optional[str] = None
+    docket_type: Optional[str] = None
+    court_office: Optional[str] = None
+    court_type: Optional[str] = None
+
+    def split(self) -> List["Query"]:
+        """Split into narrower searches that together find the same dockets.
+
+        Date ranges are halved first, then single days are split by court
+        type (a handful of searches) and then by county (one search each).
+        Criteria that are already set aren't split, and searches of a single
+        court office can't be split by court or county.
+
+        Returns:
+            List[Query]: Narrower searches, or an empty list if this can't be
+                split
+        """
+        days = (self.filed_end - self.filed_start).days
+        if days > 0:
+            middle = self.filed_start + datetime.timedelta(days=days // 2)
+            return [
+                self._replace(filed_end=middle),
+                self._replace(filed_start=middle + datetime.timedelta(days=1)),
+            ]
+        if self.court_office is not None:
+            return []
+        if self.court_type is None:
+            return [self._replace(court_type=court) for court in COURT_TYPES]
+        if self.county is None:
+            return [self._replace(county=county) for county in COUNTIES]
+        return []
+
+
+class SearchResult(NamedTuple):
+    """A docket found by a search.
+
+    Attributes:
+        docket_number: Docket number (e.g. "MJ-49302-CV-0000005-2022")
+        fields: Every column of the result (e.g. "Filing Date", "County") by
+            column heading
+        docket_url: URL of the docket sheet pdf, if the result links to one
+    """
+
+    docket_number: str
+    fields: Dict[str, str]
+    docket_url: Optional[str]
+
+
+class Portal:
+    """Client for searching the UJS portal and downloading docket sheets.
+
+    Use as an async context manager, or call `close` when done.
+
+    Args:
+        base_url: URL of the portal
+        concurrency: Largest number of requests in flight at once (and of
+            open connections)
+        timeout: Seconds to wait for each request
+        max_results: Most results the portal returns for a search
+        limiter: Paces searches and downloads alike. Defaults to a
+            `RateLimiter` starting at 5 requests per second and at most
+            `concurrency` in flight; pass one limiter to several portals to
+            share it between them.
+        retries: Times a request is retried after a 429 or 5xx response
+    """
+
+    def __init__(
+        self,
+        base_url: str = PORTAL_URL,
+        concurrency: int = 8,
+        timeout: Optional[float] = 60.0,
+        max_results: int = MAX_RESULTS,
+        limiter: Optional[RateLimiter] = None,
+        retries: int = 3,
+    ) -> None:
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.max_results = max_results
+        if limiter is None:
+            limiter = RateLimiter(
+                concurrency=min(4, concurrency), max_concurrency=concurrency
+            )
+        self.limiter = limiter
+        self.retries = retries
+        self.client = Client(
+            max_connections=concurrency,
+            timeout=timeout,
+            headers=[("User-Agent", "pollydocket")],
+        )
+        self._token: Optional[str] = None
+        self._token_lock: Optional[asyncio.Lock] = None
+
+    async def __aenter__(self) -> "Portal":  # noqa: D105
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:  # noqa: D105
+        self.close()
+
+    def close(self) -> None:
+        """Close the connections to the portal."""
+        self.client.close()
+
+    async def search(
+        self,
+        filed_start: datetime.date,
+        filed_end: datetime.date,
+        county: Optional[str] = None,
+        docket_type: Optional[str] = None,
+        court_office: Optional[str] = None,
+        court_type: Optional[str] = None,
+    ) -> List[SearchResult]:
+        """Search for dockets filed between two dates.
+
+        Args:
+            filed_start: First filing date (inclusive)
+            filed_end: Last filing date (inclusive)
+            county: County (e.g. "Centre")
+            docket_type: Docket type (e.g. "Criminal", "Landlord/Tenant")
+            court_office: Court office (e.g. "MDJ-49-3-02")
+            court_type: Court type (one of `COURT_TYPES`)
+
+        Returns:
+            List[SearchResult]: Dockets found, as the portal ordered them. If
+                there are `max_results` of them, there may have been more (see
+                `search_all`).
+        """
+        form = {
+            "SearchBy": "DateFiled",
+            "AdvanceSearch": "true",
+            "FiledStartDate": filed_start.isoformat(),
+            "FiledEndDate": filed_end.isoformat(),
+        }
+        for name, value in (
+            ("County", county),
+            ("DocketType", docket_type),
+            ("CourtOffice", court_office),
+            ("CourtType", court_type),
+        ):
+            if value is not None:
+                form[name] = value
+
+        url = self.base_url + SEARCH_PATH
+        response = None
+        for fresh in (False, True):
+            form[TOKEN_FIELD] = await self._verification_token(refresh=fresh)
+            response = await self._request("POST", url, data=form)
+            if response.status not in (400, 403):
+                break  # Otherwise the token expired
+
+        assert response is not None
+        response.raise_for_status()
+        return _parse_results(response)
+
+    async def search_all(
+        self,
+        filed_start: datetime.date,
+        filed_end: datetime.date,
+        county: Optional[str] = None,
+        docket_type: Optional[str] = None,
+        court_office: Optional[str] = None,
+        court_type: Optional[str] = None,
+    ) -> List[SearchResult]:
+        """Search for every docket filed between two dates.
+
+        Like `search`, but searches that hit the portal's `max_results` limit
+        are split (see `Query.split`) and the parts searched concurrently,
+        recursively, until none are truncated. Dockets found by more than one
+        search are only returned once.
+
+        If a search of a single day, court type and county is still
+        truncated it can't be split further; a `TruncatedSearchWarning` is
+        issued and the dockets it did return are kept.
+
+        Args:
+            filed_start: First filing date (inclusive)
+            filed_end: Last filing date (inclusive)
+            county: County (e.g. "Centre")
+            docket_type: Docket type (e.g. "Criminal", "Landlord/Tenant")
+            court_office: Court office (e.g. "MDJ-49-3-02")
+            court_type: Court type (one of `COURT_TYPES`)
+
+        Returns:
+            List[SearchResult]: Dockets found, in the order they were found
+        """
+        found: Dict[str, SearchResult] = {}
+
+        async def run(query: Query) -> None:
+            results = await self.search(**query._asdict())
+            for result in results:
+                found.setdefault(result.docket_number, result)
+            if len(results) < self.max_results:
+                return
+
+            parts = query.split()
+            if not parts:
+                warnings.warn(
+                    f"{query} still has {len(results)} results",
+                    TruncatedSearchWarning,
+                )
+            await asyncio.gather(*(run(part) for part in parts))
+
+        await run(
+            Query(filed_start, filed_end, county, docket_type, court_office, court_type)
+        )
+        return list(found.values())
+
+    async def fetch(self, url: str) -> bytes:
+        """Download a docket sheet (or anything else).
+
+        Args:
+            url: URL to download
+
+        Returns:
+            bytes: Body of the response
+        """
+        response = await self._request("GET", url)
+        response.raise_for_status()
+        return response.body
+
+    async def dockets(
+        self,
+        results: Iterable[SearchResult],
+        executor: Optional[Executor] = None,
+        cache: Optional[ResultCache] = None,
+    ) -> AsyncIterator[Tuple[SearchResult, Union[Dict, Exception]]]:
+        """Download and parse the docket sheets of search results.
+
+        Up to `concurrency` docket sheets are downloaded at once, and each is
+        parsed as soon as it arrives. Results without a docket sheet link are
+        skipped.
+
+        Args:
+            results: Search results
+            executor: Executor to parse in (see `pipeline.Pipeline`)
+            cache: Cache of parsed dockets
+
+        Yields:
+            Tuple[SearchResult, Union[Dict, Exception]]: Each result with its
+                parsed docket, or the error downloading or parsing it, in the
+                order they finish
+        """
+        # Each result travels through the pipeline with its pdf, so results
+        # never have to be matched back to their downloads
+        finished: asyncio.Queue = asyncio.Queue(self.concurrency)
+
+        async def download(result: SearchResult) -> bytes:
+            assert result.docket_url is not None
+            return await self.fetch(result.docket_url)
+
+        async def sink(result: SearchResult, parsed: Union[Dict, Exception]) -> None:
+            await finished.put((result, parsed))
+
+        pipeline = Pipeline(
+            download,
+            sink,
+            fetchers=self.concurrency,
+            executor=executor,
+            cache=cache,
+        )
+        todo = [r for r in results if r.docket_url is not None]
+        run = asyncio.ensure_future(pipeline.run(todo))
+        try:
+            while True:
+                get = asyncio.ensure_future(finished.get())
+                await asyncio.wait({get, run}, return_when=asyncio.FIRST_COMPLETED)
+                if get.done():
+                    yield get.result()
+                    continue
+
+                get.cancel()
+                run.result()  # Raises if the pipeline failed
+                while not finished.empty():
+                    yield finished.get_nowait()
+                return
+        finally:
+            if not run.done():
+                run.cancel()
+                await asyncio.gather(run, return_exceptions=True)
+
+    async def _request(self, method: str, url: str, **kwargs) -> Response:
+        """Send a request when the limiter allows, retrying if throttled."""
+        for _ in range(self.retries + 1):
+            async with self.limiter.request() as req:
+                response = await self.client.request(method, url, **kwargs)
+                req.status = response.status
+                req.retry_after = _retry_after(response)
+            if response.status != THROTTLED and response.status < 500:
+                break
+
+        return response
+
+    async def _verification_token(self, refresh: bool = False) -> str:
+        """Anti-forgery token the search form has to be posted with."""
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+        async with self._token_lock:
+            if self._token is None or refresh:
+                response = await self._request("GET", self.base_url + SEARCH_PATH)
+                response.raise_for_status()
+                parser = _TokenParser()
+                parser.feed(response.text())
+                if parser.token is None:
+                    raise ValueError("Search page has no verification token")
+                self._token = parser.token
+
+            return self._token
+
+
+def _retry_after(response: Response) -> Optional[float]:
+    value = response.header("Retry-After")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+
+
+def _parse_results(response: Response) -> List[SearchResult]:
+    parser = _ResultsParser()
+    parser.feed(response.text())
+    ret = []
+    for cells, links in parser.rows:
+        fields = dict(zip(parser.headings, cells))
+        number = fields.get("Docket Number")
+        if not number:
+            continue
+        url = next((link for link in links if "DocketSheet" in link), None)
+        if url is not None:
+            url = urljoin(response.url, url)
+        ret.append(SearchResult(number, fields, url))
+
+    return ret
+
+
+class _TokenParser(HTMLParser):
+    """Finds the value of the anti-forgery token input."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.token: Optional[str] = None
+
+    def handle_starttag(self, tag: str, attrs: List) -> None:  # noqa: D102
+        attr = dict(attrs)
+        if tag == "input" and attr.get("name") == TOKEN_FIELD:
+            self.token = attr.get("value")
+
+
+class _ResultsParser(HTMLParser):
+    """Collects the headings and rows of the search results table."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.headings: List[str] = []
+        self.rows: List[Tuple[List[str], List[str]]] = []
+        self._depth = 0  # Depth of tables, counting from the results table
+        self._cell: Optional[List[str]] = None
+        self._row: Optional[Tuple[List[str], List[str]]] = None
+        self._heading = False
+
+    def handle_starttag(self, tag: str, attrs: List) -> None:  # noqa: D102
+        attr = dict(attrs)
+        if tag == "table":
+            if self._depth or attr.get("id") == RESULTS_TABLE:
+                self._depth += 1
+        elif not self._depth:
+            return
+        elif tag == "tr" and self._depth == 1:
+            self._row = ([], [])
+        elif tag in ("td", "th") and self._depth == 1:
+            self._cell = []
+            self._heading = tag == "th"
+        elif tag == "a" and self._row is not None and attr.get("href"):
+            self._row[1].append(attr["href"])
+
+    def handle_endtag(self, tag: str) -> None:  # noqa: D102
+        if not self._depth:
+            return
+        if tag == "table":
+            self._depth -= 1
+        elif self._depth > 1:
+            return
+        elif tag in ("td", "th") and self._cell is not None:
+            text = " ".join("".join(self._cell).split())
+            if self._heading:
+                self.headings.append(text)
+            elif self._row is not None:
+                self._row[0].append(text)
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            if self._row[0]:
+                self.rows.append(self._row)
+            self._row = None
+
+    def handle_data(self, data: str) -> None:  # noqa: D102
+        if self._cell is not None:
+            self._cell.append(data)
@@ -0,0 +1,147 @@
+"""Learned layouts of columnar sections.
+
+Dockets of the same type are printed from the same template, so a columnar
+section (e.g. Bail) has its column headers in the same place on every docket
+of that type. The first time such a section is parsed its headers are found
+by searching for them; where they were is remembered as a `ColumnTemplate`
+keyed by docket type and section.
+
+Later sections of the same type are checked against the template in a single
+pass over their words: if every header is found where the template says, in
+the same font size, the columns are read off the template without building a
+`WordIndex`. Otherwise the headers are searched for again and the template is
+relearned.
+"""
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .words import Crop
+
+# How far (in points) a header may be from where its template says it is
+POSITION_TOLERANCE: float = 0.01
+
+
+class ColumnTemplate(NamedTuple):
+    """Where the column headers of a section are.
+
+    Attributes:
+        headers: Text of each column header
+        x0: Left edge of each header
+        x1: Right edge of each header
+        size: Font size of each header
+    """
+
+    headers: Tuple[str, ...]
+    x0: Tuple[float, ...]
+    x1: Tuple[float, ...]
+    size: Tuple[float, ...]
+
+    @classmethod
+    def learn(cls, page: Crop, heads: Sequence[int]) -> "ColumnTemplate":
+        """Template of a section whose headers have been found.
+
+        Args:
+            page: Words of the section
+            heads: Row of each column header
+
+        Returns:
+            ColumnTemplate: Template of the section's columns
+        """
+        t = page.table
+        return cls(
+            tuple(t.text[i] for i in heads),
+            tuple(t.x0[i] for i in heads),
+            tuple(t.x1[i] for i in heads),
+            tuple(t.size[i] for i in heads),
+        )
+
+    def columns(self, page: Crop, tolerance: float = 0.5) -> Optional[List[List[int]]]:
+        """Columns of a section laid out like this template.
+
+        Finds the same columns as `WordIndex.column` would for each header,
+        in one pass over the words.
+
+        Args:
+            page: Words of the section
+            tolerance: Largest difference in `x0` or `x1` of a column member
+                from its header
+
+        Returns:
+            Optional[List[List[int]]]: Rows of the words in each column,
+                header first, or `None` if the headers aren't where the
+                template says
+        """
+        t = page.table
+        column_of = {h: c for c, h in reversed(list(enumerate(self.headers)))}
+        edges = list(enumerate(zip(self.x0, self.x1)))
+        heads: Dict[int, int] = {}
+        cols: List[List[int]] = [[] for _ in self.headers]
+        for i in page.rows:
+            c = column_of.get(t.text[i])
+            if c is not None and c not in heads:
+                heads[c] = i
+            x0, x1 = t.x0[i], t.x1[i]
+            for c, (left, right) in edges:
+                if abs(x0 - left) < tolerance or abs(x1 - right) < tolerance:
+                    cols[c].append(i)
+
+        if len(heads) < len(self.headers):
+            return None
+
+        for c, i in heads.items():
+            if (
+                abs(t.x0[i] - self.x0[c]) > POSITION_TOLERANCE
+                or abs(t.x1[i] - self.x1[c]) > POSITION_TOLERANCE
+                or abs(t.size[i] - self.size[c]) > POSITION_TOLERANCE
+            ):
+                return None
+
+        bottom = t.bottom
+        return [
+            [i for i in col if bottom[i] >= bottom[heads[c]]]
+            for c, col in enumerate(cols)
+        ]
+
+
+class TemplateCache:
+    """Column templates by docket type and section.
+
+    Safe to share between threads.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._templates: Dict[Tuple[str, str], ColumnTemplate] = {}
+
+    def __len__(self) -> int:  # noqa: D105
+        return len(self._templates)
+
+    def get(self, key: Tuple[str, str]) -> Optional[ColumnTemplate]:
+        """Template of a docket type and section.
+
+        Args:
+            key: Docket type (e.g. "MJ-CR") and section
+
+        Returns:
+            Optional[ColumnTemplate]: Template, or `None` if there isn't one
+        """
+        return self._templates.get(key)
+
+    def put(self, key: Tuple[str, str], template: ColumnTemplate) -> None:
+        """Remember the template of a docket type and section.
+
+        Args:
+            key: Docket type (e.g. "MJ-CR") and section
+            template: Template of the section
+        """
+        with self._lock:
+            self._templates[key] = template
+
+    def clear(self) -> None:
+        """Forget every template."""
+        with self._lock:
+            self._templates.clear()
+
+
+# Templates learned by this process
+TEMPLATES = TemplateCache()
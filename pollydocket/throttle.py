@@ -0,0 +1,251 @@
+"""Adaptive request rate limiting.
+
+The UJS portal throttles clients that send too many requests, and how many is
+too many varies. `RateLimiter` paces requests with a token bucket and bounds
+how many are in flight, and adapts both with AIMD (additive increase,
+multiplicative decrease), as TCP does with its congestion window:
+
+* every request that succeeds quickly raises the rate by about one request
+  per second per second, and the concurrency limit by about one per round of
+  requests
+* a 429 or 5xx response, an error or a response slower than
+  `latency_target` multiplies both by `backoff` (once for all the requests
+  that were already in flight), and a `Retry-After` header pauses requests
+  altogether
+
+so requests run as fast as the server sustains without manual tuning. Share a
+limiter between every client of a server (e.g. searches and downloads) so
+they draw on one budget:
+
+    limiter = RateLimiter(rate=5, max_rate=50)
+    async with limiter.request() as req:
+        response = await client.get(url)
+        req.status = response.status
+"""
+import asyncio
+import time
+from typing import NamedTuple, Optional
+
+# Status of a response to too many requests
+THROTTLED = 429
+
+
+class LimiterStats(NamedTuple):
+    """Snapshot of a `RateLimiter`.
+
+    Attributes:
+        rate: Requests per second currently allowed
+        concurrency: Requests currently allowed in flight
+        in_flight: Requests in flight
+        requests: Requests finished
+        throttled: Requests that finished with a 429 or 5xx response or an
+            error, or took longer than the latency target
+        backoffs: Times the rate and concurrency were cut
+    """
+
+    rate: float
+    concurrency: int
+    in_flight: int
+    requests: int
+    throttled: int
+    backoffs: int
+
+
+class RateLimiter:
+    """Token bucket with AIMD adaptive rate and concurrency.
+
+    Args:
+        rate: Starting requests per second
+        concurrency: Starting number of requests in flight
+        min_rate: Lowest rate backoffs cut to
+        max_rate: Highest rate increases raise to
+        max_concurrency: Largest number of requests in flight
+        burst: Most requests that can be sent at once after an idle spell.
+            Defaults to the concurrency limit.
+        latency_target: Seconds a request may take before it counts as a
+            sign of overload. `None` ignores latency.
+        backoff: Factor the rate and concurrency are multiplied by on
+            overload
+    """
+
+    def __init__(
+        self,
+        rate: float = 5.0,
+        concurrency: int = 4,
+        min_rate: float = 0.2,
+        max_rate: float = 50.0,
+        max_concurrency: int = 32,
+        burst: Optional[float] = None,
+        latency_target: Optional[float] = None,
+        backoff: float = 0.5,
+    ) -> None:
+        if not 0 < backoff < 1:
+            raise ValueError("backoff must be between 0 and 1")
+        if not 0 < min_rate <= rate <= max_rate:
+            raise ValueError("rate must be between min_rate and max_rate")
+        if not 1 <= concurrency <= max_concurrency:
+            raise ValueError("concurrency must be between 1 and max_concurrency")
+
+        self.rate = float(rate)
+        self.limit = float(concurrency)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.burst = burst
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.backoffs = 0
+        self._tokens = burst or self.limit
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._decreased_at = float("-inf")
+        self._slot_freed: Optional[asyncio.Condition] = None
+
+    @property
+    def concurrency(self) -> int:
+        """Number of requests allowed in flight."""
+        return int(self.limit)
+
+    def stats(self) -> LimiterStats:
+        """Current rate, concurrency and counters."""
+        return LimiterStats(
+            self.rate,
+            self.concurrency,
+            self.in_flight,
+            self.requests,
+            self.throttled,
+            self.backoffs,
+        )
+
+    def request(self) -> "Request":
+        """Wait for a turn to send a request.
+
+        Use as `async with limiter.request() as req: ...`, setting
+        `req.status` (and `req.retry_after`, if the server sent one) from the
+        response. An exception raised in the block counts as an overload.
+
+        Returns:
+            Request: Async context manager holding the turn
+        """
+        return Request(self)
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent, and count it as in flight."""
+        if self._slot_freed is None:
+            self._slot_freed = asyncio.Condition()
+        async with self._slot_freed:
+            while self.in_flight >= self.concurrency:
+                await self._slot_freed.wait()
+            self.in_flight += 1
+
+        try:
+            while True:
+                delay = self._take_token()
+                if delay <= 0:
+                    return
+                await asyncio.sleep(delay)
+        except BaseException:
+            await self.cancel()
+            raise
+
+    async def release(
+        self,
+        latency: float,
+        status: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        failed: bool = False,
+    ) -> None:
+        """Finish a request and adapt to how it went.
+
+        Args:
+            latency: Seconds the request took
+            status: Response status
+            retry_after: Seconds the server asked to wait, if it did
+            failed: Whether the request failed without a response
+        """
+        self.requests += 1
+        if retry_after:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        if (
+            failed
+            or status == THROTTLED
+            or (status is not None and status >= 500)
+            or (self.latency_target is not None and latency > self.latency_target)
+        ):
+            self.throttled += 1
+            self._decrease(latency)
+        else:
+            self._increase()
+        await self._free_slot()
+
+    async def cancel(self) -> None:
+        """Give up a turn without sending a request, or without its response."""
+        await self._free_slot()
+
+    def _take_token(self) -> float:
+        """Take a token, or return the seconds until one can be taken."""
+        now = time.monotonic()
+        capacity = self.burst or self.limit
+        self._tokens = min(capacity, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def _increase(self) -> None:
+        self.rate = min(self.max_rate, self.rate + 1 / self.rate)
+        self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+    def _decrease(self, latency: float) -> None:
+        now = time.monotonic()
+        if now - latency < self._decreased_at:
+            return  # Sent before the last backoff, which already covered it
+
+        self.rate = max(self.min_rate, self.rate * self.backoff)
+        self.limit = max(1.0, self.limit * self.backoff)
+        self.backoffs += 1
+        self._decreased_at = now
+
+    async def _free_slot(self) -> None:
+        assert self._slot_freed is not None
+        async with self._slot_freed:
+            self.in_flight -= 1
+            self._slot_freed.notify()
+
+
+class Request:
+    """A turn to send a request (see `RateLimiter.request`).
+
+    Attributes:
+        status: Status of the response, to be set by the caller
+        retry_after: Seconds the server asked to wait, to be set by the caller
+    """
+
+    def __init__(self, limiter: RateLimiter) -> None:
+        self.limiter = limiter
+        self.status: Optional[int] = None
+        self.retry_after: Optional[float] = None
+        self._start = 0.0
+
+    async def __aenter__(self) -> "Request":  # noqa: D105
+        await self.limiter.acquire()
+        self._start = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, *exc_info) -> None:  # noqa: D105
+        if exc_type is not None and issubclass(exc_type, asyncio.CancelledError):
+            await self.limiter.cancel()
+            return
+
+        await self.limiter.release(
+            time.monotonic() - self._start,
+            self.status,
+            self.retry_after,
+            failed=exc_type is not None,
+        )
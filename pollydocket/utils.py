@@ -1,6 +1,8 @@
 """Various useful utilities."""
+import io
+import mmap
 from itertools import islice, tee
-from typing import Iterable, Iterator
+from typing import Iterable, Iterator, Union
 
 
 def pairwise(iterable: Iterable) -> Iterator:
@@ -16,3 +18,57 @@ def pairwise(iterable: Iterable) -> Iterator:
     """
     a, b = tee(iterable)
     return zip(a, islice(b, 1, None))
+
+
+class BufferReader(io.RawIOBase):
+    """Read-only binary file over a buffer.
+
+    Unlike `io.BytesIO`, the buffer (e.g. a `bytearray`, `memoryview` or
+    `mmap`) isn't copied up front; reads copy only the bytes asked for.
+
+    Args:
+        buffer: Object supporting the buffer protocol
+    """
+
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview, mmap.mmap]):
+        super().__init__()
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:  # noqa: D102
+        return True
+
+    def seekable(self) -> bool:  # noqa: D102
+        return True
+
+    def tell(self) -> int:  # noqa: D102
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:  # noqa: D102
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = len(self._view) + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+
+        if pos < 0:
+            raise ValueError(f"negative seek position {pos}")
+
+        self._pos = pos
+        return pos
+
+    def readinto(self, b) -> int:  # noqa: D102
+        data = self._view[slice(self._pos, self._pos + len(b))]
+        n = len(data)
+        b[:n] = data
+        self._pos += n
+        return n
+
+    def close(self) -> None:
+        """Release the buffer."""
+        if not self.closed:
+            self._view.release()
+        super().close()
@@ -0,0 +1,376 @@
+"""Polling the UJS portal for new and changed dockets.
+
+`poll` searches the portal and compares each docket found with what a
+`CrawlState` remembers of it: a hash of its row in the search results, a
+hash of its pdf and the date of its last docket entry. Only dockets that are
+new, or whose search result row has changed (e.g. their status), are
+downloaded, and only pdfs that differ from the last download are parsed. So
+once a county has been crawled, each poll costs its searches plus one
+download per change, however many dockets the county has.
+
+`watch` polls repeatedly; `pollydocket watch` runs it from the command line.
+
+The crawl state is a single SQLite file.
+"""
+import asyncio
+import datetime
+import hashlib
+import inspect
+import json
+import re
+import sqlite3
+import threading
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Union
+
+from .pipeline import Pipeline, Sink
+from .search import Portal, SearchResult
+from .writers import Writer
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dockets (
+    docket_number TEXT PRIMARY KEY,
+    row_hash TEXT NOT NULL,
+    content_hash TEXT,
+    last_entry_date TEXT,
+    first_seen TEXT NOT NULL,
+    last_changed TEXT
+);
+"""
+
+_DATE = re.compile(r"^(\d\d)/(\d\d)/(\d{4})$")
+
+
+class Tracked(NamedTuple):
+    """What a `CrawlState` remembers of a docket.
+
+    Attributes:
+        docket_number: Docket number
+        row_hash: Hash of its search result row when last seen
+        content_hash: SHA-256 of its pdf when last downloaded
+        last_entry_date: Date (ISO format) of its latest dated entry when last
+            parsed
+        first_seen: When it was first found (ISO format)
+        last_changed: When its pdf last changed (ISO format)
+    """
+
+    docket_number: str
+    row_hash: str
+    content_hash: Optional[str]
+    last_entry_date: Optional[str]
+    first_seen: str
+    last_changed: Optional[str]
+
+
+class PollStats(NamedTuple):
+    """Outcome of a `poll`.
+
+    Attributes:
+        found: Dockets found by the searches
+        new: Dockets not seen (or not downloaded) before
+        changed: Dockets whose search result row changed
+        downloaded: Dockets downloaded
+        parsed: Downloaded dockets whose pdf changed and were parsed
+        failed: Dockets that couldn't be downloaded or parsed
+    """
+
+    found: int
+    new: int
+    changed: int
+    downloaded: int
+    parsed: int
+    failed: int
+
+
+class CrawlState:
+    """Dockets seen so far, in an SQLite file.
+
+    Args:
+        path: Path of the SQLite file. Created if it doesn't exist.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = str(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:  # noqa: D105
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM dockets").fetchone()[0]
+
+    def get(self, docket_number: str) -> Optional[Tracked]:
+        """Look up a docket.
+
+        Args:
+            docket_number: Docket number
+
+        Returns:
+            Optional[Tracked]: What is remembered of it, or `None` if it hasn't
+                been seen
+        """
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    f"SELECT {', '.join(Tracked._fields)} FROM dockets "
+                    "WHERE docket_number = ?",
+                    (docket_number,),
+                )
+                .fetchone()
+            )
+        return None if row is None else Tracked(*row)
+
+    def record(
+        self,
+        result: SearchResult,
+        content_hash: Optional[str] = None,
+        parsed: Optional[Dict] = None,
+    ) -> None:
+        """Remember a docket as it was found, downloaded and parsed.
+
+        Args:
+            result: Search result of the docket
+            content_hash: SHA-256 of its pdf, if it was downloaded
+            parsed: Parsed docket, if its pdf changed
+        """
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO dockets "
+                    "(docket_number, row_hash, first_seen) VALUES (?, ?, ?)",
+                    (result.docket_number, row_hash(result), _now()),
+                )
+                conn.execute(
+                    "UPDATE dockets SET row_hash = ?, "
+                    "content_hash = COALESCE(?, content_hash) "
+                    "WHERE docket_number = ?",
+                    (row_hash(result), content_hash, result.docket_number),
+                )
+                if parsed is not None:
+                    conn.execute(
+                        "UPDATE dockets SET last_entry_date = ?, last_changed = ? "
+                        "WHERE docket_number = ?",
+                        (last_entry_date(parsed), _now(), result.docket_number),
+                    )
+
+    def close(self) -> None:
+        """Close the connection to the file."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+
+        return self._conn
+
+
+def row_hash(result: SearchResult) -> str:
+    """Hash of a search result's row, to tell when it changes.
+
+    Args:
+        result: Search result
+
+    Returns:
+        str: Hex digest
+    """
+    row = json.dumps(sorted(result.fields.items()))
+    return hashlib.sha256(row.encode()).hexdigest()
+
+
+def last_entry_date(parsed: Dict) -> Optional[str]:
+    """Date of the latest dated entry in a parsed docket.
+
+    Looks at every date in the `Items` of every section (status changes,
+    bail actions, docket entries, ...).
+
+    Args:
+        parsed: Parsed docket, as a dict
+
+    Returns:
+        Optional[str]: Date in ISO format, or `None` if there are no dated
+            entries
+    """
+    latest = None
+    for section in parsed.values():
+        if not isinstance(section, dict):
+            continue
+        for item in section.get("Items", []):
+            for value in item.values():
+                m = _DATE.match(value) if isinstance(value, str) else None
+                if m is not None:
+                    date = f"{m[3]}-{m[1]}-{m[2]}"
+                    latest = date if latest is None else max(latest, date)
+
+    return latest
+
+
+async def poll(
+    portal: Portal,
+    state: CrawlState,
+    filed_start: datetime.date,
+    filed_end: datetime.date,
+    sink: Sink,
+    executor: Optional[Executor] = None,
+    writer: Optional[Writer] = None,
+    **criteria: Any,
+) -> PollStats:
+    """Search once, and download and parse the new and changed dockets.
+
+    Args:
+        portal: Portal to search
+        state: Dockets seen so far. Updated as dockets are downloaded and
+            parsed; dockets that fail to download are tried again next poll.
+        filed_start: First filing date to search (inclusive)
+        filed_end: Last filing date to search (inclusive)
+        sink: Called with each new or changed docket's `SearchResult` and its
+            parsed docket (as a dict), or the error downloading or parsing
+            it. May be a coroutine function. `state` is updated after the
+            sink returns, so if it raises, the docket is tried again next
+            poll.
+        executor: Executor to parse in (see `pipeline.Pipeline`)
+        writer: Writer the sink writes to. Dockets are only recorded in
+            `state` once the writer has them on disk: when its `offset`
+            moves on, or once it's flushed at the end of the poll. So
+            dockets still buffered when the process is killed are downloaded
+            again next poll.
+        **criteria: Other search criteria (e.g. `county`)
+
+    Returns:
+        PollStats: What was found and done
+    """
+    results = await portal.search_all(filed_start, filed_end, **criteria)
+    counts = dict.fromkeys(PollStats._fields, 0)
+    counts["found"] = len(results)
+    todo = []
+    for result in results:
+        tracked = state.get(result.docket_number)
+        if tracked is None or tracked.content_hash is None:
+            counts["new"] += 1
+        elif tracked.row_hash != row_hash(result):
+            counts["changed"] += 1
+        else:
+            continue
+        if result.docket_url is None:
+            state.record(result)
+        else:
+            todo.append(result)
+
+    hashes: Dict[str, str] = {}
+    # State updates of dockets the writer may still be buffering
+    pending: List[Callable[[], Any]] = []
+    written = None if writer is None else writer.offset()
+
+    def settle() -> None:
+        # Everything sunk so far is on disk once the writer's offset moves on
+        # (or if it has no buffer to tell by)
+        nonlocal written
+        if writer is not None:
+            offset = writer.offset()
+            if offset is not None and offset == written:
+                return
+            written = offset
+        while pending:
+            pending.pop(0)()
+
+    async def fetch(result: SearchResult) -> Optional[bytes]:
+        assert result.docket_url is not None
+        pdf = await portal.fetch(result.docket_url)
+        counts["downloaded"] += 1
+        content_hash = hashlib.sha256(pdf).hexdigest()
+        tracked = state.get(result.docket_number)
+        if tracked is not None and tracked.content_hash == content_hash:
+            state.record(result)  # Only its search result row changed
+            return None
+
+        hashes[result.docket_number] = content_hash
+        return pdf
+
+    async def store(result: SearchResult, parsed: Union[Dict, Exception]) -> None:
+        # The docket is only remembered once the sink (and the writer) has it,
+        # so one the sink fails on, or that's lost to a crash, is downloaded
+        # again next poll
+        settle()  # Before the sink, in case another poll flushed the writer
+        ret = sink(result, parsed)
+        if inspect.isawaitable(ret):
+            await ret
+
+        content_hash = hashes.get(result.docket_number)
+        if isinstance(parsed, Exception):
+            counts["failed"] += 1
+            # A pdf that fails to parse would fail again, so it isn't
+            # downloaded again until it changes. Failed downloads are tried
+            # again next poll.
+            if content_hash is not None:
+                pending.append(partial(state.record, result, content_hash))
+        else:
+            counts["parsed"] += 1
+            pending.append(partial(state.record, result, content_hash, parsed))
+        settle()
+
+    pipeline = Pipeline(fetch, store, fetchers=portal.concurrency, executor=executor)
+    await pipeline.run(todo)
+    if writer is not None:
+        writer.flush()
+        written = None
+    settle()
+    return PollStats(**counts)
+
+
+async def watch(
+    portal: Portal,
+    state: CrawlState,
+    days: int,
+    sink: Sink,
+    interval: float = 3600.0,
+    polls: Optional[int] = None,
+    executor: Optional[Executor] = None,
+    writer: Optional[Writer] = None,
+    **criteria: Any,
+) -> AsyncIterator[PollStats]:
+    """Poll the portal for dockets filed recently, over and over.
+
+    Args:
+        portal: Portal to search
+        state: Dockets seen so far
+        days: Number of days of filings to search each poll, up to today
+        sink: Called with each new or changed docket (see `poll`)
+        interval: Seconds from the start of one poll to the next
+        polls: Number of polls. Defaults to polling until cancelled.
+        executor: Executor to parse in (see `pipeline.Pipeline`)
+        writer: Writer the sink writes to, flushed every poll (see `poll`)
+        **criteria: Other search criteria (e.g. `county`)
+
+    Yields:
+        PollStats: Outcome of each poll
+    """
+    loop = asyncio.get_event_loop()
+    n = 0
+    while polls is None or n < polls:
+        start = loop.time()
+        today = datetime.date.today()
+        yield await poll(
+            portal,
+            state,
+            today - datetime.timedelta(days=days - 1),
+            today,
+            sink,
+            executor=executor,
+            writer=writer,
+            **criteria,
+        )
+        n += 1
+        if polls is None or n < polls:
+            await asyncio.sleep(max(0.0, start + interval - loop.time()))
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
@@ -0,0 +1,657 @@
+"""Word extraction.
+
+Extracting words from a pdfplumber page means filtering and clustering every
+char on the page, so it is done once per page. Heading detection and each of
+the section parsers then work from slices of that single word list.
+
+A page's words are stored column-wise in a `WordTable` (an `array` per
+coordinate and a list of interned texts) rather than as a dict per word. Crops
+and indexes refer to words by their row in the table, so comparing, filtering
+and joining words are integer operations.
+"""
+import math
+import sys
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    DefaultDict,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from pdfminer.converter import PDFLayoutAnalyzer
+from pdfminer.layout import LTChar, LTComponent, LTFigure, LTPage
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.utils import mult_matrix
+from pdfplumber.page import Page
+from pdfplumber.utils import extract_words
+
+BBox = Tuple[float, float, float, float]
+
+# Same tolerances pdfplumber uses by default
+X_TOLERANCE: float = 3.0
+Y_TOLERANCE: float = 3.0
+
+
+class WordTable:
+    """Words stored column-wise.
+
+    Row `i` is the word with text `text[i]`, left edge `x0[i]`, and so on.
+    """
+
+    __slots__ = ("text", "x0", "x1", "top", "bottom", "doctop", "size")
+
+    def __init__(self) -> None:
+        self.text: List[str] = []
+        self.x0 = array("d")
+        self.x1 = array("d")
+        self.top = array("d")
+        self.bottom = array("d")
+        self.doctop = array("d")
+        self.size = array("d")
+
+    def __len__(self) -> int:  # noqa: D105
+        return len(self.text)
+
+    @classmethod
+    def from_words(cls, words: Iterable[Dict]) -> "WordTable":
+        """Build a table from pdfplumber word objects.
+
+        Args:
+            words: Word objects. `doctop` defaults to `top` and `size` to 0.
+
+        Returns:
+            WordTable: Table with a row per word
+        """
+        table = cls()
+        for w in words:
+            table.append(
+                w["text"],
+                w["x0"],
+                w["x1"],
+                w["top"],
+                w["bottom"],
+                w.get("doctop", w["top"]),
+                w.get("size", 0.0),
+            )
+        return table
+
+    def append(
+        self,
+        text: str,
+        x0: float,
+        x1: float,
+        top: float,
+        bottom: float,
+        doctop: float,
+        size: float,
+    ) -> int:
+        """Add a word.
+
+        Returns:
+            int: Row of the new word
+        """
+        self.text.append(sys.intern(text))
+        self.x0.append(x0)
+        self.x1.append(x1)
+        self.top.append(top)
+        self.bottom.append(bottom)
+        self.doctop.append(doctop)
+        self.size.append(size)
+        return len(self.text) - 1
+
+    def word(self, i: int) -> Dict:
+        """Row `i` as a pdfplumber-style word object.
+
+        Args:
+            i: Row of the word
+
+        Returns:
+            Dict: New word object
+        """
+        return {
+            "text": self.text[i],
+            "x0": self.x0[i],
+            "x1": self.x1[i],
+            "top": self.top[i],
+            "doctop": self.doctop[i],
+            "bottom": self.bottom[i],
+            "size": self.size[i],
+        }
+
+
+class Crop:
+    """Words within a bounding box.
+
+    Stands in for a pdfplumber `CroppedPage` so parsers can use the familiar
+    `within_bbox`/`extract_words`/`extract_text` interface without extracting
+    the words again.
+
+    Args:
+        bbox: Bounding box (left, top, right, bottom) of the crop
+        table: Table holding the words
+        rows: Rows of `table` inside `bbox`. Defaults to every row.
+    """
+
+    __slots__ = ("bbox", "table", "rows", "_index")
+
+    def __init__(
+        self, bbox: BBox, table: WordTable, rows: Optional[Sequence[int]] = None
+    ):
+        self.bbox = bbox
+        self.table = table
+        self.rows = array("l", range(len(table)) if rows is None else rows)
+        self._index: Optional[WordIndex] = None
+
+    def __repr__(self) -> str:  # noqa: D105
+        return f"<Crop bbox={self.bbox} words={len(self.rows)}>"
+
+    @classmethod
+    def from_words(cls, bbox: BBox, words: Iterable[Dict]) -> "Crop":
+        """Crop of pdfplumber word objects.
+
+        Args:
+            bbox: Bounding box (left, top, right, bottom) of the crop
+            words: Word objects inside `bbox`
+
+        Returns:
+            Crop: Crop over a new table of `words`
+        """
+        return cls(bbox, WordTable.from_words(words))
+
+    @property
+    def width(self) -> float:
+        """Width of the bounding box."""
+        return self.bbox[2] - self.bbox[0]
+
+    @property
+    def height(self) -> float:
+        """Height of the bounding box."""
+        return self.bbox[3] - self.bbox[1]
+
+    @property
+    def words(self) -> List[Dict]:
+        """The crop's words as pdfplumber-style word objects."""
+        return [self.table.word(i) for i in self.rows]
+
+    @property
+    def index(self) -> "WordIndex":
+        """Spatial index of the words, built on first use."""
+        if self._index is None:
+            self._index = WordIndex(self.table, self.rows)
+        return self._index
+
+    def within_bbox(self, bbox: BBox) -> "Crop":
+        """Crop to the words entirely within `bbox`.
+
+        Args:
+            bbox: Bounding box (left, top, right, bottom)
+
+        Returns:
+            Crop: New crop sharing the table of this one
+        """
+        x0, top, x1, bottom = bbox
+        t = self.table
+        rows = [
+            i
+            for i in self.rows
+            if t.x0[i] >= x0
+            and t.x1[i] <= x1
+            and t.top[i] >= top
+            and t.bottom[i] <= bottom
+        ]
+        return Crop(bbox, t, rows)
+
+    def extract_words(self) -> List[Dict]:
+        """Word objects of the words in the crop.
+
+        Returns:
+            List[Dict]: New word objects
+        """
+        return self.words
+
+    def extract_text(self) -> str:
+        """Text of the crop, one line per row of words.
+
+        Mirrors pdfplumber's `extract_text`: words are clustered into lines by
+        `doctop` and joined with a space where there is a gap between them.
+
+        Returns:
+            str: Text of the crop
+        """
+        t = self.table
+        lines = []
+        for line in cluster_rows(self.rows, t.doctop, Y_TOLERANCE):
+            text = ""
+            last_x1 = None
+            for i in sorted(line, key=t.x0.__getitem__):
+                if last_x1 is not None and t.x0[i] > last_x1 + X_TOLERANCE:
+                    text += " "
+                text += t.text[i]
+                last_x1 = t.x1[i]
+            lines.append(text)
+
+        return "\n".join(lines)
+
+
+def cluster_rows(
+    rows: Sequence[int], values: Sequence[float], tolerance: float
+) -> List[List[int]]:
+    """Cluster rows by a coordinate.
+
+    Same clustering as pdfplumber's `cluster_objects`: distinct values are
+    sorted and chained together while each is within `tolerance` of the last.
+
+    Args:
+        rows: Rows to cluster
+        values: Coordinate of every row (e.g. `WordTable.doctop`)
+        tolerance: Largest gap between consecutive values in a cluster
+
+    Returns:
+        List[List[int]]: Clusters in order of value, each in the order of
+            `rows`
+    """
+    clusters: List[List[int]] = []
+    cluster_of: Dict[float, int] = {}
+    last = None
+    for v in sorted({values[i] for i in rows}):
+        if last is None or v > last + tolerance:
+            clusters.append([])
+        cluster_of[v] = len(clusters) - 1
+        last = v
+
+    for i in rows:
+        clusters[cluster_of[values[i]]].append(i)
+
+    return clusters
+
+
+def stack(crops: Sequence[Crop]) -> Crop:
+    """Join crops into one, each placed directly below the last.
+
+    Used to merge the fragments of a section that runs over several pages.
+    Words keep their `doctop` (their position in the whole document) but their
+    `top` and `bottom` are moved down to below the previous crop.
+
+    Args:
+        crops: Crops in order, e.g. a fragment per page
+
+    Returns:
+        Crop: Crop as wide as the first and as tall as all of them. A single
+            crop is returned as it is.
+    """
+    if len(crops) == 1:
+        return crops[0]
+
+    x0, top, x1, _ = crops[0].bbox
+    table = WordTable()
+    y = top
+    for crop in crops:
+        t = crop.table
+        offset = y - crop.bbox[1]
+        for i in crop.rows:
+            table.append(
+                t.text[i],
+                t.x0[i],
+                t.x1[i],
+                t.top[i] + offset,
+                t.bottom[i] + offset,
+                t.doctop[i],
+                t.size[i],
+            )
+        y += crop.height
+
+    return Crop((x0, top, x1, y), table)
+
+
+class WordIndex:
+    """Spatial index of words.
+
+    Answers the questions columnar parsers ask (which word has this text,
+    which words line up with this one, which words are below this line) with
+    lookups instead of scans of every word. Words are bucketed by `x0` and
+    `x1`, and their `bottom`s are kept sorted.
+
+    Words are referred to by their row in the table, and results are always
+    in the order of `rows`.
+
+    Args:
+        table: Table holding the words
+        rows: Rows of the words to index
+        tolerance: Widest alignment tolerance `aligned` is used with
+    """
+
+    def __init__(self, table: WordTable, rows: Sequence[int], tolerance: float = 0.5):
+        self.table = table
+        self.rows = rows
+        self.tolerance = tolerance
+
+        # Position of each row within `rows`, for ordering results
+        self._order = {i: n for n, i in enumerate(rows)}
+        self._by_text: Dict[str, int] = {}
+        self._x0: DefaultDict[int, List[int]] = defaultdict(list)
+        self._x1: DefaultDict[int, List[int]] = defaultdict(list)
+        for i in rows:
+            self._by_text.setdefault(table.text[i], i)
+            self._x0[self._bucket(table.x0[i])].append(i)
+            self._x1[self._bucket(table.x1[i])].append(i)
+
+        self._by_bottom = sorted(rows, key=table.bottom.__getitem__)
+        self._bottoms = [table.bottom[i] for i in self._by_bottom]
+
+    def _bucket(self, x: float) -> int:
+        return math.floor(x / self.tolerance)
+
+    def _near(self, buckets: Dict[int, List[int]], x: float) -> Iterable[int]:
+        b = self._bucket(x)
+        for key in (b - 1, b, b + 1):
+            yield from buckets.get(key, ())
+
+    def _in_order(self, found: Iterable[int]) -> List[int]:
+        return sorted(found, key=self._order.__getitem__)
+
+    def find(self, text: str) -> Optional[int]:
+        """First word with exactly `text`.
+
+        Args:
+            text: Text of the word
+
+        Returns:
+            Optional[int]: Row of the word, or `None` if there isn't one
+        """
+        return self._by_text.get(text)
+
+    def aligned(self, head: int, tolerance: Optional[float] = None) -> List[int]:
+        """Words left or right aligned with word `head`.
+
+        Args:
+            head: Row of the word to align with (e.g. a column header)
+            tolerance: Largest difference in `x0` or `x1` that still counts as
+                aligned. At most the index's tolerance.
+
+        Returns:
+            List[int]: Rows of the aligned words
+        """
+        tol = self.tolerance if tolerance is None else tolerance
+        if tol > self.tolerance:
+            raise ValueError(f"tolerance must be <= {self.tolerance}")
+
+        t = self.table
+        x0, x1 = t.x0[head], t.x1[head]
+        found = {i for i in self._near(self._x0, x0) if abs(t.x0[i] - x0) < tol}
+        found.update(i for i in self._near(self._x1, x1) if abs(t.x1[i] - x1) < tol)
+        return self._in_order(found)
+
+    def below(self, y: float) -> List[int]:
+        """Words whose bottom is at or below `y`.
+
+        Args:
+            y: Height to compare word bottoms to
+
+        Returns:
+            List[int]: Rows of the words
+        """
+        start = bisect_left(self._bottoms, y)
+        return self._in_order(self._by_bottom[start:])
+
+    def column(self, head: int, tolerance: Optional[float] = None) -> List[int]:
+        """Words in the column under word `head`.
+
+        Column members are aligned with `head` and at or below it.
+
+        Args:
+            head: Row of the column header
+            tolerance: Alignment tolerance (see `aligned`)
+
+        Returns:
+            List[int]: Rows of the column words, including `head`
+        """
+        bottom = self.table.bottom
+        return [i for i in self.aligned(head, tolerance) if bottom[i] >= bottom[head]]
+
+    def lines(self, tolerance: float = 0.5) -> List[List[int]]:
+        """Group words into lines by their `bottom`.
+
+        Consecutive bottoms closer than `tolerance` are in the same line.
+
+        Args:
+            tolerance: Largest gap between bottoms within a line
+
+        Returns:
+            List[List[int]]: Rows of the words, top line first and each line
+                in the order of `rows`
+        """
+        lines: List[List[int]] = []
+        last = None
+        for i, bottom in zip(self._by_bottom, self._bottoms):
+            if last is None or bottom - last >= tolerance:
+                lines.append([])
+            lines[-1].append(i)
+            last = bottom
+
+        return [self._in_order(line) for line in lines]
+
+
+def extract_page(page: Page) -> Crop:
+    """Extract all the words on a page.
+
+    Words keep their blank chars and carry their font `size`.
+
+    Args:
+        page: PDF page
+
+    Returns:
+        Crop: Crop covering the whole page
+    """
+    words = page.extract_words(
+        x_tolerance=X_TOLERANCE,
+        y_tolerance=Y_TOLERANCE,
+        keep_blank_chars=True,
+        extra_attrs=["size"],
+    )
+    return Crop(page.bbox, WordTable.from_words(words))
+
+
+class _BandFull(Exception):
+    pass
+
+
+class _Page(LTPage):
+    """Page that hands its chars to `collect` instead of keeping them."""
+
+    def __init__(
+        self, pageid: int, bbox: BBox, collect: Callable[[LTChar], None]
+    ) -> None:
+        super().__init__(pageid, bbox)
+        self.collect = collect
+
+    def add(self, obj: LTComponent) -> None:  # noqa: D102
+        if isinstance(obj, LTChar):
+            self.collect(obj)
+        else:
+            super().add(obj)
+
+
+class _Figure(LTFigure):
+    """Figure that hands its chars to `collect` instead of keeping them."""
+
+    def __init__(
+        self, name: str, bbox: BBox, matrix: Any, collect: Callable[[LTChar], None]
+    ) -> None:
+        super().__init__(name, bbox, matrix)
+        self.collect = collect
+
+    def add(self, obj: LTComponent) -> None:  # noqa: D102
+        if isinstance(obj, LTChar):
+            self.collect(obj)
+        else:
+            super().add(obj)
+
+
+class _CharCollector(PDFLayoutAnalyzer):
+    """pdfminer device keeping only the chars of each page, as char objects.
+
+    Chars aren't added to the page's layout (its page and figure objects pass
+    them to `collect`), and paths and images are dropped as they are drawn,
+    so no layout objects are kept. Char objects carry the same keys and values
+    as pdfplumber's (those used to extract words).
+
+    With `max_top`, rendering is abandoned at the first char below it (by
+    raising `_BandFull`), so the rest of the page is never interpreted. Docket
+    pages are drawn from the top down.
+    """
+
+    def __init__(self, rsrcmgr: PDFResourceManager, max_top: float = math.inf) -> None:
+        super().__init__(rsrcmgr)
+        self.max_top = max_top
+        self.height = 0.0
+        self.doctop = 0.0
+        self.chars: List[Dict] = []
+
+    def begin_page(self, page: PDFPage, ctm: Any) -> None:  # noqa: D102
+        super().begin_page(page, ctm)
+        self.cur_item = _Page(self.pageno, self.cur_item.bbox, self.collect)
+        self.height = self.cur_item.height
+        self.chars = []
+
+    def begin_figure(self, name: str, bbox: BBox, matrix: Any) -> None:  # noqa: D102
+        super().begin_figure(name, bbox, matrix)
+        matrix = mult_matrix(matrix, self.ctm)
+        self.cur_item = _Figure(name, bbox, matrix, self.collect)
+
+    def paint_path(self, *args: Any, **kwargs: Any) -> None:  # noqa: D102
+        pass
+
+    def render_image(self, *args: Any, **kwargs: Any) -> None:  # noqa: D102
+        pass
+
+    def collect(self, item: LTChar) -> None:
+        """Keep a char rendered on the page.
+
+        Args:
+            item: The char
+        """
+        top = self.height - item.y1
+        if top > self.max_top:
+            raise _BandFull
+
+        self.chars.append(
+            {
+                "text": item.get_text(),
+                "x0": item.x0,
+                "x1": item.x1,
+                "top": top,
+                "doctop": self.doctop + top,
+                "bottom": self.height - item.y0,
+                "upright": item.upright,
+                "size": item.size,
+            }
+        )
+
+
+def _page_bbox(page: PDFPage) -> BBox:
+    """Bounding box of a page, as pdfplumber gives it."""
+    m = page.mediabox
+    if page.rotate % 360 in (90, 270):
+        m = (m[1], m[0], m[3], m[2])
+    return (min(m[0], m[2]), min(m[1], m[3]), max(m[0], m[2]), max(m[1], m[3]))
+
+
+def _to_crop(bbox: BBox, chars: List[Dict]) -> Crop:
+    words = extract_words(
+        chars,
+        x_tolerance=X_TOLERANCE,
+        y_tolerance=Y_TOLERANCE,
+        keep_blank_chars=True,
+        extra_attrs=["size"],
+    )
+    return Crop(bbox, WordTable.from_words(words))
+
+
+def extract_pages(stream: BinaryIO) -> Iterator[Crop]:
+    """Extract all the words on each page of a pdf, with pdfminer directly.
+
+    An alternative to opening the pdf with pdfplumber and calling
+    `extract_page` on each page, which builds every layout object on the page
+    (rects, lines, curves, images) only for words to be taken from its chars.
+    Here pdfminer's interpreter draws each page on a device that keeps nothing
+    but the chars' text, bounding boxes and sizes. Words come out the same as
+    from `extract_page`.
+
+    Args:
+        stream: Seekable binary file object of the pdf
+
+    Yields:
+        Crop: Crop covering each page, in order
+    """
+    doc = PDFDocument(PDFParser(stream))
+    rsrcmgr = PDFResourceManager()
+    device = _CharCollector(rsrcmgr)
+    interpreter = PDFPageInterpreter(rsrcmgr, device)
+    for page in PDFPage.create_pages(doc):
+        bbox = _page_bbox(page)
+        interpreter.process_page(page)
+        yield _to_crop(bbox, device.chars)
+        device.doctop += bbox[3] - bbox[1]
+        device.chars = []
+
+
+def extract_top_band(stream: BinaryIO, max_top: float) -> Crop:
+    """Extract the words at the top of a pdf's first page.
+
+    Reads the pdf with pdfminer directly and stops interpreting the page at
+    the first char below `max_top`, so only as much of the page as is needed
+    is processed. Words come out the same as from `extract_page`.
+
+    Args:
+        stream: Seekable binary file object of the pdf
+        max_top: Height of the band in points from the top of the page
+
+    Returns:
+        Crop: Crop of the band
+
+    Raises:
+        ValueError: If the pdf has no pages
+    """
+    doc = PDFDocument(PDFParser(stream))
+    rsrcmgr = PDFResourceManager()
+    device = _CharCollector(rsrcmgr, max_top)
+    interpreter = PDFPageInterpreter(rsrcmgr, device)
+    page = next(PDFPage.create_pages(doc), None)
+    if page is None:
+        raise ValueError("pdf has no pages")
+    try:
+        interpreter.process_page(page)
+    except _BandFull:
+        pass
+
+    bbox = (0, 0, device.cur_item.width, max_top)
+    # Words on the line rendering stopped at may be incomplete
+    return _to_crop(bbox, device.chars).within_bbox(bbox)
+
+
+def count_pages(stream: BinaryIO) -> int:
+    """Count the pages of a pdf.
+
+    Only the pdf's page tree is read; no page is interpreted.
+
+    Args:
+        stream: Seekable binary file object of the pdf
+
+    Returns:
+        int: Number of pages
+    """
+    doc = PDFDocument(PDFParser(stream))
+    return sum(1 for _ in PDFPage.create_pages(doc))
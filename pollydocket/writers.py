@@ -0,0 +1,391 @@
+"""Streaming output of parsed dockets.
+
+Writers take dockets one at a time as they finish parsing and write them out
+incrementally, so a batch is never held in memory:
+
+* `JSONLinesWriter` writes a line per docket, keeping its nested structure
+* `CSVWriter` and `ParquetWriter` flatten dockets into tables keyed by docket
+  number (see `flatten`), buffering `batch_size` dockets before writing them
+  out as a new part of each table
+
+Example:
+    >>> with open_writer("dockets", "csv") as writer:
+    ...     for path, result in parse_many(paths):
+    ...         writer.write(docket.peek(path)["Docket Number"], result)
+
+`ParquetWriter` needs pyarrow (`pip install pollydocket[parquet]`).
+"""
+import csv
+import json
+import os
+import re
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple, Union
+
+Row = Dict[str, str]
+
+# Table of one row per docket, with its errors and any extra fields
+DOCKETS_TABLE = "dockets"
+KEY = "Docket Number"
+
+
+def table_name(section: str) -> str:
+    """Name of a section's table (e.g. "status_information").
+
+    Args:
+        section: Section heading (e.g. "Status Information")
+
+    Returns:
+        str: Lower case name with underscores
+    """
+    return re.sub(r"[^0-9a-z]+", "_", section.lower()).strip("_")
+
+
+def flatten(
+    docket_number: str,
+    result: Union[Dict, Exception],
+    extra: Optional[Dict[str, Any]] = None,
+) -> Iterator[Tuple[str, Row]]:
+    """Flatten a parsed docket into rows of tables.
+
+    Every row starts with the docket number. There are tables of:
+
+    * `dockets`: a row per docket, with its `Error` (empty if it parsed) and
+      `extra` fields
+    * each section (e.g. `bail`): a row of the section's fields, if it has any
+      besides `Items`
+    * each section's `Items` (e.g. `bail_items`): a row per item, numbered
+      from 1 in `Item`
+
+    Values that aren't strings are written as JSON.
+
+    Args:
+        docket_number: Docket number
+        result: Parsed docket, as a dict, or the error parsing it
+        extra: More fields for the `dockets` table
+
+    Yields:
+        Tuple[str, Row]: Table name and row
+    """
+    docket: Row = {KEY: docket_number}
+    docket.update((k, _cell(v)) for k, v in (extra or {}).items())
+    docket["Error"] = (
+        f"{type(result).__name__}: {result}" if isinstance(result, Exception) else ""
+    )
+    yield DOCKETS_TABLE, docket
+    if isinstance(result, Exception):
+        return
+
+    for section, fields in result.items():
+        name = table_name(section)
+        row: Row = {KEY: docket_number}
+        for field, value in fields.items():
+            if field == "Items":
+                for n, item in enumerate(value, 1):
+                    item_row = {KEY: docket_number, "Item": str(n)}
+                    item_row.update((k, _cell(v)) for k, v in item.items())
+                    yield f"{name}_items", item_row
+            else:
+                row[field] = _cell(value)
+        if len(row) > 1:
+            yield name, row
+
+
+def _cell(value: Any) -> str:
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+class Writer(ABC):
+    """Destination for parsed dockets.
+
+    Use as a context manager, or call `close` when done.
+    """
+
+    def __enter__(self) -> "Writer":  # noqa: D105
+        return self
+
+    def __exit__(self, *exc_info) -> None:  # noqa: D105
+        self.close()
+
+    @abstractmethod
+    def write(
+        self,
+        docket_number: str,
+        result: Union[Dict, Exception],
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Write a parsed docket.
+
+        Args:
+            docket_number: Docket number
+            result: Parsed docket, as a dict, or the error parsing it
+            extra: More fields to write with it (e.g. its search result)
+        """
+
+    def flush(self) -> None:
+        """Write anything buffered."""
+
+    def offset(self) -> Optional[int]:
+        """How far the output has been written, if it can be truncated.
+
+        Everything written up to the offset is complete. Dockets still
+        buffered aren't included.
+
+        Returns:
+            Optional[int]: Offset to pass to `truncate`, or `None` if the
+                output can't be truncated (e.g. it's a pipe)
+        """
+        return None
+
+    def truncate(self, offset: int) -> None:
+        """Drop the output written after an `offset`.
+
+        Used to resume an interrupted run from its last checkpoint (see
+        `checkpoint.Checkpoint`). Call it before writing anything.
+
+        Args:
+            offset: Offset previously returned by `offset`
+
+        Raises:
+            ValueError: If the output doesn't reach `offset`, i.e. some of it
+                was lost (e.g. deleted) since the offset was taken
+        """
+
+    def close(self) -> None:
+        """Write anything buffered and close the output."""
+
+
+class JSONLinesWriter(Writer):
+    """Writes a JSON object per docket per line.
+
+    Each line has the `Docket Number`, the `extra` fields and either the
+    parsed `Docket` or the `Error` parsing it.
+
+    Args:
+        output: Path of the file, or a text file object. Paths are appended
+            to.
+    """
+
+    def __init__(self, output: Union[str, Path, IO[str]]) -> None:
+        if isinstance(output, (str, Path)):
+            self._file: IO[str] = open(output, "a")
+            self._owned = True
+        else:
+            self._file = output
+            self._owned = False
+
+    def write(  # noqa: D102
+        self,
+        docket_number: str,
+        result: Union[Dict, Exception],
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        line: Dict[str, Any] = {KEY: docket_number}
+        line.update(extra or {})
+        if isinstance(result, Exception):
+            line["Error"] = f"{type(result).__name__}: {result}"
+        else:
+            line["Docket"] = result
+        self._file.write(json.dumps(line) + "\n")
+        self._file.flush()
+
+    def flush(self) -> None:  # noqa: D102
+        self._file.flush()
+
+    def offset(self) -> Optional[int]:  # noqa: D102
+        return self._file.tell() if self._file.seekable() else None
+
+    def truncate(self, offset: int) -> None:  # noqa: D102
+        if self._file.seekable():
+            size = self._file.seek(0, os.SEEK_END)
+            if offset > size:
+                raise ValueError(
+                    f"Output is {size} bytes, short of offset {offset}; "
+                    "it has lost dockets written before"
+                )
+            self._file.truncate(offset)
+            self._file.seek(offset)
+
+    def close(self) -> None:  # noqa: D102
+        if self._owned:
+            self._file.close()
+        else:
+            self._file.flush()
+
+
+class TableWriter(Writer):
+    """Writes flattened dockets as tables in a directory.
+
+    Each table is a subdirectory of numbered parts. Dockets are buffered and
+    written out `batch_size` at a time (and by `flush` and `close`), as a new
+    part of every table they have rows in; a part's columns are those of its
+    rows. Parts are written to a temporary file and renamed into place, so a
+    part is either complete or absent, even if the process is killed.
+
+    Parts are numbered in the order they're written, the same number across
+    tables, so `offset` is the number of the next part and `truncate` deletes
+    parts from a number on. Parts already in the directory (e.g. from an
+    earlier run) are kept; new parts are numbered after them.
+
+    Args:
+        directory: Directory to write tables in. Created if it doesn't exist.
+        batch_size: Dockets to buffer before writing them
+    """
+
+    extension = ""
+
+    def __init__(self, directory: Union[str, Path], batch_size: int = 10000) -> None:
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self._rows: Dict[str, List[Row]] = {}
+        self._buffered = 0
+        self._next_part = 0
+        for part in self._parts():
+            if part.name.startswith("."):
+                part.unlink()  # Left by a run that was killed mid-write
+            else:
+                self._next_part = max(self._next_part, _part_number(part) + 1)
+
+    def write(  # noqa: D102
+        self,
+        docket_number: str,
+        result: Union[Dict, Exception],
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        for name, row in flatten(docket_number, result, extra):
+            self._rows.setdefault(name, []).append(row)
+        self._buffered += 1
+        if self._buffered >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:  # noqa: D102
+        if not self._buffered:
+            return
+
+        for name, rows in self._rows.items():
+            columns: List[str] = []
+            known = set()
+            for row in rows:
+                for column in row:
+                    if column not in known:
+                        known.add(column)
+                        columns.append(column)
+            path = self.directory / name / f"part-{self._next_part:05}{self.extension}"
+            path.parent.mkdir(exist_ok=True)
+            temp = path.with_name(f".{path.name}.tmp")
+            self._write_part(temp, columns, rows)
+            os.replace(temp, path)
+
+        self._rows = {}
+        self._buffered = 0
+        self._next_part += 1
+
+    def offset(self) -> Optional[int]:  # noqa: D102
+        return self._next_part
+
+    def truncate(self, offset: int) -> None:  # noqa: D102
+        if offset > self._next_part:
+            raise ValueError(
+                f"Output has {self._next_part} parts, short of offset {offset}; "
+                "it has lost dockets written before"
+            )
+        for part in self._parts():
+            if _part_number(part) >= offset:
+                part.unlink()
+        self._next_part = offset
+
+    def close(self) -> None:  # noqa: D102
+        self.flush()
+
+    def _parts(self) -> List[Path]:
+        """Parts of every table, including temporary ones."""
+        ext = self.extension
+        return list(self.directory.glob(f"*/part-*{ext}")) + list(
+            self.directory.glob(f"*/.part-*{ext}.tmp")
+        )
+
+    @abstractmethod
+    def _write_part(self, path: Path, columns: List[str], rows: List[Row]) -> None:
+        """Write a part of a table.
+
+        Args:
+            path: Path of the part's file
+            columns: Columns of the table, in order
+            rows: Rows of the part
+        """
+
+
+def _part_number(part: Path) -> int:
+    match = re.search(r"part-(\d+)", part.name)
+    return int(match.group(1)) if match else -1
+
+
+class CSVWriter(TableWriter):
+    """Writes flattened dockets as CSV tables (see `TableWriter`).
+
+    Missing values are written as empty strings.
+    """
+
+    extension = ".csv"
+
+    def _write_part(self, path: Path, columns: List[str], rows: List[Row]) -> None:
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, columns, restval="")
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+class ParquetWriter(TableWriter):
+    """Writes flattened dockets as Parquet tables (see `TableWriter`).
+
+    Every column is a string column; missing values are nulls. Each part is a
+    complete Parquet file.
+    """
+
+    extension = ".parquet"
+
+    def __init__(self, directory: Union[str, Path], batch_size: int = 10000) -> None:
+        try:
+            import pyarrow  # noqa: F401
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ImportError(
+                "Writing Parquet needs pyarrow (pip install pollydocket[parquet])"
+            ) from None
+        super().__init__(directory, batch_size)
+
+    def _write_part(self, path: Path, columns: List[str], rows: List[Row]) -> None:
+        import pyarrow
+        import pyarrow.parquet
+
+        schema = pyarrow.schema([(c, pyarrow.string()) for c in columns])
+        table = pyarrow.Table.from_pydict(
+            {c: [row.get(c) for row in rows] for c in columns}, schema=schema
+        )
+        pyarrow.parquet.write_table(table, str(path))
+
+
+FORMATS = {"jsonl": JSONLinesWriter, "csv": CSVWriter, "parquet": ParquetWriter}
+
+
+def open_writer(output: Union[str, Path], format: str, **kwargs: Any) -> Writer:
+    """Open a writer of a format.
+
+    Args:
+        output: File (for "jsonl") or directory (for "csv" and "parquet") to
+            write to
+        format: One of `FORMATS`
+        **kwargs: Options of the writer (e.g. `batch_size`)
+
+    Returns:
+        Writer: The writer
+    """
+    try:
+        cls = FORMATS[format]
+    except KeyError:
+        raise ValueError(f"Unknown format {format!r}") from None
+    return cls(output, **kwargs)  # type: ignore
@@ -0,0 +1,31 @@
+# noqa: D100
+import asyncio
+
+import pytest
+
+from pollydocket import docket
+
+from .portal import Portal as StandIn
+
+
+@pytest.fixture
+def stand_in():  # noqa: D103
+    with StandIn() as server:
+        yield server
+
+
+def run(coro):
+    """Run a coroutine to completion on a new event loop."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def parse_or_error(pdf, backend="pdfplumber"):
+    """Parse a pdf to a dict, returning rather than raising the error."""
+    try:
+        return docket.parse_pdf(pdf, backend=backend).to_dict()
+    except Exception as e:
+        return e
@@ -0,0 +1,256 @@
+"""Local stand-in for the UJS portal, serving the fixture dockets.
+
+Implements just enough of the portal for `pollydocket.search`: the search
+page with its anti-forgery token, date-filed searches (capped at
+`max_results` like the real portal) and docket sheet downloads. It speaks
+HTTP/1.1 with keep-alive and counts the connections it accepts.
+"""
+import datetime
+import secrets
+import threading
+from glob import glob
+from html import escape
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from os import path
+from socketserver import ThreadingMixIn
+from typing import Dict, List, NamedTuple, Optional, Tuple, cast
+from urllib.parse import parse_qs, quote, urlsplit
+
+from pollydocket import docket
+
+PDFS_PATH = f"{path.dirname(path.abspath(__file__))}/data/"
+
+# Filing dates of the fixture dockets
+FILED = {
+    "civil_docket.pdf": datetime.date(2022, 1, 10),
+    "cp_criminal_docket.pdf": datetime.date(2022, 1, 11),
+    "eviction_docket.pdf": datetime.date(2022, 1, 10),
+    "misc_docket.pdf": datetime.date(2022, 1, 11),
+    "mj_criminal_docket.pdf": datetime.date(2022, 1, 11),
+    "non_traffic_docket.pdf": datetime.date(2022, 1, 11),
+    "traffic_docket.pdf": datetime.date(2022, 1, 12),
+}
+
+HEADINGS = [
+    "Docket Number",
+    "Court Type",
+    "Docket Type",
+    "Filing Date",
+    "County",
+    "Court Office",
+    "",
+]
+
+
+class Case(NamedTuple):
+    """A docket the stand-in portal knows about."""
+
+    docket_number: str
+    docket_type: str
+    filed: datetime.date
+    county: str
+    court_office: str
+    pdf: str
+
+
+def fixture_cases() -> List[Case]:
+    """A case for each fixture docket."""
+    cases = []
+    for pdf in sorted(glob(PDFS_PATH + "*.pdf")):
+        info = cast(Dict[str, str], docket.peek(pdf))
+        court = info["Court"].split()[-1]
+        office = "CP-14" if court == "Pleas" else f"MDJ-{court}"
+        cases.append(
+            Case(
+                info["Docket Number"],
+                info["Docket Type"],
+                FILED[path.basename(pdf)],
+                info["County"],
+                office,
+                pdf,
+            )
+        )
+    return cases
+
+
+class Portal(ThreadingMixIn, HTTPServer):
+    """Stand-in portal listening on localhost.
+
+    Args:
+        cases: Dockets to serve. Defaults to the fixtures.
+        max_results: Most results returned by a search
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self, cases: Optional[List[Case]] = None, max_results: int = 500
+    ) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.cases = fixture_cases() if cases is None else cases
+        self.max_results = max_results
+        self.connections = 0
+        self.searches: List[Dict[str, str]] = []
+        self.downloads: List[str] = []
+        self.failures: List[int] = []
+        self.token = ""
+        self.cookie = ""
+        self.rotate_token()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """Base URL of the portal."""
+        return "http://127.0.0.1:%d" % self.server_address[1]
+
+    def __enter__(self) -> "Portal":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+    def rotate_token(self) -> None:
+        """Expire the current anti-forgery token."""
+        self.token = secrets.token_hex(8)
+        self.cookie = secrets.token_hex(8)
+
+    def fail_next(self, *statuses: int) -> None:
+        """Answer the next requests with these statuses."""
+        with self._lock:
+            self.failures += statuses
+
+    def next_failure(self) -> Optional[int]:
+        """Status to answer the next request with, if it should fail."""
+        with self._lock:
+            return self.failures.pop(0) if self.failures else None
+
+    def process_request(self, request, client_address) -> None:  # noqa: D102
+        with self._lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def search(self, form: Dict[str, str]) -> List[Case]:
+        """Cases matching a search form, as many as the portal returns."""
+        start = _date(form["FiledStartDate"])
+        end = _date(form["FiledEndDate"])
+        found = [
+            c
+            for c in self.cases
+            if start <= c.filed <= end
+            and form.get("County", c.county).lower() == c.county.lower()
+            and form.get("DocketType", c.docket_type) == c.docket_type
+            and form.get("CourtOffice", c.court_office) == c.court_office
+            and form.get("CourtType", _court_type(c)) == _court_type(c)
+        ]
+        return found[: self.max_results]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: Portal
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self._failed():
+            return
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == "/CaseSearch":
+            page = (
+                '<form method="post"><input type="hidden" '
+                f'name="__RequestVerificationToken" value="{self.server.token}">'
+                "</form>"
+            )
+            cookie = f".AspNetCore.Antiforgery.Ab1={self.server.cookie}; path=/"
+            self._send(200, page.encode(), "text/html", [("Set-Cookie", cookie)])
+        elif url.path in ("/Report/MdjDocketSheet", "/Report/CpDocketSheet"):
+            number = query.get("docketNumber")
+            case = next(
+                (c for c in self.server.cases if c.docket_number == number), None
+            )
+            if case is None or not path.exists(case.pdf):
+                self._send(404, b"Not found", "text/plain")
+                return
+            self.server.downloads.append(case.docket_number)
+            with open(case.pdf, "rb") as f:
+                self._send(200, f.read(), "application/pdf")
+        else:
+            self._send(404, b"Not found", "text/plain")
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        form = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+        if self._failed():
+            return
+        if urlsplit(self.path).path != "/CaseSearch":
+            self._send(404, b"Not found", "text/plain")
+            return
+        token = form.get("__RequestVerificationToken")
+        cookies = self.headers.get("Cookie", "")
+        if token != self.server.token or self.server.cookie not in cookies:
+            self._send(400, b"Bad request", "text/plain")
+            return
+
+        self.server.searches.append(form)
+        rows = "".join(_row(c) for c in self.server.search(form))
+        headings = "".join(f"<th>{h}</th>" for h in HEADINGS)
+        page = (
+            f'<table id="caseSearchResultGrid"><thead><tr>{headings}</tr></thead>'
+            f"<tbody>{rows}</tbody></table>"
+        )
+        self._send(200, page.encode(), "text/html")
+
+    def _failed(self) -> bool:
+        status = self.server.next_failure()
+        if status is None:
+            return False
+        self._send(status, b"Try again", "text/plain", [("Retry-After", "0.1")])
+        return True
+
+    def _send(
+        self,
+        status: int,
+        body: bytes,
+        content_type: str,
+        headers: Optional[List[Tuple[str, str]]] = None,
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in headers or []:
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _row(case: Case) -> str:
+    kind = _court_type(case)
+    court = kind.capitalize()
+    sheet = f"/Report/{court}DocketSheet?docketNumber={quote(case.docket_number)}"
+    cells = [
+        case.docket_number,
+        kind,
+        case.docket_type,
+        case.filed.strftime("%m/%d/%Y"),
+        case.county,
+        case.court_office,
+    ]
+    links = (
+        f'<td><table><tr><td><a href="{escape(sheet)}">Docket Sheet</a></td>'
+        "<td><a href=\"/Report/CourtSummary\">Court Summary</a></td></tr></table></td>"
+    )
+    return "<tr>" + "".join(f"<td>{escape(c)}</td>" for c in cells) + links + "</tr>"
+
+
+def _date(text: str) -> datetime.date:
+    return datetime.datetime.strptime(text, "%Y-%m-%d").date()
+
+
+def _court_type(case: Case) -> str:
+    return "MDJ" if case.docket_number.startswith("MJ") else "CP"
@@ -0,0 +1,121 @@
+# noqa: D100
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from os import path
+
+import pytest
+
+import pollydocket
+from pollydocket import docket
+
+from .conftest import parse_or_error, run
+
+PDFS_PATH = f"{path.dirname(path.abspath(__file__))}/data/"
+PDFS = sorted(glob(PDFS_PATH + "*.pdf"))
+
+
+@pytest.mark.parametrize("chunksize", [1, 3])
+def test_parse_many(chunksize):  # noqa: D103
+    results = dict(pollydocket.parse_many(PDFS, workers=2, chunksize=chunksize))
+    assert sorted(results) == PDFS
+    for pdf, result in results.items():
+        expected = parse_or_error(pdf)
+        if isinstance(expected, Exception):
+            assert type(result) is type(expected)
+        else:
+            assert result == expected
+
+
+def test_parse_many_isolates_failures(tmp_path):  # noqa: D103
+    bad = tmp_path / "bad.pdf"
+    bad.write_bytes(b"not a pdf")
+    paths = [str(bad), PDFS_PATH + "mj_criminal_docket.pdf", str(tmp_path / "missing")]
+    results = dict(pollydocket.parse_many(paths, workers=2, chunksize=3))
+    assert isinstance(results[str(bad)], Exception)
+    assert isinstance(results[str(tmp_path / "missing")], FileNotFoundError)
+    assert not isinstance(results[PDFS_PATH + "mj_criminal_docket.pdf"], Exception)
+
+
+def test_iparse_many_is_lazy():  # noqa: D103
+    it = pollydocket.iparse_many(iter(PDFS), workers=1)
+    first = next(it)
+    assert first[0] in PDFS
+    it.close()
+
+
+def test_parse_many_bad_chunksize():  # noqa: D103
+    with pytest.raises(ValueError):
+        pollydocket.parse_many(PDFS, chunksize=0)
+
+
+async def _collect(paths, **kwargs):
+    return [res async for res in pollydocket.aparse(paths, **kwargs)]
+
+
+def test_aparse():  # noqa: D103
+    results = dict(run(_collect(PDFS, limit=2)))
+    assert sorted(results) == PDFS
+    assert results[PDFS_PATH + "mj_criminal_docket.pdf"] == docket.parse_pdf(
+        PDFS_PATH + "mj_criminal_docket.pdf"
+    )
+
+
+def test_aparse_async_source_and_limit():  # noqa: D103
+    in_flight = []
+
+    class CountingExecutor(ThreadPoolExecutor):
+        active = 0
+
+        def submit(self, fn, *args, **kwargs):
+            CountingExecutor.active += 1
+            in_flight.append(CountingExecutor.active)
+            future = super().submit(fn, *args, **kwargs)
+            future.add_done_callback(lambda _: self._finished())
+            return future
+
+        def _finished(self):
+            CountingExecutor.active -= 1
+
+    async def source():
+        for pdf in PDFS:
+            await asyncio.sleep(0)
+            yield pdf
+
+    with CountingExecutor(max_workers=4) as executor:
+        results = run(_collect(source(), executor=executor, limit=2))
+
+    assert sorted(path for path, _ in results) == PDFS
+    assert max(in_flight) <= 2
+
+
+def test_aparse_cancel():  # noqa: D103
+    submitted = []
+
+    class RecordingExecutor(ThreadPoolExecutor):
+        def submit(self, fn, *args, **kwargs):
+            submitted.append(args)
+            return super().submit(fn, *args, **kwargs)
+
+    async def cancel_while_parsing(executor):
+        task = asyncio.ensure_future(_collect(PDFS, executor=executor, limit=1))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with RecordingExecutor(max_workers=1) as executor:
+        run(cancel_while_parsing(executor))
+
+    assert len(submitted) == 1
+
+
+def test_parse_many_buffers():  # noqa: D103
+    pdf = PDFS_PATH + "mj_criminal_docket.pdf"
+    with open(pdf, "rb") as f:
+        data = f.read()
+    view = memoryview(data)
+
+    results = pollydocket.parse_many([data, view], workers=2)
+    assert {id(src) for src, _ in results} == {id(data), id(view)}
+    assert all(res == docket.parse_pdf(pdf) for _, res in results)
@@ -0,0 +1,67 @@
+# noqa: D100
+import pickle
+from os import path
+
+import pytest
+
+from pollydocket import cache, docket
+
+PDFS_PATH = f"{path.dirname(path.abspath(__file__))}/data/"
+PDF = PDFS_PATH + "mj_criminal_docket.pdf"
+
+
+@pytest.fixture
+def result_cache(tmp_path):  # noqa: D103
+    return cache.ResultCache(str(tmp_path / "cache.sqlite"))
+
+
+def test_parse_pdf_cached(result_cache, monkeypatch):  # noqa: D103
+    expected = docket.parse_pdf(PDF)
+    assert docket.parse_pdf(PDF, cache=result_cache) == expected
+    assert len(result_cache) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("cache miss")
+
+    monkeypatch.setattr(docket.pdfplumber, "open", fail)
+    assert docket.parse_pdf(PDF, cache=result_cache) == expected
+
+
+def test_fingerprint_change_misses(result_cache, tmp_path):  # noqa: D103
+    with open(PDF, "rb") as f:
+        data = f.read()
+    result_cache.put(result_cache.key(data), {"a": "b"})
+
+    reopened = cache.ResultCache(result_cache.path)
+    assert reopened.get(reopened.key(data)) == {"a": "b"}
+    reopened.fingerprint = "changed"
+    assert reopened.get(reopened.key(data)) is None
+
+
+def test_fingerprint(monkeypatch):  # noqa: D103
+    fingerprint = cache.parser_fingerprint()
+    assert cache.parser_fingerprint() == fingerprint
+    monkeypatch.setattr(cache.pdfminer, "__version__", "0")
+    assert cache.parser_fingerprint() != fingerprint
+
+
+def test_lru_eviction(result_cache):  # noqa: D103
+    result_cache.put("a", {"text": "a" * 100})
+    entry_size = result_cache.size
+    result_cache.max_size = 2 * entry_size
+    result_cache.put("b", {"text": "b" * 100})
+    result_cache.get("a")  # "b" is now least recently used
+    result_cache.put("c", {"text": "c" * 100})
+
+    assert result_cache.get("a") is not None
+    assert result_cache.get("b") is None
+    assert result_cache.get("c") is not None
+    assert result_cache.size <= result_cache.max_size
+
+
+def test_pickle(result_cache):  # noqa: D103
+    result_cache.put("a", {"x": "y"})
+    copy = pickle.loads(pickle.dumps(result_cache))
+    assert copy.get("a") == {"x": "y"}
+    copy.clear()
+    assert len(result_cache) == 0
@@ -0,0 +1,73 @@
+# noqa: D100
+import pytest
+
+from pollydocket import checkpoint
+
+PDF = "tests/data/mj_criminal_docket.pdf"
+
+
+def test_record_and_resume(tmp_path):  # noqa: D103
+    path = tmp_path / "run.checkpoint"
+    pdf_hash = checkpoint.content_hash(PDF)
+    with checkpoint.Checkpoint(path) as cp:
+        assert len(cp) == 0 and cp.offset is None
+        assert list(cp.todo([PDF])) == [PDF]
+        cp.record(PDF, "0" * 64, checkpoint.FAILED, offset=10)
+        cp.record(PDF, pdf_hash, checkpoint.PARSED, offset=20)
+        cp.record("other.pdf", "0" * 64, checkpoint.PARSED)
+
+    with checkpoint.Checkpoint(path) as cp:
+        assert len(cp) == 2
+        assert PDF in cp
+        assert cp.get(PDF) == checkpoint.Entry(PDF, pdf_hash, "parsed", 20)
+        assert cp.offset == 20
+        assert cp.done(PDF)
+        # Missing
+        assert not cp.done("other.pdf")
+        assert list(cp.todo([PDF, "other.pdf", "new.pdf"])) == ["other.pdf", "new.pdf"]
+
+
+def test_changed_inputs_are_redone(tmp_path):  # noqa: D103
+    pdf = tmp_path / "docket.pdf"
+    pdf.write_bytes(b"one")
+    with checkpoint.Checkpoint(tmp_path / "run.checkpoint") as cp:
+        cp.record(pdf, checkpoint.content_hash(pdf), checkpoint.PARSED)
+        assert cp.done(pdf)
+        pdf.write_bytes(b"two")
+        assert not cp.done(pdf)
+
+
+def test_torn_last_line_is_dropped(tmp_path):  # noqa: D103
+    path = tmp_path / "run.checkpoint"
+    with checkpoint.Checkpoint(path) as cp:
+        cp.record("a.pdf", "0" * 64, checkpoint.PARSED, offset=5)
+    good = path.read_bytes()
+    path.write_bytes(good + b'{"source":"b.pdf","content_')
+
+    with checkpoint.Checkpoint(path) as cp:
+        assert len(cp) == 1
+        assert path.read_bytes() == good
+        cp.record("b.pdf", "0" * 64, checkpoint.PARSED, offset=9)
+
+    with checkpoint.Checkpoint(path) as cp:
+        assert sorted(e.source for e in cp._entries.values()) == ["a.pdf", "b.pdf"]
+        assert cp.offset == 9
+
+
+def test_closed(tmp_path):  # noqa: D103
+    cp = checkpoint.Checkpoint(tmp_path / "run.checkpoint", fsync=True)
+    cp.record("a.pdf", "0" * 64, checkpoint.PARSED)
+    cp.close()
+    with pytest.raises(ValueError):
+        cp.record("b.pdf", "0" * 64, checkpoint.PARSED)
+
+
+def test_start(tmp_path):  # noqa: D103
+    path = tmp_path / "run.checkpoint"
+    with checkpoint.Checkpoint(path) as cp:
+        cp.start(100)
+        cp.start(200)
+        assert cp.offset == 100
+
+    with checkpoint.Checkpoint(path) as cp:
+        assert cp.offset == 100 and len(cp) == 0
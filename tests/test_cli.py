@@ -0,0 +1,182 @@
+# noqa: D100
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+from glob import glob
+from os import path
+
+import pytest
+
+from pollydocket import cli
+
+PDFS_PATH = f"{path.dirname(path.abspath(__file__))}/data/"
+PDFS = sorted(glob(PDFS_PATH + "*.pdf"))
+MJ_CRIMINAL = PDFS_PATH + "mj_criminal_docket.pdf"
+
+
+def _read_jsonl(output):
+    return [json.loads(line) for line in output.read_text().splitlines()]
+
+
+def test_parse(tmp_path, capsys):  # noqa: D103
+    output = tmp_path / "dockets.jsonl"
+    assert cli.main(["parse", PDFS_PATH, "-j", "2", "-o", str(output)]) == 0
+    lines = _read_jsonl(output)
+    assert sorted(line["Source"] for line in lines) == PDFS
+    assert all(("Docket" in line) != ("Error" in line) for line in lines)
+
+    mj_criminal = next(line for line in lines if line["Source"] == MJ_CRIMINAL)
+    assert mj_criminal["Docket Number"] == "MJ-49303-CR-0000002-2022"
+    assert mj_criminal["Pages"] == 2
+    assert "Docket" in mj_criminal
+
+    report = capsys.readouterr().err.strip().splitlines()[-1]
+    assert report.startswith(f"{len(PDFS)} docs")
+    assert "docs/s" in report and "pages/s" in report
+
+
+def test_parse_cached(tmp_path, capsys):  # noqa: D103
+    output = tmp_path / "dockets.jsonl"
+    argv = ["parse", MJ_CRIMINAL, "--cache", str(tmp_path / "cache.sqlite")]
+    argv += ["-o", str(output)]
+    for cached in ("", ", 1 cached"):
+        assert cli.main(argv) == 0
+        line = _read_jsonl(output)[-1]  # Each run appends
+        assert line["Pages"] == 2
+        assert line["Docket Number"] == "MJ-49303-CR-0000002-2022"
+        report = capsys.readouterr().err.strip().splitlines()[-1]
+        assert report.startswith(f"1 docs (0 failed{cached}), 2 pages in ")
+
+
+def test_parse_globs_and_manifests(tmp_path):  # noqa: D103
+    bad = tmp_path / "bad.pdf"
+    bad.write_bytes(b"not a pdf")
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text(f"# Dockets\n{MJ_CRIMINAL}\n\n{bad}\n")
+    output = tmp_path / "dockets.jsonl"
+    argv = [PDFS_PATH + "traffic_*.pdf", "--manifest", str(manifest)]
+    argv += ["-q", "-o", str(output)]
+    assert cli.main(["parse"] + argv) == 0
+    lines = {line["Source"]: line for line in _read_jsonl(output)}
+    assert sorted(lines) == sorted(
+        [PDFS_PATH + "traffic_docket.pdf", MJ_CRIMINAL, str(bad)]
+    )
+    assert lines[str(bad)]["Docket Number"] == ""
+    assert "Error" in lines[str(bad)]
+
+
+def test_parse_pdfminer_backend(tmp_path):  # noqa: D103
+    outputs = {}
+    for backend in ["pdfplumber", "pdfminer"]:
+        output = tmp_path / f"{backend}.jsonl"
+        argv = [MJ_CRIMINAL, "--backend", backend, "-q", "-o", str(output)]
+        assert cli.main(["parse"] + argv) == 0
+        outputs[backend] = _read_jsonl(output)
+    assert outputs["pdfminer"] == outputs["pdfplumber"]
+
+
+def test_parse_csv(tmp_path):  # noqa: D103
+    output = tmp_path / "tables"
+    argv = ["parse", MJ_CRIMINAL, "--format", "csv", "-q", "-o", str(output)]
+    assert cli.main(argv) == 0
+    dockets = (output / "dockets" / "part-00000.csv").read_text().splitlines()
+    assert dockets[0].split(",")[:3] == ["Docket Number", "Source", "Pages"]
+    assert dockets[1].startswith("MJ-49303-CR-0000002-2022,")
+
+
+def test_parse_resumes_from_checkpoint(tmp_path):  # noqa: D103
+    output = tmp_path / "dockets.jsonl"
+    resume = tmp_path / "run.checkpoint"
+    argv = ["-q", "-o", str(output), "--checkpoint", str(resume)]
+    assert cli.main(["parse", MJ_CRIMINAL] + argv) == 0
+    first = output.read_text()
+
+    # A crash after writing a docket but before checkpointing it
+    with open(output, "a") as f:
+        f.write('{"Docket Number": "MJ-')
+
+    assert cli.main(["parse", PDFS_PATH] + argv) == 0
+    text = output.read_text()
+    assert text.startswith(first)
+    lines = _read_jsonl(output)
+    assert sorted(line["Source"] for line in lines) == PDFS
+
+    # Everything is done
+    assert cli.main(["parse", PDFS_PATH] + argv) == 0
+    assert output.read_text() == text
+
+
+def test_parse_refuses_to_resume_lost_output(tmp_path):  # noqa: D103
+    output = tmp_path / "dockets.jsonl"
+    resume = tmp_path / "run.checkpoint"
+    argv = ["parse", MJ_CRIMINAL, "-q", "-o", str(output), "--checkpoint", str(resume)]
+    assert cli.main(argv) == 0
+    output.unlink()
+
+    with pytest.raises(SystemExit, match="Remove the checkpoint"):
+        cli.main(argv)
+    assert output.read_bytes() == b""  # Not padded out to the offset
+
+
+# Runs the CLI, killing the process at the nth checkpoint entry: after the
+# dockets it covers are written out but before they're checkpointed
+KILL_AT = """
+import os, sys
+from pollydocket import checkpoint, cli
+calls = [0]
+record = checkpoint.Checkpoint.record
+def killing(self, *args, **kwargs):
+    calls[0] += 1
+    if calls[0] == int(sys.argv[1]):
+        os._exit(1)
+    return record(self, *args, **kwargs)
+checkpoint.Checkpoint.record = killing
+sys.exit(cli.main(sys.argv[2:]))
+"""
+
+
+def _read_csv(directory, table):
+    rows = []
+    for part in sorted((directory / table).glob("part-*.csv")):
+        with open(part, newline="") as f:
+            rows += list(csv.DictReader(f))
+    return rows
+
+
+def test_parse_resumes_csv_after_kill(tmp_path):  # noqa: D103
+    output = tmp_path / "tables"
+    argv = ["parse", PDFS_PATH, "-j", "1", "-q", "--format", "csv"]
+    argv += ["--batch-size", "3", "-o", str(output)]
+    argv += ["--checkpoint", str(tmp_path / "run.checkpoint")]
+    root = path.dirname(path.dirname(path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    killed = subprocess.run([sys.executable, "-c", KILL_AT, "4"] + argv, env=env)
+    assert killed.returncode == 1
+    assert len(list((output / "dockets").glob("part-*.csv"))) == 2
+
+    assert cli.main(argv) == 0
+    sources = [row["Source"] for row in _read_csv(output, "dockets")]
+    assert sorted(sources) == PDFS
+    items = [
+        (row["Docket Number"], row["Item"])
+        for row in _read_csv(output, "status_information_items")
+    ]
+    assert len(items) == len(set(items)) > 0
+
+
+def test_throughput():  # noqa: D103
+    output = io.StringIO()
+    throughput = cli._Throughput(output, interval=0)
+    throughput.add(3)
+    throughput.add(2, failed=True)
+    throughput.finish()
+    lines = output.getvalue().splitlines()
+    assert len(lines) == 3
+    assert lines[-1].startswith("2 docs (1 failed), 5 pages in ")
+    throughput.add(4, cached=True)
+    throughput.finish()
+    assert output.getvalue().endswith("pages/s\n")
+    assert "3 docs (1 failed, 1 cached), 9 pages in " in output.getvalue()
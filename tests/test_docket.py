@@ -1,24 +1,33 @@
 # noqa: D100
+import mmap
+import pickle
+from contextlib import ExitStack
 from os import path
+from pathlib import Path
 
 import pdfplumber
 import pytest
 
-from pollydocket import docket
+from pollydocket import docket, words
 
+from .conftest import parse_or_error
 from .data import docket_output
 
 PDFS_PATH = f"{path.dirname(path.abspath(__file__))}/data/"
 
 
-@pytest.fixture
-def sections(request):  # noqa: D103
-    with pdfplumber.open(PDFS_PATH + request.param) as pdf:
-        pages = pdf.pages
+def _sections(pdf_name):
+    with pdfplumber.open(PDFS_PATH + pdf_name) as pdf:
+        pages = [words.extract_page(p) for p in pdf.pages]
         headings = docket._get_headings(pages)
         return docket._split_pages(pages, headings)
 
 
+@pytest.fixture
+def sections(request):  # noqa: D103
+    return _sections(request.param)
+
+
 @pytest.mark.parametrize("test_in,expected_out", docket_output.dicts)
 def test_parse_pdf(test_in, expected_out):  # noqa: D103
     test_docket = docket.parse_pdf(PDFS_PATH + test_in)
@@ -28,7 +37,7 @@ def test_parse_pdf(test_in, expected_out):  # noqa: D103
 @pytest.mark.parametrize("test_in,expected_out", docket_output.headings)
 def test_get_headings(test_in, expected_out):  # noqa: D103
     with pdfplumber.open(PDFS_PATH + test_in) as pdf:
-        headings = docket._get_headings(pdf.pages)
+        headings = docket._get_headings([words.extract_page(p) for p in pdf.pages])
         test_result = []
         for page in headings:
             test_result.append([h["text"] for h in page])
@@ -118,3 +127,277 @@ def test_parse_docket_entry_info(sections, expected_out):  # noqa: D103
     else:
         res = docket._parse_docket_entry_info(sections["Docket Entry Information"])
         assert res == expected_out["Docket Entry Information"]
+
+
+def _open_as(kind, pdf_path, stack):
+    if kind == "path":
+        return Path(pdf_path)
+    f = stack.enter_context(open(pdf_path, "rb"))
+    if kind == "file":
+        return f
+    if kind == "mmap":
+        return stack.enter_context(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    data = f.read()
+    return {
+        "bytes": data,
+        "bytearray": bytearray(data),
+        "memoryview": memoryview(data),
+    }[kind]
+
+
+@pytest.mark.parametrize("backend", docket.BACKENDS)
+@pytest.mark.parametrize(
+    "kind", ["path", "file", "mmap", "bytes", "bytearray", "memoryview"]
+)
+def test_parse_pdf_sources(kind, backend):  # noqa: D103
+    pdf_path = PDFS_PATH + "mj_criminal_docket.pdf"
+    expected = docket.parse_pdf(pdf_path)
+    with ExitStack() as stack:
+        pdf = _open_as(kind, pdf_path, stack)
+        assert docket.parse_pdf(pdf, backend=backend) == expected
+
+
+@pytest.mark.parametrize(
+    "pdf_name", sorted(p.name for p in Path(PDFS_PATH).glob("*.pdf"))
+)
+def test_backends_agree(pdf_name):  # noqa: D103
+    pdf = PDFS_PATH + pdf_name
+    minered, plumbed = (parse_or_error(pdf, b) for b in ("pdfminer", "pdfplumber"))
+    if isinstance(plumbed, Exception):
+        assert repr(minered) == repr(plumbed)
+    else:
+        assert minered == plumbed
+
+
+def test_stream_pdf_pdfminer():  # noqa: D103
+    pdf = PDFS_PATH + "mj_criminal_docket.pdf"
+    expected = list(docket.stream_pdf(pdf))
+    assert list(docket.stream_pdf(pdf, backend="pdfminer")) == expected
+
+
+def test_unknown_backend():  # noqa: D103
+    with pytest.raises(ValueError):
+        docket.parse_pdf(PDFS_PATH + "mj_criminal_docket.pdf", backend="poppler")
+
+
+@pytest.mark.parametrize(
+    "pdf_name", ["mj_criminal_docket.pdf", "non_traffic_docket.pdf"]
+)
+def test_stream_pdf(pdf_name, monkeypatch):  # noqa: D103
+    flushed = []
+    flush_cache = pdfplumber.page.Page.flush_cache
+
+    def spy(self, *args, **kwargs):
+        flushed.append(self.page_number)
+        flush_cache(self, *args, **kwargs)
+
+    monkeypatch.setattr(pdfplumber.page.Page, "flush_cache", spy)
+    sections = _sections(pdf_name)
+    known = [s for s in sections if s in docket.PARSERS]
+    streamed = dict(docket.stream_pdf(PDFS_PATH + pdf_name, sections=known))
+    assert streamed == {s: docket.PARSERS[s](sections[s]) for s in known}
+    assert flushed == [1, 2]
+
+
+def test_parse_pdf_lazy():  # noqa: D103
+    res = docket.parse_pdf(PDFS_PATH + "mj_criminal_docket.pdf")
+    assert res.unparsed == list(res)
+
+    bail = res["Bail"]
+    assert "Bail" not in res.unparsed
+    assert res["Bail"] is bail
+
+    assert "Charges" in res and "Nope" not in res
+    assert "Charges" in res.unparsed
+
+    copy = pickle.loads(pickle.dumps(res))
+    assert copy.unparsed == []
+    assert copy == res
+
+
+def test_parse_pdf_section_errors_repeat():  # noqa: D103
+    def fail(page):
+        raise ValueError("bad section")
+
+    res = docket.ParsedDocket(pending={"Bail": (fail, None)})
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            res["Bail"]
+    assert res.unparsed == ["Bail"] and len(res) == 1
+    with pytest.raises(ValueError):
+        res.to_dict()
+
+
+@pytest.mark.parametrize("test_in,expected_out", docket_output.dicts)
+def test_parse_pdf_sections(test_in, expected_out):  # noqa: D103
+    res = docket.parse_pdf(PDFS_PATH + test_in, sections=["Case Information"])
+    assert list(res) == ["Case Information"]
+    assert res["Case Information"] == docket._parse_case_info(
+        _sections(test_in)["Case Information"]
+    )
+
+
+def _synthetic_status_section(rows):
+    def word(text, x0, x1, bottom):
+        return {"text": text, "x0": x0, "x1": x1, "top": bottom - 8, "bottom": bottom}
+
+    section_words = [
+        word("Status Date", 50, 100, 10),
+        word("Processing Status", 200, 280, 10),
+    ]
+    for r in range(rows):
+        bottom = 22 + 12 * r
+        section_words += [
+            word(f"{r:05}", 50, 90, bottom),
+            word(f"Status {r}", 200, 260, bottom),
+            word(f"Key {r}:", 400, 430, bottom),
+            word(f"Value {r}", 435, 470, bottom),
+        ]
+    return words.Crop.from_words((0, 0, 612, 22 + 12 * rows), section_words)
+
+
+class _CountedColumn(list):
+    """Column of a `words.WordTable` that counts reads of its values."""
+
+    def __init__(self, values, reads):
+        super().__init__(values)
+        self.reads = reads
+
+    def __getitem__(self, i):  # noqa: D105
+        self.reads[0] += 1
+        return super().__getitem__(i)
+
+    def __iter__(self):  # noqa: D105
+        self.reads[0] += len(self)
+        return super().__iter__()
+
+
+def test_parse_col_with_headers_sect_scaling():  # noqa: D103
+    def word_reads(rows):
+        section = _synthetic_status_section(rows)
+        reads = [0]
+        t = section.table
+        for column in ("text", "x0", "x1", "top", "bottom", "doctop"):
+            setattr(t, column, _CountedColumn(getattr(t, column), reads))
+        res = docket._parse_status_info(section)
+        assert len(res["Items"]) == rows
+        assert res[f"Key {rows - 1}"] == f"Value {rows - 1}"
+        return reads[0]
+
+    # 4x the words; quadratic behaviour would read ~16x as many values
+    small, large = word_reads(2500), word_reads(10000)
+    assert large < 5 * small
+
+
+def test_parse_col_with_headers_sect_leaves_words():  # noqa: D103
+    section = _synthetic_status_section(3)
+    before = [dict(w) for w in section.words]
+    docket._parse_status_info(section)
+    assert section.words == before
+
+
+def test_parse_col_with_headers_sect_empty_cells():  # noqa: D103
+    section = words.Crop.from_words(
+        (0, 0, 612, 60),
+        [
+            {"text": "Date", "x0": 50, "x1": 80, "top": 2, "bottom": 10},
+            {"text": "Status", "x0": 200, "x1": 240, "top": 2, "bottom": 10},
+            {"text": "01/01", "x0": 50, "x1": 80, "top": 14, "bottom": 22},
+            {"text": "Active", "x0": 200, "x1": 240, "top": 26, "bottom": 34},
+            {"text": "01/03", "x0": 50, "x1": 80, "top": 38, "bottom": 46},
+            {"text": "Closed", "x0": 200, "x1": 240, "top": 38, "bottom": 46},
+        ],
+    )
+    res = docket._parse_col_with_headers_sect(section, ["Date", "Status"])
+    assert res["Items"] == [
+        {"Date": "01/01", "Status": ""},
+        {"Date": "", "Status": "Active"},
+        {"Date": "01/03", "Status": "Closed"},
+    ]
+
+
+def test_split_pages_merges_continued_sections():  # noqa: D103
+    sections = _sections("cp_criminal_docket.pdf")
+    with pdfplumber.open(PDFS_PATH + "cp_criminal_docket.pdf") as pdf:
+        pages = [words.extract_page(p) for p in pdf.pages]
+    headings = docket._get_headings(pages)
+    entries = [
+        crop
+        for page, page_headings in zip(pages, headings)
+        for sect, crop in docket._split_page(page, page_headings)
+        if sect == "Entries"
+    ]
+    assert len(entries) == 2
+    assert sections["Entries"].extract_text() == "\n".join(
+        e.extract_text() for e in entries
+    )
+
+
+def test_parse_col_with_headers_sect_continued():  # noqa: D103
+    def page(top, rows):
+        return words.Crop.from_words(
+            (0, top, 612, top + 40),
+            [
+                {"text": t, "x0": x, "x1": x + 30, "top": b - 8, "bottom": b}
+                for b, row in zip(range(top + 10, top + 40, 12), rows)
+                for x, t in zip((50, 200), row)
+            ],
+        )
+
+    section = words.stack(
+        [
+            page(0, [("Date", "Status"), ("01/01", "Active")]),
+            page(792, [("Date", "Status"), ("01/02", "Closed")]),
+        ]
+    )
+    res = docket._parse_col_with_headers_sect(section, ["Date", "Status"])
+    assert res["Items"] == [
+        {"Date": "01/01", "Status": "Active"},
+        {"Date": "01/02", "Status": "Closed"},
+    ]
+
+
+@pytest.mark.parametrize(
+    "pdf_name,expected",
+    [
+        (
+            "civil_docket.pdf",
+            {
+                "Docket Number": "MJ-49302-CV-0000005-2022",
+                "Docket Type": "Civil",
+                "Court": "Magisterial District Judge 49-3-02",
+                "County": "Centre",
+            },
+        ),
+        (
+            "cp_criminal_docket.pdf",
+            {
+                "Docket Number": "CP-14-CR-0000026-2022",
+                "Docket Type": "Criminal",
+                "Court": "Court of Common Pleas",
+                "County": "Centre",
+            },
+        ),
+        (
+            "eviction_docket.pdf",
+            {
+                "Docket Number": "MJ-49302-LT-0000002-2022",
+                "Docket Type": "Landlord/Tenant",
+                "Court": "Magisterial District Judge 49-3-02",
+                "County": "Centre",
+            },
+        ),
+        (
+            "non_traffic_docket.pdf",
+            {
+                "Docket Number": "MJ-49305-NT-0000014-2022",
+                "Docket Type": "Non-Traffic",
+                "Court": "Magisterial District Judge 49-3-05",
+                "County": "Centre",
+            },
+        ),
+    ],
+)
+def test_peek(pdf_name, expected):  # noqa: D103
+    assert docket.peek(PDFS_PATH + pdf_name) == expected
+    assert docket.peek(Path(PDFS_PATH + pdf_name).read_bytes()) == expected
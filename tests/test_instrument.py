@@ -0,0 +1,64 @@
+# noqa: D100
+from os import path
+
+from pollydocket import docket, instrument
+
+PDFS_PATH = f"{path.dirname(path.abspath(__file__))}/data/"
+
+
+def test_no_observers():  # noqa: D103
+    stage = instrument.stage("open")
+    assert not stage
+    assert stage is instrument.stage("split")
+
+
+def test_events():  # noqa: D103
+    events = []
+    with instrument.observe(events.append):
+        result = docket.parse_pdf(PDFS_PATH + "mj_criminal_docket.pdf")
+        result["Status Information"]
+
+    assert [(e.stage, e.phase) for e in events[:6]] == [
+        ("open", "start"),
+        ("open", "end"),
+        ("headings", "start"),
+        ("headings", "end"),
+        ("split", "start"),
+        ("split", "end"),
+    ]
+    assert events[1].counts["pages"] == 2 and events[1].counts["words"] > 0
+    assert all(e.docket_type == "MJ-CR" for e in events[1:])
+
+    parse = [e for e in events if e.stage == "parse"]
+    assert [(e.phase, e.section) for e in parse] == [
+        ("start", "Status Information"),
+        ("end", "Status Information"),
+    ]
+    assert parse[1].counts["rows"] == len(result["Status Information"]["Items"])
+    assert parse[1].duration >= 0
+
+    events.clear()
+    docket.parse_pdf(PDFS_PATH + "mj_criminal_docket.pdf").to_dict()
+    assert events == []
+
+
+def test_aggregator():  # noqa: D103
+    metrics = instrument.Aggregator()
+    with instrument.observe(metrics):
+        for _ in range(2):
+            docket.parse_pdf(PDFS_PATH + "mj_criminal_docket.pdf").to_dict()
+
+    totals = {(t["stage"], t["section"]): t for t in metrics.totals()}
+    assert totals["open", ""]["count"] == 2
+    assert totals["parse", "Case Information"]["docket_type"] == "MJ-CR"
+
+    text = metrics.to_prometheus()
+    assert (
+        'pollydocket_stage_seconds_count{stage="open",section="",docket_type="MJ-CR"} 2'
+        in text
+    )
+    assert (
+        'pollydocket_stage_items_total{stage="open",section="",docket_type="MJ-CR",'
+        'item="pages"} 4' in text
+    )
+    assert len(metrics.to_json_lines().splitlines()) == len(totals)
@@ -0,0 +1,169 @@
+# noqa: D100
+import asyncio
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from os import path
+
+import pytest
+
+from pollydocket.pipeline import Pipeline
+from pollydocket.search import Portal
+from pollydocket.throttle import RateLimiter
+
+from .conftest import parse_or_error, run
+from .portal import Portal as StandIn
+
+PDFS_PATH = f"{path.dirname(path.abspath(__file__))}/data/"
+PDFS = sorted(glob(PDFS_PATH + "*.pdf"))
+MJ_CRIMINAL = PDFS_PATH + "mj_criminal_docket.pdf"
+
+
+async def _read(pdf):
+    await asyncio.sleep(0)
+    with open(pdf, "rb") as f:
+        return f.read()
+
+
+def _check(results):
+    assert sorted(results) == PDFS
+    for pdf, result in results.items():
+        expected = parse_or_error(pdf)
+        if isinstance(expected, Exception):
+            assert type(result) is type(expected)
+        else:
+            assert result == expected
+
+
+def test_pipeline():  # noqa: D103
+    results = {}
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        pipeline = Pipeline(_read, results.__setitem__, parsers=2, executor=executor)
+        stats = run(pipeline.run(PDFS))
+
+    _check(results)
+    assert stats.fetched == len(PDFS)
+    assert stats.parsed + stats.failed == stats.done == len(PDFS)
+    assert stats.fetching == stats.parsing == stats.to_parse == stats.to_sink == 0
+
+
+def test_pipeline_process_pool():  # noqa: D103
+    results = {}
+    pipeline = Pipeline(_read, results.__setitem__, parsers=2)
+    run(pipeline.run(iter(PDFS)))
+    _check(results)
+
+
+def test_pipeline_backpressure():  # noqa: D103
+    sunk = []
+    fetched_ahead = []
+
+    async def slow_sink(pdf, result):
+        await asyncio.sleep(0.01)
+        sunk.append(pdf)
+        stats = pipeline.stats()
+        fetched_ahead.append(stats.fetched - stats.done)
+
+    pdfs = [MJ_CRIMINAL] * 10
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pipeline = Pipeline(
+            _read, slow_sink, fetchers=2, parsers=1, queue_size=2, executor=executor
+        )
+        stats = run(pipeline.run(pdfs))
+
+    assert len(sunk) == len(pdfs)
+    assert stats.max_to_parse <= 2
+    assert stats.max_to_sink <= 2
+    # Fetched but unsunk: a full parse queue, a parse, a full sink queue and
+    # the result being sunk
+    assert max(fetched_ahead) <= 2 + 1 + 2 + 1
+
+
+def test_pipeline_fetch_errors():  # noqa: D103
+    results = {}
+
+    async def fetch(pdf):
+        if pdf == "missing":
+            raise FileNotFoundError(pdf)
+        return await _read(pdf)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pipeline = Pipeline(fetch, results.__setitem__, executor=executor)
+        stats = run(pipeline.run(["missing", MJ_CRIMINAL]))
+
+    assert isinstance(results["missing"], FileNotFoundError)
+    assert results[MJ_CRIMINAL] == parse_or_error(MJ_CRIMINAL)
+    assert (stats.fetched, stats.parsed, stats.failed) == (1, 1, 1)
+
+
+def test_pipeline_stop_drains():  # noqa: D103
+    sunk = []
+
+    def sink(pdf, result):
+        sunk.append(pdf)
+        pipeline.stop()
+
+    async def forever():
+        while True:
+            for pdf in PDFS:
+                yield pdf
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pipeline = Pipeline(_read, sink, fetchers=1, parsers=1, executor=executor)
+        stats = run(asyncio.wait_for(pipeline.run(forever()), 30))
+
+    # Whatever was taken before stopping still reaches the sink
+    assert stats.done == len(sunk) == stats.fetched
+    assert stats.fetching == stats.parsing == 0
+
+
+def test_pipeline_sink_errors_stop_it():  # noqa: D103
+    def sink(pdf, result):
+        raise RuntimeError("disk full")
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pipeline = Pipeline(_read, sink, executor=executor)
+        with pytest.raises(RuntimeError):
+            run(pipeline.run(PDFS))
+
+
+def test_pipeline_from_portal():  # noqa: D103
+    results = {}
+
+    async def download_and_parse(url, executor):
+        limiter = RateLimiter(rate=100, max_rate=100)
+        async with Portal(url, limiter=limiter) as portal:
+            found = await portal.search(
+                datetime.date(2022, 1, 10), datetime.date(2022, 1, 12)
+            )
+            pipeline = Pipeline(
+                lambda r: portal.fetch(r.docket_url),
+                lambda r, res: results.__setitem__(r.docket_number, res),
+                executor=executor,
+            )
+            return await pipeline.run(found)
+
+    with StandIn() as stand_in, ThreadPoolExecutor(max_workers=2) as executor:
+        stats = run(download_and_parse(stand_in.url, executor))
+        for case in stand_in.cases:
+            expected = parse_or_error(case.pdf)
+            if isinstance(expected, Exception):
+                assert type(results[case.docket_number]) is type(expected)
+            else:
+                assert results[case.docket_number] == expected
+
+    assert stats.done == len(stand_in.cases)
+
+
+def test_pipeline_skips():  # noqa: D103
+    results = {}
+
+    async def fetch(pdf):
+        return None if pdf != MJ_CRIMINAL else await _read(pdf)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pipeline = Pipeline(fetch, results.__setitem__, executor=executor)
+        stats = run(pipeline.run(PDFS))
+
+    assert list(results) == [MJ_CRIMINAL]
+    assert (stats.skipped, stats.fetched, stats.done) == (len(PDFS) - 1, 1, 1)
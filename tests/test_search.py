@@ -0,0 +1,327 @@
+# noqa: D100
+import asyncio
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pollydocket import docket
+from pollydocket.http import Client, HTTPError, ResponseTooLarge
+from pollydocket.search import COUNTIES, Portal, Query, TruncatedSearchWarning
+from pollydocket.throttle import RateLimiter
+
+from .conftest import run
+from .portal import Case
+from .portal import Portal as StandIn
+
+JAN_10 = datetime.date(2022, 1, 10)
+JAN_12 = datetime.date(2022, 1, 12)
+
+
+def _cases():
+    """Cases filed through January 2022, crowded on the 17th in Centre."""
+    pdf = ""  # Never downloaded
+    cases = []
+    for n in range(60):
+        day = datetime.date(2022, 1, 1 + n % 31)
+        county = COUNTIES[n % 5]
+        prefix = "MJ-49302" if n % 2 else "CP-14"
+        number = f"{prefix}-CR-{n:07}-2022"
+        cases.append(Case(number, "Criminal", day, county, "", pdf))
+    for n in range(12):
+        day = datetime.date(2022, 1, 17)
+        prefix = "MJ-49302" if n % 2 else "CP-14"
+        number = f"{prefix}-CV-{n:07}-2022"
+        cases.append(Case(number, "Civil", day, "Centre", "", pdf))
+    return cases
+
+
+def test_client_keep_alive(stand_in):  # noqa: D103
+    async def fetch_all():
+        async with Client(max_connections=2) as client:
+            responses = await asyncio.gather(
+                *(client.get(stand_in.url + "/CaseSearch") for _ in range(10))
+            )
+            return responses, client.connections_opened
+
+    responses, opened = run(fetch_all())
+    assert all(r.status == 200 for r in responses)
+    assert opened <= 2
+    assert stand_in.connections == opened
+
+
+def test_client_errors(stand_in):  # noqa: D103
+    async def get_missing():
+        async with Client() as client:
+            response = await client.get(stand_in.url + "/missing")
+            response.raise_for_status()
+
+    with pytest.raises(HTTPError):
+        run(get_missing())
+
+
+async def _serve(responses, requests):
+    """Server answering a request per connection with the next of `responses`."""
+    replies = iter(responses)
+
+    async def handle(reader, writer):
+        head = await reader.readuntil(b"\r\n\r\n")
+        requests.append(head.decode("latin-1"))
+        writer.write(next(replies))
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def test_client_cookies_per_host():  # noqa: D103
+    async def redirect_elsewhere():
+        elsewhere = []
+        other, other_port = await _serve(
+            [b"HTTP/1.1 204 OK\r\nConnection: close\r\n\r\n"], elsewhere
+        )
+        redirect = (
+            "HTTP/1.1 302 Found\r\nConnection: close\r\nSet-Cookie: session=secret\r\n"
+            f"Location: http://localhost:{other_port}/\r\nContent-Length: 0\r\n\r\n"
+        )
+        here = []
+        server, port = await _serve(
+            [redirect.encode(), b"HTTP/1.1 204 OK\r\nConnection: close\r\n\r\n"], here
+        )
+        async with Client() as client:
+            await client.get(f"http://127.0.0.1:{port}/")
+            await client.get(f"http://127.0.0.1:{port}/")
+        server.close()
+        other.close()
+        return here, elsewhere
+
+    here, elsewhere = run(redirect_elsewhere())
+    assert "Cookie" not in elsewhere[0]
+    assert "Cookie: session=secret" in here[1]
+
+
+@pytest.mark.parametrize("method,retried", [("GET", True), ("POST", False)])
+def test_client_retries_stale_connections(method, retried):  # noqa: D103
+    requests = []
+
+    # Answers the first request on each connection, then closes the
+    # connection on the next as if it had timed out just as it arrived
+    async def handle(reader, writer):
+        for answer in (True, False):
+            requests.append(await reader.readuntil(b"\r\n\r\n"))
+            if answer:
+                writer.write(b"HTTP/1.1 204 OK\r\n\r\n")
+                await writer.drain()
+        writer.close()
+
+    async def send_twice():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/"
+        try:
+            async with Client() as client:
+                await client.request(method, url)
+                return await client.request(method, url)
+        finally:
+            server.close()
+
+    if retried:
+        assert run(send_twice()).status == 204
+        assert len(requests) == 3
+    else:
+        with pytest.raises((ConnectionError, asyncio.IncompleteReadError)):
+            run(send_twice())
+        assert len(requests) == 2
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        b"HTTP/1.1 200 OK\r\nContent-Length: 101\r\n\r\n",
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+        + (b"32\r\n" + b"x" * 50 + b"\r\n") * 3,
+        b"HTTP/1.1 200 OK\r\nConnection: close\r\n\r\n" + b"x" * 101,
+    ],
+)
+def test_client_max_response_size(response):  # noqa: D103
+    async def get_large():
+        server, port = await _serve([response], [])
+        try:
+            async with Client(max_response_size=100) as client:
+                await client.get(f"http://127.0.0.1:{port}/")
+        finally:
+            server.close()
+
+    with pytest.raises(ResponseTooLarge):
+        run(get_large())
+
+
+def test_search(stand_in):  # noqa: D103
+    async def search():
+        async with Portal(stand_in.url) as portal:
+            everything = await portal.search(JAN_10, JAN_12)
+            civil = await portal.search(JAN_10, JAN_10, docket_type="Civil")
+            elsewhere = await portal.search(JAN_10, JAN_12, county="Allegheny")
+            return everything, civil, elsewhere
+
+    everything, civil, elsewhere = run(search())
+    assert sorted(r.docket_number for r in everything) == sorted(
+        c.docket_number for c in stand_in.cases
+    )
+    assert [r.docket_number for r in civil] == ["MJ-49302-CV-0000005-2022"]
+    assert civil[0].fields["Filing Date"] == "01/10/2022"
+    assert civil[0].fields["County"] == "Centre"
+    assert civil[0].docket_url.startswith(stand_in.url + "/Report/MdjDocketSheet?")
+    assert elsewhere == []
+
+
+def test_search_refreshes_token(stand_in):  # noqa: D103
+    async def search_twice():
+        async with Portal(stand_in.url) as portal:
+            first = await portal.search(JAN_10, JAN_12)
+            stand_in.rotate_token()
+            return first, await portal.search(JAN_10, JAN_12)
+
+    first, second = run(search_twice())
+    assert first == second
+    assert len(stand_in.searches) == 2
+
+
+def test_dockets(stand_in):  # noqa: D103
+    async def download_and_parse(executor):
+        async with Portal(stand_in.url, concurrency=3) as portal:
+            results = await portal.search(JAN_10, JAN_12)
+            parsed = [res async for res in portal.dockets(results, executor)]
+            return parsed, portal.client.connections_opened
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        parsed, opened = run(download_and_parse(executor))
+
+    by_number = {result.docket_number: res for result, res in parsed}
+    assert len(by_number) == len(stand_in.cases)
+    assert sorted(stand_in.downloads) == sorted(by_number)
+    assert opened <= 3
+    for case in stand_in.cases:
+        res = by_number[case.docket_number]
+        try:
+            expected = docket.parse_pdf(case.pdf)
+        except Exception as e:
+            assert type(res) is type(e)
+        else:
+            assert res == expected
+
+
+def test_dockets_download_errors(stand_in):  # noqa: D103
+    async def download_missing(executor):
+        async with Portal(stand_in.url) as portal:
+            results = await portal.search(JAN_10, JAN_10, docket_type="Civil")
+            missing = results[0]._replace(docket_url=stand_in.url + "/Report/x")
+            return [res async for res in portal.dockets([missing], executor)]
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        [(result, error)] = run(download_missing(executor))
+
+    assert result.docket_number == "MJ-49302-CV-0000005-2022"
+    assert isinstance(error, HTTPError)
+    assert error.response.status == 404
+
+
+def test_dockets_identical_downloads(stand_in):  # noqa: D103
+    # Empty downloads are all the same object
+    async def download_empty(executor):
+        async with Portal(stand_in.url) as portal:
+            results = await portal.search(JAN_10, JAN_12)
+
+            async def fetch(url):
+                await asyncio.sleep(0.01)
+                return b""
+
+            portal.fetch = fetch
+            return results, [res async for res in portal.dockets(results, executor)]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results, parsed = run(download_empty(executor))
+
+    assert sorted(r.docket_number for r, _ in parsed) == sorted(
+        r.docket_number for r in results
+    )
+    assert all(isinstance(res, Exception) for _, res in parsed)
+
+
+def test_query_split():  # noqa: D103
+    month = Query(datetime.date(2022, 1, 1), datetime.date(2022, 1, 31), "Centre")
+    first, second = month.split()
+    assert first.filed_end == datetime.date(2022, 1, 16)
+    assert second.filed_start == datetime.date(2022, 1, 17)
+    assert (first.filed_start, second.filed_end) == (
+        month.filed_start,
+        month.filed_end,
+    )
+    assert second.county == "Centre"
+
+    day = Query(JAN_10, JAN_10)
+    by_court = day.split()
+    assert {q.court_type for q in by_court} == {"Appellate", "CP", "MDJ", "PAC"}
+    assert [q.county for q in by_court[0].split()] == list(COUNTIES)
+    assert by_court[0]._replace(county="Centre").split() == []
+    assert day._replace(court_office="MDJ-49-3-02").split() == []
+
+
+def test_search_all_splits_truncated_searches():  # noqa: D103
+    cases = _cases()
+
+    async def search(url):
+        limiter = RateLimiter(rate=500, max_rate=500, concurrency=8)
+        async with Portal(url, max_results=10, limiter=limiter) as portal:
+            return await portal.search_all(
+                datetime.date(2022, 1, 1), datetime.date(2022, 1, 31)
+            )
+
+    with StandIn(cases, max_results=10) as stand_in:
+        results = run(search(stand_in.url))
+
+    assert sorted(r.docket_number for r in results) == sorted(
+        c.docket_number for c in cases
+    )
+    # Halving a month takes at most 2 * 31 searches; the crowded day adds a
+    # search per court type and then per county
+    assert len(stand_in.searches) < 2 * 31 + 4 + len(COUNTIES)
+
+
+def test_search_all_warns_when_it_cant_split():  # noqa: D103
+    cases = _cases()
+
+    async def search(url):
+        async with Portal(url, max_results=3) as portal:
+            return await portal.search_all(
+                datetime.date(2022, 1, 17),
+                datetime.date(2022, 1, 17),
+                county="Centre",
+                court_type="MDJ",
+            )
+
+    with StandIn(cases, max_results=3) as stand_in:
+        with pytest.warns(TruncatedSearchWarning):
+            results = run(search(stand_in.url))
+
+    assert len(results) == 3
+
+
+def test_throttled_requests_are_retried(stand_in):  # noqa: D103
+    limiter = RateLimiter(rate=20, max_rate=20)
+
+    async def search_and_fetch():
+        async with Portal(stand_in.url, limiter=limiter) as searches:
+            async with Portal(stand_in.url, limiter=limiter) as downloads:
+                stand_in.fail_next(429, 503)
+                results = await searches.search(JAN_10, JAN_10, docket_type="Civil")
+                stand_in.fail_next(429)
+                return await downloads.fetch(results[0].docket_url)
+
+    pdf = run(search_and_fetch())
+    assert pdf.startswith(b"%PDF")
+    stats = limiter.stats()
+    assert stats.requests == 6  # Token page, 2 + 1 searches and 1 + 1 downloads
+    assert stats.throttled == 3
+    assert stats.backoffs == 3
+    assert stats.rate < 20
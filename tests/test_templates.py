@@ -0,0 +1,79 @@
+# noqa: D100
+import pytest
+
+from pollydocket import docket, templates, words
+
+
+@pytest.fixture(autouse=True)
+def no_templates():  # noqa: D103
+    templates.TEMPLATES.clear()
+    yield
+    templates.TEMPLATES.clear()
+
+
+def _section(shift=0.0, size=9.0):
+    def word(text, x0, x1, bottom):
+        return {
+            "text": text,
+            "x0": x0 + shift,
+            "x1": x1 + shift,
+            "top": bottom - 8,
+            "bottom": bottom,
+            "size": size,
+        }
+
+    return words.Crop.from_words(
+        (0, 0, 612, 60),
+        [
+            word("Status Date", 50, 100, 10),
+            word("Processing Status", 200, 280, 10),
+            word("01/01/2022", 50, 90, 22),
+            word("Active", 200, 230, 22),
+            word("Key:", 400, 420, 22),
+            word("Value", 425, 450, 22),
+            word("01/02/2022", 50, 90, 34),
+            word("Closed", 200, 230, 34),
+        ],
+    )
+
+
+def _fail_search(monkeypatch):
+    def fail(*args):
+        raise AssertionError("searched for headers")
+
+    monkeypatch.setattr(docket, "_get_columns", fail)
+
+
+def test_template_learned_and_used(monkeypatch):  # noqa: D103
+    expected = docket._parse_status_info(_section())
+    assert len(templates.TEMPLATES) == 0
+
+    assert docket._parse_status_info(_section(), docket_type="MJ-CR") == expected
+    template = templates.TEMPLATES.get(("MJ-CR", "Status Information"))
+    assert template.headers == ("Status Date", "Processing Status")
+    assert template.x0 == (50, 200)
+
+    _fail_search(monkeypatch)
+    assert docket._parse_status_info(_section(), docket_type="MJ-CR") == expected
+
+
+@pytest.mark.parametrize("kwargs", [{"shift": 5.0}, {"size": 10.0}])
+def test_template_mismatch_falls_back(kwargs):  # noqa: D103
+    docket._parse_status_info(_section(), docket_type="MJ-CR")
+    section = _section(**kwargs)
+    template = templates.TEMPLATES.get(("MJ-CR", "Status Information"))
+    assert template.columns(section) is None
+
+    expected = docket._parse_status_info(section)
+    assert docket._parse_status_info(section, docket_type="MJ-CR") == expected
+    relearned = templates.TEMPLATES.get(("MJ-CR", "Status Information"))
+    assert relearned.columns(section) is not None
+
+
+def test_templates_by_docket_type(monkeypatch):  # noqa: D103
+    docket._parse_status_info(_section(), docket_type="MJ-CR")
+    docket._parse_status_info(_section(shift=5.0), docket_type="CP-CR")
+    assert len(templates.TEMPLATES) == 2
+
+    _fail_search(monkeypatch)
+    docket._parse_status_info(_section(shift=5.0), docket_type="CP-CR")
@@ -0,0 +1,125 @@
+# noqa: D100
+import asyncio
+import time
+
+import pytest
+
+from pollydocket.throttle import RateLimiter
+
+from .conftest import run
+
+
+async def _send(limiter, status=200, seconds=0.0, in_flight=None):
+    async with limiter.request() as req:
+        if in_flight is not None:
+            in_flight.append(limiter.in_flight)
+        await asyncio.sleep(seconds)
+        req.status = status
+
+
+def test_rate():  # noqa: D103
+    limiter = RateLimiter(rate=20, max_rate=20, concurrency=4, burst=1)
+
+    async def send_many():
+        start = time.monotonic()
+        await asyncio.gather(*(_send(limiter) for _ in range(10)))
+        return time.monotonic() - start
+
+    # The first token is there at the start; the other nine take 1/20 s each
+    assert run(send_many()) >= 9 / 20 * 0.9
+    assert limiter.stats().requests == 10
+
+
+def test_concurrency():  # noqa: D103
+    limiter = RateLimiter(rate=1000, max_rate=1000, concurrency=3, max_concurrency=3)
+    in_flight = []
+
+    async def send_many():
+        await asyncio.gather(
+            *(_send(limiter, seconds=0.01, in_flight=in_flight) for _ in range(12))
+        )
+
+    run(send_many())
+    assert max(in_flight) == 3
+    assert limiter.in_flight == 0
+
+
+def test_additive_increase():  # noqa: D103
+    limiter = RateLimiter(rate=9, concurrency=2, max_rate=9.5, max_concurrency=3)
+
+    async def send_many():
+        for _ in range(8):
+            await _send(limiter)
+
+    run(send_many())
+    stats = limiter.stats()
+    assert stats.rate == 9.5
+    assert stats.concurrency == 3
+    assert stats.backoffs == 0
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_multiplicative_decrease(status):  # noqa: D103
+    limiter = RateLimiter(rate=40, max_rate=40, concurrency=8, max_concurrency=8)
+
+    async def overload():
+        # Requests in flight together only back off once
+        await asyncio.gather(*(_send(limiter, status) for _ in range(4)))
+
+    run(overload())
+    stats = limiter.stats()
+    assert (stats.rate, stats.concurrency) == (20, 4)
+    assert (stats.throttled, stats.backoffs) == (4, 1)
+
+
+def test_slow_responses_and_errors_back_off():  # noqa: D103
+    limiter = RateLimiter(rate=40, max_rate=40, latency_target=0.01, min_rate=15)
+
+    async def slow_then_failing():
+        await _send(limiter, seconds=0.02)
+        with pytest.raises(ConnectionError):
+            async with limiter.request():
+                raise ConnectionError()
+
+    run(slow_then_failing())
+    stats = limiter.stats()
+    assert stats.rate == 15
+    assert stats.backoffs == 2
+    assert stats.in_flight == 0
+
+
+def test_retry_after_pauses():  # noqa: D103
+    limiter = RateLimiter(rate=1000, max_rate=1000)
+
+    async def told_to_wait():
+        async with limiter.request() as req:
+            req.retry_after = 0.2
+        start = time.monotonic()
+        await _send(limiter)
+        return time.monotonic() - start
+
+    assert run(told_to_wait()) >= 0.15
+
+
+def test_cancelled_requests_free_their_turn():  # noqa: D103
+    limiter = RateLimiter(rate=1000, max_rate=1000, concurrency=1)
+
+    async def cancel():
+        task = asyncio.ensure_future(_send(limiter, seconds=10))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.wait_for(_send(limiter), 1)
+
+    run(cancel())
+    assert limiter.stats().backoffs == 0
+
+
+def test_bad_settings():  # noqa: D103
+    with pytest.raises(ValueError):
+        RateLimiter(backoff=1)
+    with pytest.raises(ValueError):
+        RateLimiter(rate=100, max_rate=50)
+    with pytest.raises(ValueError):
+        RateLimiter(concurrency=8, max_concurrency=4)
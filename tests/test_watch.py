@@ -0,0 +1,191 @@
+# noqa: D100
+import csv
+import datetime
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pollydocket import cli, watch, writers
+from pollydocket.search import Portal
+from pollydocket.throttle import RateLimiter
+
+from .conftest import run
+
+JAN_10 = datetime.date(2022, 1, 10)
+JAN_12 = datetime.date(2022, 1, 12)
+
+
+def _poll(url, state, sink, writer=None):
+    async def poll():
+        limiter = RateLimiter(rate=100, max_rate=100)
+        async with Portal(url, limiter=limiter) as portal:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                return await watch.poll(
+                    portal,
+                    state,
+                    JAN_10,
+                    JAN_12,
+                    sink,
+                    executor=executor,
+                    writer=writer,
+                )
+
+    return run(poll())
+
+
+def test_poll_only_downloads_changes(stand_in, tmp_path):  # noqa: D103
+    state = watch.CrawlState(tmp_path / "state.sqlite")
+    sunk = {}
+
+    def sink(result, parsed):
+        sunk[result.docket_number] = parsed
+
+    first = _poll(stand_in.url, state, sink)
+    cases = len(stand_in.cases)
+    assert (first.found, first.new, first.changed) == (cases, cases, 0)
+    assert first.downloaded == first.parsed + first.failed == cases
+    assert len(sunk) == len(state) == cases
+
+    # Nothing changed
+    sunk.clear()
+    second = _poll(stand_in.url, state, sink)
+    assert second == watch.PollStats(cases, 0, 0, 0, 0, 0)
+    assert sunk == {}
+
+    # Only its search result changed
+    stand_in.cases[0] = stand_in.cases[0]._replace(court_office="Moved")
+    third = _poll(stand_in.url, state, sink)
+    assert (third.changed, third.downloaded, third.parsed) == (1, 1, 0)
+    assert sunk == {}
+
+    # Its pdf changed too
+    mj_criminal = next(c for c in stand_in.cases if "49303-CR" in c.docket_number)
+    stand_in.cases[0] = stand_in.cases[0]._replace(
+        court_office="Moved again", pdf=mj_criminal.pdf
+    )
+    fourth = _poll(stand_in.url, state, sink)
+    assert (fourth.changed, fourth.downloaded, fourth.parsed) == (1, 1, 1)
+    assert list(sunk) == [stand_in.cases[0].docket_number]
+    tracked = state.get(stand_in.cases[0].docket_number)
+    assert tracked.last_entry_date == "2022-01-13"
+    assert tracked.last_changed is not None
+
+
+def test_poll_retries_failed_downloads(stand_in, tmp_path):  # noqa: D103
+    state = watch.CrawlState(tmp_path / "state.sqlite")
+    failed = []
+
+    def sink(result, parsed):
+        if isinstance(parsed, Exception):
+            failed.append(result.docket_number)
+
+    stand_in.cases = [stand_in.cases[0]._replace(pdf="")]  # Not found
+    first = _poll(stand_in.url, state, sink)
+    assert first.failed == 1
+    assert state.get(stand_in.cases[0].docket_number) is None
+
+    second = _poll(stand_in.url, state, sink)
+    assert (second.new, second.downloaded, second.failed) == (1, 0, 1)
+
+
+def test_poll_retries_dockets_the_sink_failed_on(stand_in, tmp_path):  # noqa: D103
+    state = watch.CrawlState(tmp_path / "state.sqlite")
+
+    def failing(result, parsed):
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        _poll(stand_in.url, state, failing)
+    assert all(state.get(c.docket_number) is None for c in stand_in.cases)
+
+    sunk = []
+    second = _poll(stand_in.url, state, lambda result, parsed: sunk.append(result))
+    assert second.new == second.downloaded == len(sunk) == len(stand_in.cases)
+
+
+def test_poll_retries_dockets_lost_before_a_flush(stand_in, tmp_path):  # noqa: D103
+    state = watch.CrawlState(tmp_path / "state.sqlite")
+    output = tmp_path / "tables"
+    cases = len(stand_in.cases)
+    assert cases % 3
+
+    writer = writers.CSVWriter(output, batch_size=3)
+    flush = writer.flush
+    sunk = []
+
+    def killed():
+        if len(sunk) == cases:  # The poll's last flush
+            raise OSError("killed")
+        flush()
+
+    writer.flush = killed
+    with pytest.raises(OSError):
+        _poll(stand_in.url, state, _writing(writer, sunk), writer)
+    # Only the dockets in full batches made it to disk, and only they are seen
+    assert len(state) == len(_numbers(output)) == cases - cases % 3
+
+    writer = writers.CSVWriter(output, batch_size=3)
+    second = _poll(stand_in.url, state, _writing(writer, []), writer)
+    assert second.downloaded == cases % 3
+    assert len(state) == cases
+    assert sorted(_numbers(output)) == sorted(c.docket_number for c in stand_in.cases)
+
+
+def _writing(writer, sunk):
+    def sink(result, parsed):
+        sunk.append(result)
+        writer.write(result.docket_number, parsed, extra=result.fields)
+
+    return sink
+
+
+def _numbers(output):
+    numbers = []
+    for part in output.glob("dockets/part-*.csv"):
+        with open(part, newline="") as f:
+            numbers += [row["Docket Number"] for row in csv.DictReader(f)]
+    return numbers
+
+
+def test_last_entry_date():  # noqa: D103
+    parsed = {
+        "Status Information": {
+            "Items": [{"Status Date": "01/13/2022"}, {"Status Date": "12/31/2021"}]
+        },
+        "Bail": {"Items": [{"Bail Action Date": "02/01/2022", "Amount": "$0.00"}]},
+        "Case Information": {"File Date": "03/01/2022"},
+    }
+    assert watch.last_entry_date(parsed) == "2022-02-01"
+    assert watch.last_entry_date({"Bail": {}}) is None
+
+
+def test_cli_watch_once(stand_in, tmp_path):  # noqa: D103
+    state = tmp_path / "state.sqlite"
+    output = tmp_path / "dockets.jsonl"
+    argv = [
+        "watch",
+        "--portal",
+        stand_in.url,
+        "--state",
+        str(state),
+        "--county",
+        "Centre",
+        "--days",
+        str((datetime.date.today() - JAN_10).days + 1),
+        "--once",
+        "-j",
+        "2",
+        "-o",
+        str(output),
+    ]
+    assert cli.main(argv) == 0
+    lines = [json.loads(line) for line in output.read_text().splitlines()]
+    assert sorted(line["Docket Number"] for line in lines) == sorted(
+        c.docket_number for c in stand_in.cases
+    )
+    assert all(("Docket" in line) != ("Error" in line) for line in lines)
+
+    # A second run remembers them
+    assert cli.main(argv) == 0
+    assert len(output.read_text().splitlines()) == len(lines)
@@ -0,0 +1,166 @@
+# noqa: D100
+import io
+from glob import glob
+from os import path
+
+import pdfplumber
+import pytest
+from pdfminer.layout import LTChar
+
+from pollydocket import docket, words
+
+PDFS_PATH = f"{path.dirname(path.abspath(__file__))}/data/"
+PDFS = sorted(glob(PDFS_PATH + "*.pdf"))
+
+
+def _word(text, x0, x1, top, bottom):
+    return {
+        "text": text,
+        "x0": x0,
+        "x1": x1,
+        "top": top,
+        "doctop": top,
+        "bottom": bottom,
+    }
+
+
+@pytest.fixture
+def crop():  # noqa: D103
+    return words.Crop.from_words(
+        (0, 0, 200, 100),
+        [
+            _word("Key:", 10, 30, 10, 20),
+            _word("Value", 31, 60, 10, 20),
+            _word("Other", 100, 130, 11, 20),
+            _word("Below", 10, 40, 50, 60),
+        ],
+    )
+
+
+def test_within_bbox(crop):  # noqa: D103
+    sub = crop.within_bbox((0, 0, 90, 30))
+    assert sub.bbox == (0, 0, 90, 30)
+    assert [w["text"] for w in sub.words] == ["Key:", "Value"]
+    assert sub.width == 90 and sub.height == 30
+
+
+def test_extract_words_copies(crop):  # noqa: D103
+    extracted = crop.extract_words()
+    extracted[0]["text"] = "changed"
+    assert crop.words[0]["text"] == "Key:"
+
+
+def test_extract_text(crop):  # noqa: D103
+    assert crop.extract_text() == "Key:Value Other\nBelow"
+
+
+@pytest.mark.parametrize("pdf_name", ["civil_docket.pdf", "cp_criminal_docket.pdf"])
+def test_extract_text_matches_pdfplumber(pdf_name):  # noqa: D103
+    with pdfplumber.open(PDFS_PATH + pdf_name) as pdf:
+        page = pdf.pages[0]
+        bbox = (0, 0, page.width, page.height - docket.BOTTOM_HEIGHT)
+        expected = page.within_bbox(bbox).extract_text().splitlines()
+        result = words.extract_page(page).within_bbox(bbox).extract_text()
+    assert result.splitlines() == expected
+
+
+def test_stack(crop):  # noqa: D103
+    below = words.Crop.from_words((0, 200, 200, 250), [_word("Next", 10, 40, 210, 220)])
+    stacked = words.stack([crop.within_bbox((0, 40, 200, 100)), below])
+    assert stacked.bbox == (0, 40, 200, 150)
+    assert [(w["text"], w["top"], w["doctop"]) for w in stacked.words] == [
+        ("Below", 50, 50),
+        ("Next", 110, 210),
+    ]
+    assert words.stack([crop]) is crop
+
+
+@pytest.mark.parametrize("pdf_name", ["civil_docket.pdf", "cp_criminal_docket.pdf"])
+def test_extract_top_band_matches_extract_page(pdf_name):  # noqa: D103
+    bbox = (0, 0, 612, 300)
+    with open(PDFS_PATH + pdf_name, "rb") as f:
+        band = words.extract_top_band(f, 300)
+    with pdfplumber.open(PDFS_PATH + pdf_name) as pdf:
+        page = words.extract_page(pdf.pages[0])
+    assert band.bbox == bbox
+    assert band.words == page.within_bbox(bbox).words
+
+
+def test_extract_top_band_no_pages():  # noqa: D103
+    empty = io.BytesIO(
+        b"%PDF-1.4\n1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n"
+        b"2 0 obj\n<< /Type /Pages /Kids [] /Count 0 >>\nendobj\n"
+        b"trailer\n<< /Root 1 0 R >>\n%%EOF\n"
+    )
+    assert words.count_pages(empty) == 0
+    empty.seek(0)
+    with pytest.raises(ValueError, match="no pages"):
+        words.extract_top_band(empty, 300)
+
+
+def test_count_pages():  # noqa: D103
+    for pdf in PDFS:
+        with open(pdf, "rb") as f, pdfplumber.open(pdf) as doc:
+            assert words.count_pages(f) == len(doc.pages)
+
+
+@pytest.mark.parametrize("pdf", PDFS, ids=path.basename)
+def test_extract_pages_keeps_no_layout(pdf, monkeypatch):  # noqa: D103
+    pages = []
+    begin_page = words._CharCollector.begin_page
+
+    def record(self, page, ctm):
+        begin_page(self, page, ctm)
+        pages.append(self.cur_item)
+
+    monkeypatch.setattr(words._CharCollector, "begin_page", record)
+    with open(pdf, "rb") as f:
+        assert any(p.words for p in words.extract_pages(f))
+    assert pages and not any(isinstance(o, LTChar) for p in pages for o in p)
+
+
+@pytest.mark.parametrize("pdf", PDFS, ids=path.basename)
+def test_extract_pages_matches_extract_page(pdf):  # noqa: D103
+    with open(pdf, "rb") as f:
+        pages = list(words.extract_pages(f))
+    with pdfplumber.open(pdf) as doc:
+        expected = [words.extract_page(p) for p in doc.pages]
+    assert [p.bbox for p in pages] == [p.bbox for p in expected]
+    assert [p.words for p in pages] == [p.words for p in expected]
+
+
+def test_word_index(crop):  # noqa: D103
+    index = crop.index
+    assert index is crop.index
+    assert index.find("Other") == 2
+    assert index.find("Missing") is None
+    assert index.aligned(0) == [0, 3]
+    assert index.below(20) == [0, 1, 2, 3]
+    assert index.below(21) == [3]
+    assert index.lines() == [[0, 1, 2], [3]]
+    assert [crop.table.text[i] for i in index.column(0)] == ["Key:", "Below"]
+    with pytest.raises(ValueError):
+        index.aligned(0, tolerance=1)
+
+
+def test_word_index_column_matches_scan():  # noqa: D103
+    with pdfplumber.open(PDFS_PATH + "cp_criminal_docket.pdf") as pdf:
+        page = words.extract_page(pdf.pages[0])
+
+    t = page.table
+    for head in page.rows:
+        expected = [
+            i
+            for i in page.rows
+            if (abs(t.x0[i] - t.x0[head]) < 0.5 or abs(t.x1[i] - t.x1[head]) < 0.5)
+            and t.bottom[i] >= t.bottom[head]
+        ]
+        assert page.index.column(head) == expected
+
+
+def test_word_table():  # noqa: D103
+    word = {"text": "Key:", "x0": 1, "x1": 2, "top": 3, "bottom": 4, "size": 9}
+    table = words.WordTable.from_words([word, dict(word)])
+    assert len(table) == 2
+    assert table.text[0] is table.text[1]
+    assert table.word(1) == {**word, "doctop": 3}
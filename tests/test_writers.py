@@ -0,0 +1,181 @@
+# noqa: D100
+import csv
+import io
+import json
+
+import pytest
+
+from pollydocket import docket, writers
+
+PDF = "tests/data/mj_criminal_docket.pdf"
+
+
+def _parsed():
+    return docket.parse_pdf(PDF).to_dict()
+
+
+def _read_table(directory, table):
+    rows = []
+    for part in sorted((directory / table).glob("part-*.csv")):
+        with open(part, newline="") as f:
+            rows += list(csv.DictReader(f))
+    return rows
+
+
+def test_flatten():  # noqa: D103
+    rows = list(writers.flatten("MJ-1", _parsed(), {"County": "Centre"}))
+    tables = [name for name, _ in rows]
+    assert tables[0] == "dockets"
+    assert rows[0][1] == {"Docket Number": "MJ-1", "County": "Centre", "Error": ""}
+    assert tables.count("status_information_items") == 3
+    assert "bail_items" in tables and "case_information" in tables
+    assert "calendar_events" not in tables  # Nothing parsed
+    bail = dict(rows)["bail_items"]
+    assert bail["Docket Number"] == "MJ-1"
+    assert bail["Item"] == "1"
+    assert bail["Bail Type"] == "ROR"
+    assert all(row["Docket Number"] == "MJ-1" for _, row in rows)
+
+
+def test_flatten_error():  # noqa: D103
+    rows = list(writers.flatten("MJ-1", KeyError("Bail")))
+    assert rows == [("dockets", {"Docket Number": "MJ-1", "Error": "KeyError: 'Bail'"})]
+
+
+def test_json_lines():  # noqa: D103
+    out = io.StringIO()
+    with writers.JSONLinesWriter(out) as writer:
+        writer.write("MJ-1", _parsed())
+        writer.write("MJ-2", ValueError("bad"), extra={"County": "Centre"})
+
+    first, second = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert first == {"Docket Number": "MJ-1", "Docket": _parsed()}
+    assert second == {
+        "Docket Number": "MJ-2",
+        "County": "Centre",
+        "Error": "ValueError: bad",
+    }
+
+
+def test_csv_batches(tmp_path):  # noqa: D103
+    writer = writers.CSVWriter(tmp_path, batch_size=2)
+    parsed = _parsed()
+    writer.write("MJ-1", parsed)
+    assert _read_table(tmp_path, "status_information_items") == []
+    assert writer.offset() == 0
+    writer.write("MJ-2", parsed)
+    # Both dockets written, as one part of each table
+    assert writer.offset() == 1
+    writer.write("MJ-3", {})
+    writer.close()
+
+    items = _read_table(tmp_path, "status_information_items")
+    assert [(r["Docket Number"], r["Item"]) for r in items] == [
+        ("MJ-1", "1"),
+        ("MJ-1", "2"),
+        ("MJ-1", "3"),
+        ("MJ-2", "1"),
+        ("MJ-2", "2"),
+        ("MJ-2", "3"),
+    ]
+    assert items[0]["Status Date"] == "01/13/2022"
+    assert len(_read_table(tmp_path, "case_information")) == 2
+
+
+def test_csv_part_columns(tmp_path):  # noqa: D103
+    with writers.CSVWriter(tmp_path, batch_size=3) as writer:
+        writer.write("MJ-1", {"Bail": {"Items": [{"Amount": "$1"}]}})
+        writer.write("MJ-2", {"Bail": {"Items": [{"Amount": "$2", "Type": "ROR"}]}})
+        writer.write("MJ-3", {"Bail": {"Items": [{"Amount": "$3"}]}})
+        writer.write("MJ-4", {"Bail": {"Items": [{"Amount": "$4"}]}})
+
+    parts = sorted((tmp_path / "bail_items").iterdir())
+    assert [p.name for p in parts] == ["part-00000.csv", "part-00001.csv"]
+    rows = _read_table(tmp_path, "bail_items")
+    assert [r.get("Type") for r in rows] == ["", "ROR", "", None]
+
+
+def test_csv_truncate(tmp_path):  # noqa: D103
+    with writers.CSVWriter(tmp_path, batch_size=1) as writer:
+        for number in ["MJ-1", "MJ-2", "MJ-3"]:
+            writer.write(number, {})
+    # A part left half-written by a killed run
+    (tmp_path / "dockets" / ".part-00003.csv.tmp").write_text("Docket")
+
+    with writers.CSVWriter(tmp_path, batch_size=1) as writer:
+        assert writer.offset() == 3
+        writer.truncate(1)
+        writer.write("MJ-4", {})
+
+    parts = sorted(p.name for p in (tmp_path / "dockets").iterdir())
+    assert parts == ["part-00000.csv", "part-00001.csv"]
+    rows = _read_table(tmp_path, "dockets")
+    assert [r["Docket Number"] for r in rows] == ["MJ-1", "MJ-4"]
+
+
+def test_csv_keeps_earlier_parts(tmp_path):  # noqa: D103
+    for number in ["MJ-1", "MJ-2"]:
+        with writers.CSVWriter(tmp_path) as writer:
+            writer.write(number, {"Bail": {"Items": [{"Amount": "$1"}]}})
+
+    parts = sorted((tmp_path / "bail_items").iterdir())
+    assert [p.name for p in parts] == ["part-00000.csv", "part-00001.csv"]
+    rows = _read_table(tmp_path, "bail_items")
+    assert [r["Docket Number"] for r in rows] == ["MJ-1", "MJ-2"]
+
+
+def test_jsonl_offset(tmp_path):  # noqa: D103
+    output = tmp_path / "dockets.jsonl"
+    with writers.JSONLinesWriter(output) as writer:
+        assert writer.offset() == 0
+        writer.write("MJ-1", {})
+        offset = writer.offset()
+        assert offset == output.stat().st_size
+        writer.write("MJ-2", {})
+
+    with writers.JSONLinesWriter(output) as writer:
+        writer.truncate(offset)
+        writer.write("MJ-3", {})
+    numbers = [json.loads(line)["Docket Number"] for line in open(output)]
+    assert numbers == ["MJ-1", "MJ-3"]
+    assert writers.JSONLinesWriter(io.StringIO()).offset() == 0
+
+
+def test_truncate_past_the_end(tmp_path):  # noqa: D103
+    output = tmp_path / "dockets.jsonl"
+    with writers.JSONLinesWriter(output) as writer:
+        writer.write("MJ-1", {})
+        with pytest.raises(ValueError, match="short of offset"):
+            writer.truncate(writer.offset() + 1)
+    assert output.read_text().startswith("{")
+
+    with writers.CSVWriter(tmp_path / "tables") as writer:
+        with pytest.raises(ValueError, match="short of offset"):
+            writer.truncate(1)
+
+
+def test_writers_are_abstract(tmp_path):  # noqa: D103
+    with pytest.raises(TypeError):
+        writers.Writer()
+    with pytest.raises(TypeError):
+        writers.TableWriter(tmp_path)
+
+
+def test_parquet(tmp_path):  # noqa: D103
+    pq = pytest.importorskip("pyarrow.parquet")
+    with writers.open_writer(tmp_path, "parquet", batch_size=1) as writer:
+        writer.write("MJ-1", _parsed())
+        writer.write("MJ-2", _parsed())
+        # Each part is complete as soon as it's written
+        parts = sorted((tmp_path / "status_information_items").iterdir())
+        assert len(parts) == 2
+        assert pq.read_table(parts[0]).num_rows == 3
+
+    table = pq.read_table(tmp_path / "status_information_items").to_pydict()
+    assert table["Docket Number"] == ["MJ-1"] * 3 + ["MJ-2"] * 3
+
+
+def test_open_writer(tmp_path):  # noqa: D103
+    assert isinstance(writers.open_writer(tmp_path, "csv"), writers.CSVWriter)
+    with pytest.raises(ValueError):
+        writers.open_writer(tmp_path, "xml")